@@ -0,0 +1,184 @@
+"""Headless batch scorer for JSONL/CSV assessment dumps.
+
+Each input record is keyed by the app's widget keys (``item1_response``,
+``item6_score``, ``deduction24_input``, ``total_md_input``, ``item4_comment``
+and so on), i.e. the same shape as ``st.session_state``. Records are read
+in bounded chunks, validated with the app's rules (validation.py), scored
+with the vectorized engine and streamed straight back out, so memory use
+stays flat regardless of file size.
+
+    python batch_score.py archive.jsonl scores.csv
+    python batch_score.py - - --input-format csv < dump.csv > scores.jsonl
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+from dataclasses import dataclass
+
+import rubrics
+from validation import INVALID_RESPONSE, validate_many
+
+DEFAULT_CHUNK_SIZE = 10_000
+PASSTHROUGH_KEYS = ("proj_name_input", "battalion_input")
+OUTPUT_FIELDS = ("row",) + PASSTHROUGH_KEYS + ("total", "possible", "percentage", "errors")
+
+
+# -------------------------------------------------------------------
+# Readers and writers
+# -------------------------------------------------------------------
+def _guess_format(path, fmt):
+    if fmt:
+        return fmt
+    if path.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+@dataclass(frozen=True)
+class BadRecord:
+    """An input record that could not be read; it comes out as an error row."""
+    message: str
+
+
+def read_records(stream, fmt):
+    """Yield one widget-keyed dict per input record (a BadRecord for unreadable JSONL lines)."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            # Blank CSV cells mean "not answered"; fall back to the widget defaults.
+            yield {k: v for k, v in row.items() if v not in ("", None)}
+    else:
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except (ValueError, RecursionError) as exc:
+                yield BadRecord(f"line {number}: invalid JSON: {exc}")
+                continue
+            if isinstance(record, dict):
+                yield record
+            else:
+                yield BadRecord(f"line {number}: expected a JSON object, got {type(record).__name__}")
+
+
+class ResultWriter:
+    """Stream scored rows out as JSONL or CSV."""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=OUTPUT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, result):
+        if self._csv is not None:
+            self._csv.writerow(dict(result, errors="; ".join(result["errors"])))
+        else:
+            self.stream.write(json.dumps(result) + "\n")
+
+
+# -------------------------------------------------------------------
+# Scoring
+# -------------------------------------------------------------------
+def score_chunk(records, first_row=0, rubric=None):
+    """Score and validate a list of records; returns one result dict per record.
+
+    rubric is a rubrics.Rubric (default: the current handbook). BadRecords
+    become rows with no score and the read error.
+    """
+    # Unreadable records are validated as empty ones, then reported on their own.
+    codes, issues = validate_many([{} if isinstance(record, BadRecord) else record for record in records])
+    totals, possible, percentages = (rubric or rubrics.get()).score(codes)
+
+    results = []
+    for r, record in enumerate(records):
+        result = {"row": first_row + r}
+        if isinstance(record, BadRecord):
+            result.update({key: "" for key in PASSTHROUGH_KEYS})
+            result.update(total=None, possible=None, percentage=None, errors=[record.message])
+            results.append(result)
+            continue
+        for key in PASSTHROUGH_KEYS:
+            result[key] = record.get(key, "")
+        errors = [issue.message for issue in issues[r]]
+        if any(issue.rule == INVALID_RESPONSE for issue in issues[r]):
+            result.update(total=None, possible=None, percentage=None, errors=errors)
+        else:
+            result.update(
+                total=int(totals[r]),
+                possible=int(possible[r]),
+                percentage=float(percentages[r]),
+                errors=errors,
+            )
+        results.append(result)
+    return results
+
+
+def run(records, writer, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, rubric=None):
+    """Score an iterable of records chunk by chunk; returns (rows, invalid, seconds)."""
+    start = time.perf_counter()
+    rows = invalid = 0
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        for result in score_chunk(chunk, first_row=rows, rubric=rubric):
+            if result["errors"]:
+                invalid += 1
+            writer.write(result)
+        rows += len(chunk)
+        if progress:
+            progress(rows, time.perf_counter() - start)
+    return rows, invalid, time.perf_counter() - start
+
+
+def _open(path, mode):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score CQI assessment dumps without the Streamlit UI.")
+    parser.add_argument("input", help="JSONL or CSV file of widget-keyed assessments ('-' for stdin)")
+    parser.add_argument("output", help="JSONL or CSV file for scores and validation errors ('-' for stdout)")
+    parser.add_argument("--input-format", choices=("jsonl", "csv"))
+    parser.add_argument("--output-format", choices=("jsonl", "csv"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--rubric", help="score with this handbook version (default: current; see rubrics.py)")
+    parser.add_argument("--quiet", action="store_true", help="only print the final summary")
+    args = parser.parse_args(argv)
+
+    in_fmt = _guess_format(args.input, args.input_format)
+    out_fmt = _guess_format(args.output, args.output_format)
+
+    def progress(rows, elapsed):
+        print(f"\r{rows:,} rows  {rows / max(elapsed, 1e-9):,.0f} rows/sec", end="", file=sys.stderr)
+
+    with _open(args.input, "r") as fin, _open(args.output, "w") as fout:
+        rows, invalid, elapsed = run(
+            read_records(fin, in_fmt),
+            ResultWriter(fout, out_fmt),
+            chunk_size=args.chunk_size,
+            progress=None if args.quiet else progress,
+            rubric=rubrics.get(args.rubric),
+        )
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(
+        f"Scored {rows:,} assessments ({invalid:,} with validation errors) "
+        f"in {elapsed:.2f}s: {rows / max(elapsed, 1e-9):,.0f} rows/sec",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Component micro-benchmarks with stored baselines and regression checks.
+
+Each benchmark runs one component of the app against synthetic assessments
+(see synthetic.py) and reports the median and best time per operation over
+several repeats. Results can be saved as a baseline, and later runs are
+compared against it: any benchmark whose median is slower than the baseline
+by more than the threshold is flagged, and the exit status is 1.
+
+    python benchmark.py --save              # record benchmark_baseline.json
+    python benchmark.py --threshold 0.25    # compare against it
+    python benchmark.py -k report --no-app  # a subset, without AppTest reruns
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic
+from registry import ITEMS_BY_KEY, item_response
+from report_html import RenderCache, render_report
+from report_pdf import render_pdf
+from scoring import encode_records, schedule_codes, score, score_state
+from signatures import to_svg
+from validation import validate, validate_many
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+DEFAULT_THRESHOLD = 0.20
+
+ITEM4 = ITEMS_BY_KEY["4"]
+BENCHMARKS = {}
+
+
+def benchmark(name, ops):
+    """Register fn(data) as a benchmark that performs ops operations per call."""
+    def register(fn):
+        BENCHMARKS[name] = (fn, ops)
+        return fn
+    return register
+
+
+# -------------------------------------------------------------------
+# Benchmarks
+# -------------------------------------------------------------------
+@benchmark("item4_schedule_scalar", ops=1000)
+def bench_item4_schedule_scalar(data):
+    for state in data["states"]:
+        ITEM4.score(item_response(ITEM4, state))
+
+
+@benchmark("item4_schedule_vectorized", ops=100_000)
+def bench_item4_schedule_vectorized(data):
+    schedule_codes(*data["wip"])
+
+
+@benchmark("validation", ops=1000)
+def bench_validation(data):
+    for state in data["states"]:
+        validate(state)
+
+
+@benchmark("validation_batch", ops=1000)
+def bench_validation_batch(data):
+    validate_many(data["states"])
+
+
+@benchmark("total_score_scalar", ops=1000)
+def bench_total_score_scalar(data):
+    for state in data["states"]:
+        score_state(state)
+
+
+@benchmark("total_score_vectorized", ops=1000)
+def bench_total_score_vectorized(data):
+    codes, _ = encode_records(data["states"])
+    score(codes)
+
+
+@benchmark("signature_svg", ops=20)
+def bench_signature_svg(data):
+    for strokes in data["signatures"]:
+        to_svg(strokes)
+
+
+@benchmark("report_html_cold", ops=100)
+def bench_report_html_cold(data):
+    cache = RenderCache(maxsize=0)
+    for state in data["states"][:100]:
+        render_report(state, {"oic": state["oic_signature_data"], "ncr": state["ncr_signature_data"]}, cache=cache)
+
+
+@benchmark("report_html_cached", ops=100)
+def bench_report_html_cached(data):
+    cache = data["report_cache"]
+    for state in data["states"][:10] * 10:
+        render_report(state, {"oic": state["oic_signature_data"], "ncr": state["ncr_signature_data"]}, cache=cache)
+
+
+@benchmark("report_pdf", ops=20)
+def bench_report_pdf(data):
+    for state in data["states"][:20]:
+        render_pdf(state)
+
+
+@benchmark("app_rerun", ops=1)
+def bench_app_rerun(data):
+    at = data["app"]
+    # Flip one radio so the rerun has a real widget change to process.
+    radio = at.radio(key="item1_response")
+    radio.set_value("No" if radio.value == "Yes" else "Yes")
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def make_data(app=True):
+    states = synthetic.assessments(1000, seed=13)
+    rng = np.random.default_rng(13)
+    data = {
+        "states": states,
+        "wip": (
+            rng.integers(200, 3500, 100_000),
+            rng.integers(20, 100, 100_000),
+            rng.integers(20, 100, 100_000),
+        ),
+        "signatures": [s["oic_signature_data"] for s in states[:20]],
+        "report_cache": RenderCache(),
+    }
+    if app:
+        os.environ.setdefault("CQI_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+        os.environ.setdefault("CQI_ANALYTICS_PATH", tempfile.mkdtemp())
+        from streamlit.testing.v1 import AppTest
+
+        data["app"] = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    return data
+
+
+# -------------------------------------------------------------------
+# Runner
+# -------------------------------------------------------------------
+def run(names, data, repeat=5, min_time=0.2):
+    """{name: {"median_us": ..., "best_us": ..., "ops": ...}} per operation."""
+    results = {}
+    for name in names:
+        fn, ops = BENCHMARKS[name]
+        fn(data)  # warm caches and lazy imports
+        # Loop enough calls per sample that each sample takes at least min_time.
+        start = time.perf_counter()
+        fn(data)
+        loops = max(1, int(min_time / max(time.perf_counter() - start, 1e-9)))
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn(data)
+            samples.append((time.perf_counter() - start) / (loops * ops) * 1e6)
+        results[name] = {"median_us": statistics.median(samples), "best_us": min(samples), "ops": ops}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """[(name, ratio)] for benchmarks slower than baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base:
+            ratio = result["median_us"] / base["median_us"]
+            if ratio > 1 + threshold:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CQI scoring, validation and report components.")
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="flag medians slower than baseline by more than this fraction (default 0.20)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-app", action="store_true", help="skip the AppTest rerun benchmark")
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if args.pattern in n and not (args.no_app and n == "app_rerun")]
+    data = make_data(app="app_rerun" in names)
+    results = run(names, data, repeat=args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)["results"]
+    print(f"{'benchmark':<28} {'median':>12} {'best':>12} {'baseline':>12} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = f"{(result['median_us'] / base['median_us'] - 1) * 100:+.0f}%" if base else ""
+        base_text = f"{base['median_us']:.2f} us" if base else "-"
+        print(f"{name:<28} {result['median_us']:9.2f} us {result['best_us']:9.2f} us {base_text:>12} {change:>8}")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({"python": sys.version.split()[0], "results": baseline}, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, ratio in regressions:
+        print(f"REGRESSION {name}: {ratio:.2f}x baseline (threshold {1 + args.threshold:.2f}x)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Stream every report for a battalion into one zip.
+
+Assessments are read from the store one at a time and rendered by
+``report_pdf.render_many``'s process pool, which only keeps a bounded
+window of reports in flight. Each PDF is written into the zip as soon as it
+comes back, so memory stays flat however many reports are exported. A
+``summary.csv`` with one score row per report (plus the points for every
+item) is added at the end.
+
+    python bulk_export.py deployment.zip --battalion "NMCB 133" --status final
+"""
+import argparse
+import collections
+import csv
+import io
+import re
+import sys
+import time
+import zipfile
+
+import store
+from registry import ITEMS, item_response
+from report_pdf import render_many
+
+SUMMARY_NAME = "summary.csv"
+SUMMARY_COLUMNS = (
+    "id", "file", "status", "project", "battalion", "inspection_date",
+    "total_score", "possible_score", "percentage",
+)
+
+
+def report_name(assessment, meta):
+    """Zip member name for one report: date, project and id, filesystem-safe."""
+    project = re.sub(r"[^A-Za-z0-9._-]+", "_", assessment.get("proj_name_input") or "Untitled").strip("_")
+    return f"{meta['inspection_date']}_{project or 'Untitled'}_{meta['id']}.pdf"
+
+
+def summary_row(assessment, meta, name):
+    row = [
+        meta["id"], name, meta["status"], assessment.get("proj_name_input") or "",
+        assessment.get("battalion_input") or "", meta["inspection_date"],
+        meta["total_score"], meta["possible_score"], meta["percentage"],
+    ]
+    for item in ITEMS:
+        points = item.score(item_response(item, assessment))
+        row.append("" if points is None else points)
+    return row
+
+
+def export_zip(out, ids, workers=None, progress=None, mp_context=None, conn=None):
+    """Render the reports for ids into a zip at out (a path or binary file).
+
+    progress, if given, is called as progress(done, total, elapsed_seconds)
+    after every report. Returns (reports written, elapsed seconds).
+    """
+    ids = list(ids)
+    pending = collections.deque()  # (assessment, meta) in the order render_many yields them
+
+    def states():
+        for assessment_id in ids:
+            loaded = store.load(assessment_id, conn=conn)
+            if loaded is None:  # deleted since ids were listed
+                continue
+            assessment, signatures, meta = loaded
+            for role, key in store.SIGNATURE_KEYS.items():
+                assessment[key] = signatures.get(role)
+            pending.append((assessment, meta))
+            yield assessment
+
+    summary = io.StringIO()
+    writer = csv.writer(summary)
+    writer.writerow([*SUMMARY_COLUMNS, *(f"item_{item.key}" for item in ITEMS)])
+    started = time.perf_counter()
+    done = 0
+    # PDFs are already compressed; storing them skips a pointless deflate pass.
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for pdf_bytes in render_many(states(), workers=workers, mp_context=mp_context):
+            assessment, meta = pending.popleft()
+            name = report_name(assessment, meta)
+            zf.writestr(name, pdf_bytes)
+            writer.writerow(summary_row(assessment, meta, name))
+            done += 1
+            if progress is not None:
+                progress(done, len(ids), time.perf_counter() - started)
+        zf.writestr(SUMMARY_NAME, summary.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    return done, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export CQI reports for a battalion as one zip of PDFs.")
+    parser.add_argument("output", help="zip file to write")
+    parser.add_argument("--battalion", help="only this battalion (default: all)")
+    parser.add_argument("--status", choices=("draft", "final"), help="only drafts or only finalized assessments")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--db", help="database path (default: CQI_DB_PATH)")
+    args = parser.parse_args(argv)
+
+    conn = store.connect(args.db)
+    ids = store.assessment_ids(args.battalion, args.status, conn=conn)
+    if not ids:
+        print("No matching assessments.", file=sys.stderr)
+        return 1
+
+    def report(done, total, elapsed):
+        if done == total or done % 25 == 0:
+            print(f"\r{done:,}/{total:,} reports · {done / max(elapsed, 1e-9):,.1f} reports/sec",
+                  end="", file=sys.stderr, flush=True)
+
+    count, elapsed = export_zip(args.output, ids, workers=args.workers, progress=report, conn=conn)
+    print(f"\nWrote {count:,} reports to {args.output} in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
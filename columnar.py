@@ -0,0 +1,309 @@
+"""Append-only columnar score store for fleet-wide analytics.
+
+Every inspection becomes one row across a fixed set of raw binary column
+files: one int8 points column per registry item (-1 for N/A) plus
+metadata columns (assessment id, battalion code, inspection day, total and
+possible score). Columns are appended to in place and read back through
+``np.memmap``, so analytics stream over millions of rows a chunk at a time
+without ever materialising a DataFrame.
+
+Appends are serialized by a thread lock on the instance and an ``flock`` on
+``manifest.lock``, so the app and CLI imports can write the same directory
+at once. Re-finalizing an assessment overwrites its existing row.
+
+    python columnar.py import archive.jsonl analytics/
+    python columnar.py stats analytics/
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+from registry import ITEMS
+from scoring import MAX_POINTS, encode_records, points_matrix
+
+DEFAULT_ROOT = os.environ.get(
+    "CQI_ANALYTICS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cqi_analytics")
+)
+CHUNK_ROWS = 1 << 20
+NA = -1
+EPOCH = datetime.date(1970, 1, 1)
+
+ITEM_COLUMNS = tuple(f"item_{item.key}" for item in ITEMS)
+META_COLUMNS = {
+    "assessment_id": np.int64,
+    "battalion": np.int32,
+    "day": np.int32,  # days since 1970-01-01
+    "total": np.int16,
+    "possible": np.int16,
+}
+COLUMNS = dict(META_COLUMNS, **{name: np.int8 for name in ITEM_COLUMNS})
+
+
+def _day(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    if value is None:
+        value = datetime.date.today()
+    return (value - EPOCH).days
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive flock on path (created if missing) for the duration."""
+    with open(path, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class ScoreColumns:
+    """Directory of memory-mapped score columns with a small JSON manifest."""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._manifest_path = os.path.join(root, "manifest.json")
+        self._lock_path = os.path.join(root, "manifest.lock")
+        self._lock = threading.Lock()
+        self._load()
+
+    def reload(self):
+        """Re-read the manifest (another process may have appended since)."""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as fh:
+                manifest = json.load(fh)
+        else:
+            manifest = {"rows": 0, "battalions": [], "items": [item.key for item in ITEMS]}
+        if manifest["items"] != [item.key for item in ITEMS]:
+            raise ValueError(f"{self.root} was built for a different item registry")
+        self.manifest = manifest
+        self._battalion_codes = {name: i for i, name in enumerate(manifest["battalions"])}
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    @property
+    def battalions(self):
+        return list(self.manifest["battalions"])
+
+    def _path(self, name):
+        return os.path.join(self.root, f"{name}.bin")
+
+    def column(self, name):
+        """Read-only memmap of one column (an empty array when there are no rows)."""
+        dtype = COLUMNS[name]
+        if not len(self):
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=(len(self),))
+
+    def _battalion_code(self, name):
+        name = str(name or "")
+        code = self._battalion_codes.get(name)
+        if code is None:
+            code = self._battalion_codes[name] = len(self.manifest["battalions"])
+            self.manifest["battalions"].append(name)
+        return code
+
+    # ---------------------------------------------------------------
+    # Appending
+    # ---------------------------------------------------------------
+    def append(self, points, battalions, days, assessment_ids=None):
+        """Append scored rows.
+
+        points is an (N, 29) float matrix from scoring.points_matrix (NaN for
+        N/A). A row whose assessment id is already stored overwrites that
+        row in place, and the last of several rows with one id wins, so
+        re-finalising an assessment replaces its old scores. Returns the
+        number of rows written.
+        """
+        with self._lock, file_lock(self._lock_path):
+            self._load()
+            return self._append(points, battalions, days, assessment_ids)
+
+    def _append(self, points, battalions, days, assessment_ids):
+        points = np.asarray(points, dtype=np.float64)
+        n = len(points)
+        if not n:
+            return 0
+        if assessment_ids is None:
+            assessment_ids = np.full(n, -1, dtype=np.int64)
+        assessment_ids = np.asarray(assessment_ids, dtype=np.int64)
+        keep = np.ones(n, dtype=bool)
+        known = assessment_ids >= 0
+        at = np.full(n, -1, dtype=np.int64)  # existing row each input overwrites
+        if known.any():
+            # Keep the last row per id.
+            _, last = np.unique(assessment_ids[::-1], return_index=True)
+            keep &= ~known | np.isin(np.arange(n), n - 1 - last)
+            if len(self):
+                stored_ids = np.asarray(self.column("assessment_id"))
+                order = np.argsort(stored_ids, kind="stable")
+                pos = np.minimum(np.searchsorted(stored_ids, assessment_ids, sorter=order), len(order) - 1)
+                found = known & (stored_ids[order[pos]] == assessment_ids)
+                at[found] = order[pos[found]]
+
+        na = np.isnan(points)
+        stored = np.where(na, NA, points).astype(np.int8)
+        data = {
+            "assessment_id": assessment_ids,
+            "battalion": np.array([self._battalion_code(b) for b in battalions], dtype=np.int32),
+            "day": np.array([_day(d) for d in days], dtype=np.int32),
+            "total": np.where(na, 0, points).sum(axis=1).astype(np.int16),
+            "possible": np.full(len(points), MAX_POINTS.sum(), dtype=np.int16),
+        }
+        for i, name in enumerate(ITEM_COLUMNS):
+            data[name] = stored[:, i]
+        update = keep & (at >= 0)
+        append = keep & (at < 0)
+        for name, dtype in COLUMNS.items():
+            if update.any():
+                column = np.memmap(self._path(name), dtype=dtype, mode="r+", shape=(len(self),))
+                column[at[update]] = data[name][update]
+                column.flush()
+                del column
+            with open(self._path(name), "ab") as fh:
+                # Drop any tail left by an append that died before the manifest was updated.
+                fh.truncate(len(self) * np.dtype(dtype).itemsize)
+                fh.write(np.ascontiguousarray(data[name][append], dtype=dtype).tobytes())
+        self.manifest["rows"] += int(append.sum())
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest, fh)
+        os.replace(tmp, self._manifest_path)
+        return int(keep.sum())
+
+    def append_records(self, records, assessment_ids=None):
+        """Score widget-keyed records and append the valid ones."""
+        codes, errors = encode_records(records)
+        ok = np.array([r not in errors for r in range(len(records))], dtype=bool)
+        if assessment_ids is not None:
+            assessment_ids = np.asarray(assessment_ids)[ok]
+        records = [rec for rec, good in zip(records, ok) if good]
+        return self.append(
+            points_matrix(codes[ok]),
+            [rec.get("battalion_input") or "" for rec in records],
+            [rec.get("inspection_date") for rec in records],
+            assessment_ids,
+        )
+
+    # ---------------------------------------------------------------
+    # Analytics (chunked passes over the memmaps)
+    # ---------------------------------------------------------------
+    def _chunks(self, names):
+        columns = [self.column(name) for name in names]
+        for start in range(0, len(self), CHUNK_ROWS):
+            yield [np.asarray(col[start:start + CHUNK_ROWS]) for col in columns]
+
+    def item_stats(self):
+        """Per-item (mean points, mean points lost, N/A count), in registry order."""
+        sums = np.zeros(len(ITEMS))
+        counts = np.zeros(len(ITEMS))
+        for chunk in self._chunks(ITEM_COLUMNS):
+            block = np.stack(chunk, axis=1).astype(np.int32)
+            valid = block != NA
+            sums += np.where(valid, block, 0).sum(axis=0)
+            counts += valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        return means, MAX_POINTS - means, len(self) - counts
+
+    def battalion_means(self):
+        """{battalion: (inspections, mean percentage)}."""
+        n_codes = len(self.manifest["battalions"])
+        counts = np.zeros(n_codes)
+        pct_sums = np.zeros(n_codes)
+        for battalion, total, possible in self._chunks(("battalion", "total", "possible")):
+            pct = np.divide(total, possible, out=np.zeros(len(total)), where=possible > 0) * 100
+            counts += np.bincount(battalion, minlength=n_codes)
+            pct_sums += np.bincount(battalion, weights=pct, minlength=n_codes)
+        return {
+            name: (int(counts[i]), float(pct_sums[i] / counts[i]))
+            for i, name in enumerate(self.manifest["battalions"])
+            if counts[i]
+        }
+
+    def monthly_trend(self, battalion=None):
+        """(months as datetime64[M], inspections, mean percentage) sorted by month."""
+        code = self._battalion_codes.get(battalion) if battalion is not None else None
+        if battalion is not None and code is None:
+            return np.array([], dtype="datetime64[M]"), np.array([]), np.array([])
+        counts, sums = {}, {}
+        for bat, day, total, possible in self._chunks(("battalion", "day", "total", "possible")):
+            if code is not None:
+                keep = bat == code
+                day, total, possible = day[keep], total[keep], possible[keep]
+            months = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+            pct = np.divide(total, possible, out=np.zeros(len(total)), where=possible > 0) * 100
+            uniq, inverse = np.unique(months, return_inverse=True)
+            c = np.bincount(inverse)
+            s = np.bincount(inverse, weights=pct)
+            for m, ci, si in zip(uniq, c, s):
+                counts[m] = counts.get(m, 0) + ci
+                sums[m] = sums.get(m, 0.0) + si
+        months = np.array(sorted(counts), dtype=np.int64)
+        n = np.array([counts[m] for m in months], dtype=np.int64)
+        mean = np.array([sums[m] / counts[m] for m in months])
+        return months.astype("datetime64[M]"), n, mean
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the columnar CQI score store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="append a JSONL dump of widget-keyed assessments")
+    imp.add_argument("input")
+    imp.add_argument("root", nargs="?", default=DEFAULT_ROOT)
+    imp.add_argument("--chunk-size", type=int, default=50_000)
+    stats = sub.add_parser("stats", help="print per-item and per-battalion statistics")
+    stats.add_argument("root", nargs="?", default=DEFAULT_ROOT)
+    args = parser.parse_args(argv)
+
+    store = ScoreColumns(args.root)
+    if args.command == "import":
+        written = 0
+        with open(args.input, encoding="utf-8") as fh:
+            chunk = []
+            for line in fh:
+                if line.strip():
+                    chunk.append(json.loads(line))
+                if len(chunk) >= args.chunk_size:
+                    written += store.append_records(chunk)
+                    chunk = []
+            if chunk:
+                written += store.append_records(chunk)
+        print(f"Appended {written:,} rows ({len(store):,} total)", file=sys.stderr)
+        return 0
+
+    means, loss, na = store.item_stats()
+    print(f"{len(store):,} inspections")
+    print(f"{'item':<52} {'mean':>6} {'lost':>6} {'N/A':>8}")
+    for item, m, l, n in sorted(zip(ITEMS, means, loss, na), key=lambda row: -np.nan_to_num(row[2])):
+        print(f"{item.title:<52} {m:6.2f} {l:6.2f} {int(n):8,}")
+    print()
+    for name, (count, pct) in sorted(store.battalion_means().items()):
+        print(f"{name or '(blank)':<20} {count:10,} {pct:6.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
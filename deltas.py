@@ -0,0 +1,199 @@
+"""Re-inspection deltas: what changed between visits to the same project.
+
+Visits are looked up by project name and battalion through the
+``idx_assessments_project`` index. Each visit is read once into a snapshot
+of per-item points and comments. Comparing two visits gives:
+- per-item point changes;
+- comments that are new or changed, and comments that were resolved;
+- the change in total and percentage.
+
+Snapshots and diffs are cached by assessment id plus ``updated_at``, so a
+re-saved visit is never served stale. The "what changed" view for a
+project with dozens of visits mostly hits the cache.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import store
+from registry import ITEMS, ITEMS_BY_KEY
+
+_ORDER = {item.key: n for n, item in enumerate(ITEMS)}
+
+
+@dataclass(frozen=True)
+class Visit:
+    id: int
+    inspection_date: str
+    status: str
+    total_score: int
+    possible_score: int
+    percentage: float
+    updated_at: str
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    points: dict  # item key -> points (None for N/A)
+    comments: dict  # item key -> comment text
+
+
+@dataclass(frozen=True)
+class Delta:
+    before: Visit
+    after: Visit
+    items: tuple  # (item key, points before, points after) for items whose points changed
+    new_comments: tuple  # (item key, text) added or reworded since the earlier visit
+    resolved_comments: tuple  # (item key, text) present before and gone now
+
+    @property
+    def total_change(self):
+        return (self.after.total_score or 0) - (self.before.total_score or 0)
+
+    @property
+    def percentage_change(self):
+        return round((self.after.percentage or 0) - (self.before.percentage or 0), 1)
+
+
+def visits(project, battalion, status="final", conn=None):
+    """Every visit to a project, oldest first (status=None includes drafts)."""
+    conn = conn or store.connect()
+    sql = (
+        "SELECT id, inspection_date, status, total_score, possible_score, percentage, updated_at "
+        "FROM assessments WHERE project_name = ? AND battalion = ?"
+    )
+    params = [project, battalion]
+    if status is not None:
+        sql += " AND status = ?"
+        params.append(status)
+    return [Visit(*row) for row in conn.execute(sql + " ORDER BY inspection_date, id", params)]
+
+
+def projects(battalion=None, conn=None):
+    """(project, battalion, finalized visits) for projects inspected more than once."""
+    conn = conn or store.connect()
+    where, params = ("AND battalion = ?", (battalion,)) if battalion is not None else ("", ())
+    return [
+        tuple(row)
+        for row in conn.execute(
+            "SELECT project_name, battalion, count(*) FROM assessments "
+            f"WHERE status = 'final' AND project_name != '' {where} "
+            "GROUP BY project_name, battalion HAVING count(*) > 1 ORDER BY project_name, battalion",
+            params,
+        )
+    ]
+
+
+class DeltaEngine:
+    """Thread-safe LRU caches of visit snapshots and pairwise deltas."""
+
+    def __init__(self, maxsize=512, db_path=None):
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = OrderedDict()
+        self._deltas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, cache, key, build):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                self.hits += 1
+                return cache[key]
+        value = build()
+        with self._lock:
+            self.misses += 1
+            cache[key] = value
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+        return value
+
+    def snapshot(self, visit):
+        def build():
+            conn = store.connect(self.db_path)
+            points = dict(conn.execute("SELECT item_key, points FROM item_scores WHERE assessment_id = ?", (visit.id,)))
+            comments = dict(conn.execute("SELECT item_key, body FROM comments WHERE assessment_id = ?", (visit.id,)))
+            return Snapshot(points, comments)
+
+        return self._cached(self._snapshots, (visit.id, visit.updated_at), build)
+
+    def delta(self, before, after):
+        """Delta between two visits (cached until either is re-saved)."""
+        def build():
+            old, new = self.snapshot(before), self.snapshot(after)
+            items = tuple(
+                (item.key, old.points.get(item.key), new.points.get(item.key))
+                for item in ITEMS
+                if old.points.get(item.key) != new.points.get(item.key)
+            )
+            new_comments = [(key, text) for key, text in new.comments.items() if old.comments.get(key) != text]
+            resolved = [(key, text) for key, text in old.comments.items() if key not in new.comments]
+            return Delta(
+                before, after, items,
+                tuple(sorted(new_comments, key=lambda c: _ORDER.get(c[0], 99))),
+                tuple(sorted(resolved, key=lambda c: _ORDER.get(c[0], 99))),
+            )
+
+        key = (before.id, before.updated_at, after.id, after.updated_at)
+        return self._cached(self._deltas, key, build)
+
+    def history(self, project, battalion, status="final"):
+        """(visits, deltas between each visit and the next)."""
+        found = visits(project, battalion, status, conn=store.connect(self.db_path))
+        return found, [self.delta(a, b) for a, b in zip(found, found[1:])]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "snapshots": len(self._snapshots),
+                "deltas": len(self._deltas),
+            }
+
+
+def describe(delta):
+    """Plain-text summary lines for a delta."""
+    lines = [
+        f"#{delta.before.id} ({delta.before.inspection_date}) -> #{delta.after.id} ({delta.after.inspection_date}): "
+        f"{delta.before.total_score} -> {delta.after.total_score} ({delta.total_change:+d}), "
+        f"{delta.before.percentage}% -> {delta.after.percentage}% ({delta.percentage_change:+.1f})"
+    ]
+    for key, old, new in delta.items:
+        lines.append(f"  {ITEMS_BY_KEY[key].label}: {'N/A' if old is None else old} -> {'N/A' if new is None else new}")
+    for key, text in delta.new_comments:
+        lines.append(f"  + {ITEMS_BY_KEY[key].label}: {text}")
+    for key, text in delta.resolved_comments:
+        lines.append(f"  - {ITEMS_BY_KEY[key].label}: {text}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show what changed between successive inspections of a project.")
+    parser.add_argument("project")
+    parser.add_argument("battalion")
+    parser.add_argument("--drafts", action="store_true", help="include draft inspections")
+    parser.add_argument("--db", help="SQLite database (default: CQI_DB_PATH)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    found, deltas = DeltaEngine(db_path=args.db).history(args.project, args.battalion, None if args.drafts else "final")
+    if not found:
+        print(f"No inspections of {args.project!r} for {args.battalion!r}.", file=sys.stderr)
+        return 1
+    for delta in deltas:
+        print("\n".join(describe(delta)))
+    print(
+        f"{len(found)} inspections, {len(deltas)} comparisons in {(time.perf_counter() - started) * 1000:.1f} ms",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
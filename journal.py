@@ -0,0 +1,132 @@
+"""Append-only per-draft journal of widget changes.
+
+Every change to an assessment widget is appended to ``<draft>.log`` as one
+short JSON line of ``{widget key: value}``. That is a single small write per
+keystroke. Once the log reaches ``compact_every`` lines, the whole state is
+written to ``<draft>.snap`` (atomically, via rename) and the log is
+truncated. A reconnecting session rebuilds its state from the snapshot plus
+the log tail. Replaying a tail over a snapshot that already contains it
+gives the same result, so a crash between the two steps of a compaction
+loses nothing.
+
+Dates are stored as ``{"$date": "YYYY-MM-DD"}``. A ``null`` value means the
+key was removed (e.g. a comment box that disappeared). Journals untouched
+for ``max_age`` seconds are pruned.
+"""
+import datetime
+import json
+import os
+import re
+import tempfile
+import time
+
+JOURNAL_DIR = os.environ.get("CQI_JOURNAL_DIR", os.path.join(tempfile.gettempdir(), "cqi-draft-journal"))
+COMPACT_EVERY = 256
+MAX_AGE = 14 * 24 * 3600
+_DRAFT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _encode(value):
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"cannot journal {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.date.fromisoformat(obj["$date"])
+    return obj
+
+
+def valid_draft_id(draft_id):
+    """True for ids this module hands out (32 hex chars), so ids from a URL are safe file names."""
+    return bool(draft_id) and bool(_DRAFT_ID.match(draft_id))
+
+
+class DraftJournal:
+    """Snapshot plus append-only change log for one draft."""
+
+    def __init__(self, draft_id, directory=JOURNAL_DIR, compact_every=COMPACT_EVERY):
+        if not valid_draft_id(draft_id):
+            raise ValueError(f"invalid draft id {draft_id!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.draft_id = draft_id
+        self.snap_path = os.path.join(directory, f"{draft_id}.snap")
+        self.log_path = os.path.join(directory, f"{draft_id}.log")
+        self.compact_every = compact_every
+        self.pending = 0  # log lines written since the last compaction
+
+    # ---------------------------------------------------------------
+    # Writing
+    # ---------------------------------------------------------------
+    def append(self, changes):
+        """Append one {key: value} change set; compacts when the log gets long."""
+        if not changes:
+            return
+        line = json.dumps(changes, default=_encode, separators=(",", ":")) + "\n"
+        with open(self.log_path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+        self.pending += 1
+        if self.pending >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Fold the log into the snapshot and truncate the log; returns the state."""
+        state = self.restore()
+        tmp = self.snap_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(state, fh, default=_encode, separators=(",", ":"))
+        os.replace(tmp, self.snap_path)
+        with open(self.log_path, "w", encoding="utf-8"):
+            pass
+        self.pending = 0
+        return state
+
+    # ---------------------------------------------------------------
+    # Recovery
+    # ---------------------------------------------------------------
+    def restore(self):
+        """Current state: the snapshot with every logged change applied in order."""
+        state = {}
+        try:
+            with open(self.snap_path, encoding="utf-8") as fh:
+                state = json.load(fh, object_hook=_decode)
+        except FileNotFoundError:
+            pass
+        lines = 0
+        try:
+            with open(self.log_path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        changes = json.loads(line, object_hook=_decode)
+                    except ValueError:  # torn line from a crash mid-append; skip it
+                        continue
+                    for key, value in changes.items():
+                        if value is None:
+                            state.pop(key, None)
+                        else:
+                            state[key] = value
+                    lines += 1
+        except FileNotFoundError:
+            pass
+        self.pending = lines
+        return state
+
+
+def prune(directory=JOURNAL_DIR, max_age=MAX_AGE):
+    """Remove journals nobody has touched for max_age seconds; returns how many files."""
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
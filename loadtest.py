@@ -0,0 +1,278 @@
+"""Concurrent-inspector load harness for the Streamlit app.
+
+Starts ``streamlit run streamlit_app.py`` (or targets a running server with
+--url) and opens N browser-like sessions on its websocket, speaking the
+same protobuf messages as the frontend. Each session walks through a whole
+inspection using the app's real widget keys:
+- project information;
+- every item response (``item1_response``, ``item6_score``,
+  ``deduction24_input``, ...) and the work-in-place inputs;
+- the comments the form requires.
+
+It then draws both signatures on the canvases and saves them, calculates
+the final score, prints the report and generates the PDF. Widgets inside
+fragments trigger fragment reruns, as they do in a browser.
+
+Every interaction is one rerun, timed from the moment the message is sent
+until the server reports the script finished. For each concurrency level
+the harness prints rerun throughput, p50/p95/p99 rerun latency and the
+server's RSS.
+
+    python loadtest.py --sessions 1,5,10,20,40
+    python loadtest.py --url ws://host:8501 --pid 1234 --sessions 40
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.NumberInput_pb2 import NumberInput
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+import synthetic
+from registry import ITEMS, PROJECT_FIELDS, SCHEDULE_INPUT_KEYS, item_response
+from signatures import image_to_png
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+DATE_KEYS = {"start_date_input", "planned_start_input", "planned_completion_input", "actual_completion_input"}
+WIDGET_TYPES = {
+    "text_input", "text_area", "date_input", "radio", "selectbox", "number_input",
+    "button", "component_instance",
+}
+DONE = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+
+def rss_mb(pid):
+    """Resident set size of pid in MB (None when it cannot be read)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+# -------------------------------------------------------------------
+# One browser-like session
+# -------------------------------------------------------------------
+class Session:
+    """A websocket session driving the app's widgets by key."""
+
+    def __init__(self, url, state):
+        self.url = url.rstrip("/") + "/_stcore/stream"
+        self.state = state
+        self.widgets = {}  # user key -> (kind, widget id, proto, fragment id)
+        self.values = {}  # widget id -> WidgetState bytes the browser keeps sending
+        self.latencies = []
+        self.errors = []
+        self.ws = None
+
+    async def __aenter__(self):
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+        await self.rerun()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+    def _track(self, msg):
+        element = msg.delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors.append(element.exception.message)
+        if kind not in WIDGET_TYPES:
+            return
+        proto = getattr(element, kind)
+        # Widget ids look like "$$ID-<hash>-<user key>".
+        self.widgets[proto.id.split("-", 2)[-1]] = (kind, proto.id, proto, msg.delta.fragment_id)
+
+    async def rerun(self, fragment_id="", trigger=None):
+        """Send the current widget values (plus an optional one-shot trigger) and wait for the run."""
+        back = BackMsg()
+        client = back.rerun_script
+        client.query_string = ""
+        client.fragment_id = fragment_id
+        for serialized in self.values.values():
+            client.widget_states.widgets.add().ParseFromString(serialized)
+        if trigger is not None:
+            ws = client.widget_states.widgets.add()
+            ws.id = trigger
+            ws.trigger_value = True
+        started = time.perf_counter()
+        await self.ws.send(back.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._track(msg)
+            elif kind == "script_finished":
+                if msg.script_finished in DONE:
+                    break
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors.append("script compile error")
+                    break
+        self.latencies.append(time.perf_counter() - started)
+
+    async def set(self, key, value, send=True):
+        """Set a widget by key; reruns (the widget's fragment, if any) unless send is False."""
+        kind, widget_id, proto, fragment_id = self.widgets[key]
+        ws = WidgetState(id=widget_id)
+        if kind in ("text_input", "text_area", "radio", "selectbox"):
+            ws.string_value = str(value)
+        elif kind == "date_input":
+            ws.string_array_value.data[:] = [value.isoformat()]
+        elif kind == "number_input":
+            if proto.data_type == NumberInput.INT:
+                ws.int_value = int(value)
+            else:
+                ws.double_value = float(value)
+        elif kind == "component_instance":
+            ws.json_value = json.dumps(value)
+        self.values[widget_id] = ws.SerializeToString()
+        if send:
+            await self.rerun(fragment_id)
+
+    async def click(self, key):
+        kind, widget_id, _, fragment_id = self.widgets[key]
+        await self.rerun(fragment_id, trigger=widget_id)
+
+    async def inspect(self):
+        """Fill in, sign and print one assessment."""
+        state = self.state
+        for _, key in PROJECT_FIELDS:
+            await self.set(key, state[key])
+        for item in ITEMS:
+            if item.kind == "schedule":
+                for key in SCHEDULE_INPUT_KEYS:
+                    await self.set(key, state[key])
+            else:
+                await self.set(item.widget_key, state[item.widget_key])
+            if item.needs_comment(item_response(item, state)) and state.get(item.comment_key):
+                await self.set(item.comment_key, state[item.comment_key])
+        # The canvases sit in a form: their values are sent with the submit click.
+        # A fresh session draws on the first round of canvas keys (see retire_canvases).
+        for canvas_key, state_key in (("oic_signature_0", "oic_signature_data"), ("ncr_signature_0", "ncr_signature_data")):
+            png = image_to_png(synthetic.rasterize(state[state_key]))
+            data_url = "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+            await self.set(canvas_key, {"data": data_url, "raw": state[state_key]}, send=False)
+        await self.click("FormSubmitter:signature_form-Save Signatures")
+        for key in ("calculate_final_score", "print_full_report", "generate_pdf_report"):
+            await self.click(key)
+
+
+# -------------------------------------------------------------------
+# Server and load levels
+# -------------------------------------------------------------------
+def start_server(port):
+    workdir = tempfile.mkdtemp(prefix="cqi-load-")
+    env = dict(
+        os.environ,
+        CQI_DB_PATH=os.path.join(workdir, "load.db"),
+        CQI_ANALYTICS_PATH=os.path.join(workdir, "analytics"),
+    )
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", APP_PATH,
+            "--server.headless=true", f"--server.port={port}", "--browser.gatherUsageStats=false",
+        ],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError("streamlit server did not become healthy within 60 s")
+
+
+async def run_level(url, n, pid=None, seed=0):
+    """Run n concurrent inspections; returns (latencies s, errors, wall s, peak RSS MB)."""
+    states = synthetic.assessments(n, seed=seed)
+    sessions = [Session(url, state) for state in states]
+    peak = [rss_mb(pid) if pid else None]
+    stop = asyncio.Event()
+
+    async def sample_rss():
+        while not stop.is_set():
+            rss = rss_mb(pid)
+            if rss is not None:
+                peak[0] = max(peak[0] or 0, rss)
+            try:
+                await asyncio.wait_for(stop.wait(), 0.25)
+            except asyncio.TimeoutError:
+                pass
+
+    async def one(session):
+        try:
+            async with session:
+                await session.inspect()
+        except Exception as exc:  # keep the other sessions going
+            session.errors.append(f"{type(exc).__name__}: {exc}")
+
+    sampler = asyncio.create_task(sample_rss()) if pid else None
+    started = time.perf_counter()
+    await asyncio.gather(*(one(s) for s in sessions))
+    wall = time.perf_counter() - started
+    stop.set()
+    if sampler:
+        await sampler
+    latencies = np.array([t for s in sessions for t in s.latencies])
+    errors = [e for s in sessions for e in s.errors]
+    return latencies, errors, wall, peak[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent inspectors against the CQI app.")
+    parser.add_argument("--sessions", default="1,5,10,20,40", help="comma-separated concurrency levels")
+    parser.add_argument("--url", help="websocket base URL of a running server (default: start one)")
+    parser.add_argument("--pid", type=int, help="server process id for RSS when using --url")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    levels = [int(n) for n in args.sessions.split(",") if n.strip()]
+
+    server = None
+    url, pid = args.url, args.pid
+    if url is None:
+        server = start_server(args.port)
+        url, pid = f"ws://127.0.0.1:{args.port}", server.pid
+    try:
+        print(f"{'sessions':>8} {'reruns':>7} {'wall s':>7} {'reruns/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>7} {'errors':>6}")
+        for n in levels:
+            latencies, errors, wall, rss = asyncio.run(run_level(url, n, pid, args.seed))
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if len(latencies) else (0, 0, 0)
+            rss_text = f"{rss:7.0f}" if rss else f"{'-':>7}"
+            print(
+                f"{n:8d} {len(latencies):7d} {wall:7.1f} {len(latencies) / wall:9.1f} "
+                f"{p50:8.1f} {p95:8.1f} {p99:8.1f} {rss_text} {len(errors):6d}",
+                flush=True,
+            )
+            for error in errors[:3]:
+                print(f"    {error}", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Per-stage timing spans aggregated into latency histograms.
+
+Wrap a stage of the script in ``span("stage")`` and its wall time is added
+to a fixed-bucket histogram for that stage. Histograms are process-wide,
+so they cover every session served by the Streamlit server. They can be
+read in three ways: as Prometheus exposition text (``prometheus_text``),
+written to a file for the node_exporter textfile collector
+(``write_textfile``), or served over HTTP at ``/metrics`` (``serve``).
+
+Instrumentation is off unless ``CQI_METRICS=1``. While off, ``span``
+returns a shared no-op context manager and records nothing.
+
+    CQI_METRICS=1 CQI_METRICS_PORT=9464 streamlit run streamlit_app.py
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("CQI_METRICS", "").lower() in ("1", "true", "yes", "on")
+PORT = int(os.environ.get("CQI_METRICS_PORT") or 0)
+TEXTFILE = os.environ.get("CQI_METRICS_FILE", "")
+
+# Upper bucket bounds in seconds; the implicit last bucket is +Inf.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC = "cqi_stage_duration_seconds"
+
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    """Per-bucket (non-cumulative) counts plus sum and count for one stage."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the q-quantile in seconds by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def observe(stage, seconds):
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def span(stage):
+    """Context manager timing one stage (a shared no-op when metrics are disabled)."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(stage)
+
+
+def snapshot():
+    """{stage: (count, mean s, p50 s, p95 s, p99 s)} for every stage seen so far."""
+    with _lock:
+        return {
+            stage: (h.count, h.total / h.count, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+            for stage, h in sorted(_histograms.items())
+        }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+# -------------------------------------------------------------------
+# Exposition
+# -------------------------------------------------------------------
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Histograms in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {METRIC} Wall time spent in each stage of the CQI app script.",
+        f"# TYPE {METRIC} histogram",
+    ]
+    with _lock:
+        for stage, h in sorted(_histograms.items()):
+            stage = _label(stage)
+            cumulative = 0
+            for bound, n in zip((*BUCKETS, "+Inf"), h.counts):
+                cumulative += n
+                lines.append(f'{METRIC}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC}_sum{{stage="{stage}"}} {h.total:.6f}')
+            lines.append(f'{METRIC}_count{{stage="{stage}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None):
+    """Atomically write prometheus_text() to path (for the textfile collector)."""
+    path = path or TEXTFILE
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port=None, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, PORT if port is None else port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="cqi-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,79 @@
+"""Percentile ranking of final scores against the stored history.
+
+Scores are kept in pre-sorted lists per population: all inspections, each
+battalion and each project-size band (the Item 4 ``total_md`` bands). A
+lookup is two bisects; saving a score is one ``insort`` per population,
+so the index stays current without rescanning the archive.
+"""
+import bisect
+import threading
+
+from registry import size_band
+
+OVERALL = ("overall", "")
+
+
+def populations(battalion, total_md):
+    """Keys of the populations an inspection belongs to."""
+    return (OVERALL, ("battalion", battalion or ""), ("band", size_band(float(total_md or 0))))
+
+
+class PercentileIndex:
+    """Sorted score arrays with incremental updates keyed by assessment id."""
+
+    def __init__(self):
+        self._sorted = {}
+        self._members = {}  # assessment id -> (population keys, percentage)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sorted.get(OVERALL, ()))
+
+    def add(self, assessment_id, battalion, total_md, percentage):
+        """Insert or move an assessment's score; re-adding an id replaces it."""
+        keys = populations(battalion, total_md)
+        percentage = float(percentage)
+        with self._lock:
+            previous = self._members.pop(assessment_id, None)
+            if previous is not None:
+                old_keys, old_pct = previous
+                for key in old_keys:
+                    scores = self._sorted[key]
+                    del scores[bisect.bisect_left(scores, old_pct)]
+            for key in keys:
+                bisect.insort(self._sorted.setdefault(key, []), percentage)
+            self._members[assessment_id] = (keys, percentage)
+
+    def percentile(self, percentage, key=OVERALL):
+        """Share (0-100) of the population scoring at or below percentage, or None if empty."""
+        scores = self._sorted.get(key)
+        if not scores:
+            return None
+        return 100.0 * bisect.bisect_right(scores, float(percentage)) / len(scores)
+
+    def rank(self, battalion, total_md, percentage):
+        """{"overall"|"battalion"|"band": (percentile, population size)}."""
+        result = {}
+        for key in populations(battalion, total_md):
+            result[key[0]] = (self.percentile(percentage, key), len(self._sorted.get(key, ())))
+        return result
+
+    @classmethod
+    def from_store(cls, conn=None):
+        """Build the index from every final assessment in the SQLite store."""
+        import store
+
+        conn = conn or store.connect()
+        index = cls()
+        rows = conn.execute(
+            "SELECT id, battalion, total_md, percentage FROM assessments "
+            "WHERE status = 'final' AND percentage IS NOT NULL"
+        ).fetchall()
+        grouped = {}
+        for assessment_id, battalion, total_md, percentage in rows:
+            keys = populations(battalion, total_md)
+            index._members[assessment_id] = (keys, float(percentage))
+            for key in keys:
+                grouped.setdefault(key, []).append(float(percentage))
+        index._sorted = {key: sorted(scores) for key, scores in grouped.items()}
+        return index
@@ -0,0 +1,278 @@
+"""Declarative registry of the 29 CQI handbook items.
+
+Every item carries its widget options, the points each option is worth, the
+maximum score, whether it may be marked N/A and when a comment is required.
+The Streamlit app, the scoring engine and the offline tools all read the
+rules from here instead of hard-coding them per item.
+"""
+from dataclasses import dataclass, field
+
+HANDBOOK_TITLE = "DEC 2023 - CONSTRUCTION QUALITY INSPECTION (CQI) HANDBOOK"
+# Edition the item points below belong to; saved with every assessment (see rubrics.py).
+HANDBOOK_VERSION = "2023-12"
+
+# -------------------------------------------------------------------
+# Handbook Amplifying Info for Items 1–29 (sample text; update as needed)
+# -------------------------------------------------------------------
+handbook_info = {
+    "Item 1 – Self Assessment": "Has the unit completed an initial self-assessment CQI checklist? (Yes = 2 pts, No = 0 pts)",
+    "Item 2 – Self Assessment Submission": "Were the self-assessment results submitted to 30 NCR SharePoint at least 7 days prior to inspection? (Yes = 2 pts, No = 0 pts)",
+    "Item 3 – Notice to Proceed (NTP)": "Has a project confirmation/turnover brief been conducted with 30 NCR resulting in receiving a NTP? (Yes = 4 pts, No = 0 pts)",
+    "Item 4 – Project Schedule": "Is the unit achieving the given tasking? (Exact = 16 pts; Within deviation = 12 pts; Outside deviation = 4 pts; Not monitored = 0 pts)",
+    "Item 5 – Project Management": "Is a project management tool/CPM being utilized? (Yes = 2 pts, No = 0 pts)",
+    "Item 6 – QA for 30 NCR Detail Sites": "QA involvement: (4 pts = Zero discrepancies; 3 pts = Acceptable; 2 pts = Multiple discrepancies; 0 pts = No QA involvement)",
+    "Item 7 & 8 – FAR/RFI": "Inspect FAR/RFI log for continuity. (4 pts = 100% logged; 3 pts = Acceptable; 2 pts = Missing; 0 pts = Not tracked)",
+    "Item 9 – DFOW Sheet": "Ensure the DFOW sheet is accurate and updated. (4 pts = Accurate; 3 pts = Acceptable; 2 pts = Incorrect; 0 pts = Blank)",
+    "Item 10 – Turnover Projects": "Review turnover memorandum. (4 pts = Validated discrepancies with rework plan; 0 pts = No documentation)",
+    "Item 11 – Funds Provided": "Are project funds tracked? (4 pts = Monitored; 0 pts = Not monitored)",
+    "Item 12 – Estimate at Completion Cost (EAC)": "EAC accuracy. (4 pts = Accurate; 3 pts = Acceptable; 2 pts = Low accuracy; 0 pts = ≤59% accuracy)",
+    "Item 13 – Current Expenditures": "Verify current expenditures. (4 pts = Accurate; 3 pts = Acceptable; 2 pts = Discrepancies; 0 pts = ≤59% accuracy)",
+    "Item 14 – Project Material Status Report (PMSR)": "Inspect PMSR. (10 pts = 100% valid; 8 pts = Acceptable; 4 pts = Discrepancies; 2/0 pts otherwise)",
+    "Item 15 – Report Submission": "Are PMSR and EAC reports routed monthly? (2 pts = Yes; 0 pts = No)",
+    "Item 16 – Materials On-Hand": "Materials on-hand verification. (10 pts = Organized; 8 pts = Minor issues; 4 pts = Multiple issues; 0 pts = Unsatisfactory)",
+    "Item 17 – DD Form 200": "DD Form 200 status. (2 pts = Correct; 0 pts = Not maintained)",
+    "Item 18 – Borrowed Material Tickler File": "Borrow log verification. (2 pts = Valid; 0 pts = Not managed)",
+    "Item 19 – Project Brief": "Project brief quality. (5 pts = Detailed; 3 pts = Acceptable; 2/0 pts otherwise)",
+    "Item 20 – Calculate Manday Capability": "Crew composition & MD capability. (6 pts = Matches; 4/2/0 pts otherwise)",
+    "Item 21 – Equipment": "Equipment adequacy. (6 pts = All onsite; 4 pts = Acceptable; 2/0 pts otherwise)",
+    "Item 22 – CASS Spot Check": "CASS review. (12 pts = 100% compliant; 8/4/0 pts otherwise)",
+    "Item 23 – Designation Letters": "Designation letters status. (5 pts = Current; 3 pts = Not up-to-date; 0 pts = Missing)",
+    "Item 24 – Job Box Review": "Review jobsite board items. (20 pts maximum; deductions apply)",
+    "Item 25 – Review QC Package": "QC package review. (8 pts = Comprehensive; 6/4/0 pts otherwise)",
+    "Item 26 – Submittals": "Material submittals. (4 pts = Current; 2 pts = Not current; 0 pts = Not submitted)",
+    "Item 27a – QC Inspection Plan": "QC Inspection Plan. (10 pts = 100% quantifiable; 7/3/0 pts otherwise)",
+    "Item 27b – QC Inspection": "On-site QC inspection. (5 pts = No discrepancies; 0 pts otherwise)",
+    "Item 28 – Job Box Review (QC)": "Review QC plan and daily QC reports. (5 pts = Up-to-date; deductions apply)",
+    "Item 29 – Job Box Review (Safety)": "Review safety plan, daily safety reports, and emergency contacts. (5 pts = Up-to-date; deductions apply)"
+}
+
+# -------------------------------------------------------------------
+# Item 4 – Project Schedule inputs
+# -------------------------------------------------------------------
+SCHEDULE_INPUT_KEYS = ("total_md_input", "planned_wip_input", "actual_wip_input")
+SCHEDULE_DEFAULTS = {"total_md_input": 1000, "planned_wip_input": 100, "actual_wip_input": 100}
+SCHEDULE_OPTIONS = ("Exact", "Within deviation", "Outside deviation", "Not monitored")
+
+
+def allowed_deviation(total_md):
+    """Allowed work-in-place deviation (%) for a project of total_md mandays."""
+    if total_md < 1000:
+        return 10
+    elif total_md < 2000:
+        return 5
+    return 2.5
+
+
+def size_band(total_md):
+    """Project-size band label, matching the allowed_deviation thresholds."""
+    if total_md < 1000:
+        return "< 1000 MD"
+    elif total_md < 2000:
+        return "1000-1999 MD"
+    return ">= 2000 MD"
+
+
+def schedule_response(total_md, planned_wip, actual_wip):
+    """Map the Item 4 work-in-place inputs onto one of SCHEDULE_OPTIONS."""
+    diff = abs(actual_wip - planned_wip)
+    if diff == 0:
+        return "Exact"
+    elif diff <= allowed_deviation(total_md):
+        return "Within deviation"
+    return "Outside deviation"
+
+
+# -------------------------------------------------------------------
+# Item definitions
+# -------------------------------------------------------------------
+@dataclass(frozen=True)
+class Item:
+    """One handbook line item and the rules used to score and validate it."""
+    key: str
+    title: str
+    kind: str
+    options: tuple
+    points: tuple
+    label: str = ""
+    _index: dict = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        index = {}
+        for i, option in enumerate(self.options):
+            index[option] = i
+            index[str(option)] = i
+        object.__setattr__(self, "_index", index)
+        if not self.label:
+            object.__setattr__(self, "label", f"Item {self.key}")
+
+    @property
+    def info(self):
+        return handbook_info[self.title]
+
+    @property
+    def option_index(self):
+        """Mapping of each option (and its str() form) to its code."""
+        return self._index
+
+    @property
+    def max_points(self):
+        return max(p for p in self.points if p is not None)
+
+    @property
+    def allows_na(self):
+        return None in self.points
+
+    @property
+    def widget_key(self):
+        """Session-state key of the input widget (None for the computed Item 4)."""
+        if self.kind == "yes_no":
+            return f"item{self.key}_response"
+        if self.kind == "select":
+            return f"item{self.key}_score"
+        if self.kind == "deduction":
+            return f"deduction{self.key}_input"
+        return None
+
+    @property
+    def comment_key(self):
+        return f"item{self.key}_comment"
+
+    @property
+    def comment_label(self):
+        if self.kind == "deduction":
+            return "Comment (if deduction applied):"
+        return "Comment (if not perfect):"
+
+    def code(self, response):
+        """Index of response within options; raises ValueError if unknown."""
+        try:
+            return self._index[response]
+        except (KeyError, TypeError):
+            pass
+        try:
+            return self._index[str(response).strip()]
+        except KeyError:
+            raise ValueError(f"{self.label}: invalid response {response!r}") from None
+
+    def score(self, response):
+        """Points for response, or None when the item is N/A."""
+        return self.points[self.code(response)]
+
+    def needs_comment(self, response):
+        """True when response is neither perfect nor N/A."""
+        points = self.score(response)
+        return points is not None and points != self.max_points
+
+    def comment_error(self):
+        verb = "require" if self.label.startswith("Items") else "requires"
+        if self.kind == "deduction":
+            condition = "if a deduction is applied"
+        elif self.kind == "yes_no" or self.allows_na:
+            condition = "if not perfect"
+        else:
+            condition = f"if score is not {self.max_points}"
+        return f"{self.label} {verb} a comment {condition}."
+
+
+def _yes_no(key, title, points):
+    return Item(key, title, "yes_no", ("Yes", "No"), (points, 0))
+
+
+def _select(key, title, options, label=""):
+    return Item(key, title, "select", tuple(options), tuple(options), label)
+
+
+def _deduction(key, title, max_points):
+    deductions = tuple(range(max_points + 1))
+    return Item(key, title, "deduction", deductions, tuple(max_points - d for d in deductions))
+
+
+ITEMS = (
+    _yes_no("1", "Item 1 – Self Assessment", 2),
+    _yes_no("2", "Item 2 – Self Assessment Submission", 2),
+    _yes_no("3", "Item 3 – Notice to Proceed (NTP)", 4),
+    Item("4", "Item 4 – Project Schedule", "schedule", SCHEDULE_OPTIONS, (16, 12, 4, 0)),
+    _yes_no("5", "Item 5 – Project Management", 2),
+    _select("6", "Item 6 – QA for 30 NCR Detail Sites", [4, 3, 2, 0]),
+    _select("78", "Item 7 & 8 – FAR/RFI", [4, 3, 2, 0], label="Items 7 & 8"),
+    _select("9", "Item 9 – DFOW Sheet", [4, 3, 2, 0]),
+    Item("10", "Item 10 – Turnover Projects", "select", ("N/A", 4, 0), (None, 4, 0)),
+    _yes_no("11", "Item 11 – Funds Provided", 4),
+    _select("12", "Item 12 – Estimate at Completion Cost (EAC)", [4, 3, 2, 0]),
+    _select("13", "Item 13 – Current Expenditures", [4, 3, 2, 0]),
+    _select("14", "Item 14 – Project Material Status Report (PMSR)", [10, 8, 4, 2, 0]),
+    _yes_no("15", "Item 15 – Report Submission", 2),
+    _select("16", "Item 16 – Materials On-Hand", [10, 8, 4, 0]),
+    _yes_no("17", "Item 17 – DD Form 200", 2),
+    _yes_no("18", "Item 18 – Borrowed Material Tickler File", 2),
+    _select("19", "Item 19 – Project Brief", [5, 3, 2, 0]),
+    _select("20", "Item 20 – Calculate Manday Capability", [6, 4, 2, 0]),
+    _select("21", "Item 21 – Equipment", [6, 4, 2, 0]),
+    _select("22", "Item 22 – CASS Spot Check", [12, 8, 4, 0]),
+    _select("23", "Item 23 – Designation Letters", [5, 3, 0]),
+    _deduction("24", "Item 24 – Job Box Review", 20),
+    _select("25", "Item 25 – Review QC Package", [8, 6, 4, 0]),
+    _select("26", "Item 26 – Submittals", [4, 2, 0]),
+    _select("27a", "Item 27a – QC Inspection Plan", [10, 7, 3, 0]),
+    _select("27b", "Item 27b – QC Inspection", [5, 0]),
+    _deduction("28", "Item 28 – Job Box Review (QC)", 5),
+    _deduction("29", "Item 29 – Job Box Review (Safety)", 5),
+)
+
+ITEMS_BY_KEY = {item.key: item for item in ITEMS}
+MAX_SCORE = sum(item.max_points for item in ITEMS)
+
+# Form sections: each one re-executes on its own when its inputs change.
+SECTIONS = (
+    ("Self Assessment & Schedule", ("1", "2", "3", "4", "5")),
+    ("Quality Assurance & Documentation", ("6", "78", "9", "10")),
+    ("Funds & Materials", ("11", "12", "13", "14", "15", "16", "17", "18")),
+    ("Planning & Resources", ("19", "20", "21", "22", "23")),
+    ("Job Box & Quality Control", ("24", "25", "26", "27a", "27b", "28", "29")),
+)
+
+# -------------------------------------------------------------------
+# Project information (report label, widget key)
+# -------------------------------------------------------------------
+PROJECT_FIELDS = (
+    ("Project Name:", "proj_name_input"),
+    ("Battalion:", "battalion_input"),
+    ("OIC:", "oic_name_input"),
+    ("AOIC:", "aoic_input"),
+    ("Start Date:", "start_date_input"),
+    ("Planned Start:", "planned_start_input"),
+    ("Planned Completion:", "planned_completion_input"),
+    ("Actual Completion:", "actual_completion_input"),
+)
+
+assert [item.title for item in ITEMS] == list(handbook_info), "registry out of sync with handbook_info"
+assert sorted(k for _, keys in SECTIONS for k in keys) == sorted(ITEMS_BY_KEY), "SECTIONS must cover every item once"
+
+
+def item_response(item, state):
+    """Raw response for item from a widget-keyed mapping (e.g. st.session_state)."""
+    if item.kind == "schedule":
+        values = [state.get(k, SCHEDULE_DEFAULTS[k]) for k in SCHEDULE_INPUT_KEYS]
+        return schedule_response(*(float(v) for v in values))
+    return state.get(item.widget_key, item.options[0])
+
+
+def item_comment(item, state):
+    return state.get(item.comment_key) or ""
+
+
+def collect_assessment(state):
+    """Copy the assessment's widget values out of state into a plain dict.
+
+    Comments are only kept for items that currently need one, matching
+    what the form shows.
+    """
+    assessment = {key: state.get(key) for _, key in PROJECT_FIELDS}
+    for key in SCHEDULE_INPUT_KEYS:
+        assessment[key] = state.get(key, SCHEDULE_DEFAULTS[key])
+    for item in ITEMS:
+        if item.widget_key:
+            assessment[item.widget_key] = state.get(item.widget_key, item.options[0])
+        needs_comment = item.needs_comment(item_response(item, assessment))
+        assessment[item.comment_key] = item_comment(item, state) if needs_comment else ""
+    return assessment
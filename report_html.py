@@ -0,0 +1,286 @@
+"""Printable HTML report built from pre-compiled templates, with a render cache.
+
+The report is assembled from independent sections (project information,
+assessment rows, comments, final score, signatures). Everything that never
+changes between reports (the head and stylesheet, each item's escaped title
+cell and comment heading) is compiled once at import. Each rendered section
+is cached in a bounded LRU keyed by a hash of the normalized content it
+depends on, so re-printing an unchanged report, or one where only the
+signature changed, reuses the sections that did not change.
+
+Comment pages are not left to the browser's layout. They are drawn from
+the same positioned lines as the PDF (``report_pdf.comment_pages``): one
+absolutely positioned box per line, in millimetres on A4 pages. They are
+set in a subset of the bundled DejaVuSans.ttf holding only the glyphs the
+pages use (``report_pdf.font_subset``), embedded as an ``@font-face`` data
+URL, so the browser measures with the same advance widths as the layout.
+Long appendices therefore print with the same line and page breaks as the
+PDF, and the browser never has to re-flow them. The font is added when the
+report is returned and is kept out of the render cache.
+"""
+import base64
+import functools
+import hashlib
+import html
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from string import Template
+
+from registry import ITEMS, MAX_SCORE, PROJECT_FIELDS, SCHEDULE_INPUT_KEYS, item_comment, item_response
+from report_pdf import (
+    BASE_GLYPHS, COMMENT_STYLES, CONTENT_W, MARGIN, PAGE_H, comment_pages, field_value, font_subset, glyph_key,
+)
+from signatures import canvas_key, to_svg
+
+CACHE_SIZE = 128
+FONT_FAMILY = "CQI DejaVu Sans"
+
+
+# -------------------------------------------------------------------
+# Bounded LRU shared by every session in the process
+# -------------------------------------------------------------------
+def content_hash(value):
+    """Stable sha1 of any JSON-able value (dates and other objects via str)."""
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """Thread-safe LRU of rendered report parts keyed by (kind, content hash)."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_render(self, kind, content, render):
+        """Return the cached value for (kind, content), calling render() on a miss."""
+        key = (kind, content_hash(content))
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "maxsize": self.maxsize}
+
+
+report_cache = RenderCache()
+
+
+def normalize(state):
+    """The subset of a widget-keyed assessment that the printed reports depend on."""
+    return {
+        "project": [field_value(state, key) for _, key in PROJECT_FIELDS],
+        "schedule": [state.get(key) for key in SCHEDULE_INPUT_KEYS],
+        "responses": [str(item_response(item, state)) for item in ITEMS],
+        "comments": [item_comment(item, state) for item in ITEMS],
+    }
+
+
+# -------------------------------------------------------------------
+# Pre-compiled templates and static parts
+# -------------------------------------------------------------------
+@functools.lru_cache(maxsize=16)
+def font_face(glyphs):
+    """<style> with an @font-face embedding the layout font's subset for glyphs (a glyph_key)."""
+    program = zlib.decompress(font_subset(glyphs).program.encode("latin-1"))
+    data = base64.b64encode(program).decode("ascii")
+    return (
+        f'    <style>@font-face {{ font-family: "{FONT_FAMILY}"; '
+        f'src: url(data:font/ttf;base64,{data}) format("truetype"); }}</style>\n'
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def comment_glyphs(comments):
+    """glyph_key of everything the comment pages draw, plus printable ASCII so most reports share one subset."""
+    used = {ord(c) for page in comment_pages(comments) for line in page for c in line.text}
+    return glyph_key(used | BASE_GLYPHS)
+
+
+OPEN = "<html>\n  <head>\n"
+
+HEAD = Template("""  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+      body { font-family: Arial, sans-serif; margin: 20px; }
+      table { width: 100%; height: 100%; border-collapse: collapse; margin-bottom: 20px; }
+      th, td { border: 1px solid #000; padding: 6px; text-align: left; }
+      th { background-color: #f2f2f2; }
+      .assessment-table tr td:nth-child(1),
+      .assessment-table tr td:nth-child(2) {
+          border-bottom: 2px solid #000;
+      }
+      .signature { border: 1px solid #000; width: 300px; height: 70px; display: block; margin-bottom: 20px; }
+      h2, h3, h4 { text-align: center; }
+      @page { size: A4; margin: ${margin}mm; }
+      @media print { body { margin: 0; } }
+      .comment-page { page-break-before: always; break-inside: avoid; position: relative;
+                      width: ${width}mm; height: ${height}mm; font-family: "${family}"; }
+      .comment-page div { position: absolute; left: 0; width: ${width}mm; padding: 0 1mm;
+                          box-sizing: border-box; white-space: pre; }
+      .comment-page .title { text-align: center; }
+${line_styles}
+    </style>
+  </head>
+  <body>
+    <h2>Construction Quality Inspection Report</h2>
+""").substitute(
+    family=FONT_FAMILY,
+    margin=MARGIN,
+    width=CONTENT_W,
+    height=PAGE_H - 2 * MARGIN - 1,  # a hair under the printable height so no page spills
+    line_styles="\n".join(
+        f"      .comment-page .{kind} {{ font-size: {style.size}pt; height: {style.height}mm; "
+        f"line-height: {style.height}mm; }}"
+        for kind, style in COMMENT_STYLES.items()
+    ),
+)
+
+TAIL = """
+    <script>
+      window.onload = function() {
+         // Print only once the embedded font is in, or the comment pages would be set in a fallback.
+         document.fonts.ready.then(function() { window.print(); });
+      };
+    </script>
+  </body>
+</html>
+"""
+
+PROJECT_TEMPLATE = Template(
+    "    <h3>Project Information</h3>\n"
+    + "".join(f"    <p><strong>{html.escape(label)}</strong> ${key}</p>\n" for label, key in PROJECT_FIELDS)
+)
+
+ITEMS_TEMPLATE = Template("""
+    <h3>Assessment Details</h3>
+    <table class="assessment-table">
+      <tr>
+        <th>Item</th>
+        <th>Score</th>
+      </tr>$rows
+    </table>
+""")
+
+FINAL_TEMPLATE = Template("""
+    <h3>Final Score</h3>
+    <p><strong>Final Score:</strong> $score out of $possible</p>
+    <p><strong>Final Percentage:</strong> $percentage%</p>
+""")
+
+SIGNATURES_TEMPLATE = Template("""
+    <h4>OIC Signature: $oic_name</h4>
+    $oic_svg
+    <h4>AOIC Signature: $aoic</h4>
+    $ncr_svg
+""")
+
+COMMENT_PAGE_OPEN = '\n    <div class="comment-page">'
+COMMENT_PAGE_CLOSE = "\n    </div>"
+
+BLANK_SIGNATURE = '<div class="signature"></div>'
+
+# Per-item fragments with the escaped title baked in.
+_ROW_OPEN = tuple(f"\n      <tr>\n        <td>{html.escape(item.title)}</td>\n        <td>" for item in ITEMS)
+_ROW_CLOSE = "</td>\n      </tr>"
+
+
+# -------------------------------------------------------------------
+# Sections
+# -------------------------------------------------------------------
+def _text(value):
+    """A user-supplied value as escaped HTML text."""
+    return html.escape(str(value))
+
+
+def project_section(project):
+    return PROJECT_TEMPLATE.substitute({key: _text(value) for (_, key), value in zip(PROJECT_FIELDS, project)})
+
+
+def items_section(state):
+    parts = []
+    for i, item in enumerate(ITEMS):
+        points = item.score(item_response(item, state))
+        parts.append(_ROW_OPEN[i] + ("N/A" if points is None else str(points)) + _ROW_CLOSE)
+    return ITEMS_TEMPLATE.substitute(rows="".join(parts))
+
+
+def comments_section(comments):
+    parts = []
+    for page in comment_pages(tuple(comments)):
+        parts.append(COMMENT_PAGE_OPEN)
+        parts.extend(
+            f'\n      <div class="{line.kind}" style="top: {line.y - MARGIN:g}mm">{_text(line.text)}</div>'
+            for line in page
+        )
+        parts.append(COMMENT_PAGE_CLOSE)
+    return "".join(parts) + "\n"
+
+
+def final_section(final):
+    return FINAL_TEMPLATE.substitute(score=_text(final[0]), possible=_text(final[1]), percentage=_text(final[2]))
+
+
+def signatures_section(oic_name, aoic, signatures):
+    oic_svg = to_svg(signatures.get("oic"))
+    ncr_svg = to_svg(signatures.get("ncr"))
+    return SIGNATURES_TEMPLATE.substitute(
+        oic_name=_text(oic_name), aoic=_text(aoic), oic_svg=oic_svg or BLANK_SIGNATURE, ncr_svg=ncr_svg or BLANK_SIGNATURE
+    )
+
+
+def render_report(state, signatures=None, final=None, cache=report_cache):
+    """Full printable HTML for a widget-keyed assessment.
+
+    signatures maps "oic"/"ncr" to canvas stroke JSON; final is the
+    (score, possible, percentage) shown in the Final Score block and
+    defaults to ("N/A", MAX_SCORE, "N/A") before the score is calculated.
+    """
+    signatures = signatures or {}
+    final = tuple(final or ("N/A", MAX_SCORE, "N/A"))
+    content = normalize(state)
+    signature_keys = {role: canvas_key(signatures.get(role)) for role in ("oic", "ncr")}
+    oic_name, aoic = content["project"][2], content["project"][3]
+
+    def build():
+        return "".join((
+            HEAD,
+            cache.get_or_render("project", content["project"], lambda: project_section(content["project"])),
+            cache.get_or_render(
+                "items", [content["schedule"], content["responses"]], lambda: items_section(state)
+            ),
+            cache.get_or_render("final", final, lambda: final_section(final)),
+            cache.get_or_render(
+                "signatures",
+                [oic_name, aoic, signature_keys],
+                lambda: signatures_section(oic_name, aoic, signatures),
+            ),
+            cache.get_or_render("comments", content["comments"], lambda: comments_section(content["comments"])),
+            TAIL,
+        ))
+
+    # The embedded font is shared by many reports, so it stays out of the cached string.
+    body = cache.get_or_render("report", [content, signature_keys, final], build)
+    return OPEN + font_face(comment_glyphs(tuple(content["comments"]))) + body
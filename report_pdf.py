@@ -0,0 +1,458 @@
+"""PDF report engine built on fpdf and the bundled DejaVuSans.ttf.
+
+The TrueType font is parsed once per process and installed into every
+document from that cache. Each document embeds only a subset of the font's
+glyphs: those the static layout uses, plus printable ASCII. Building a
+subset (the glyph program, width array and CID map) is the most expensive
+part of writing a PDF, so finished subsets are cached per glyph set. Most
+reports then share one cached subset.
+
+The static page furniture (title, field labels, table headers, item titles
+and handbook text) is laid out once into raw page streams. Each report
+copies those streams and only draws its own values on top. Comment pages
+are laid out by text_layout, which the printed HTML report shares.
+``render_many`` fans reports out over a process pool so a whole battalion's
+reports use every core.
+
+    python report_pdf.py archive.jsonl reports/ --workers 8
+"""
+import argparse
+import collections
+import datetime
+import functools
+import itertools
+import json
+import os
+import string
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import fpdf
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+from registry import HANDBOOK_TITLE, ITEMS, ITEMS_BY_KEY, PROJECT_FIELDS, item_comment, item_response
+from scoring import score_state
+from signatures import draw_pdf
+from text_layout import FONT_PATH, Style, font_file, paginate
+
+# Keep fpdf from dropping a DejaVuSans.pkl metrics cache next to the font;
+# the parsed metrics are cached in memory instead.
+fpdf.set_global("FPDF_CACHE_MODE", 1)
+
+FONT_FAMILY = "dejavu"
+
+REPORT_TITLE = "Construction Quality Inspection Report"
+SIGNATURE_ROLES = (("OIC Signature", "oic_name_input"), ("AOIC Signature", "aoic_input"))
+
+MARGIN = 15
+PAGE_W, PAGE_H = 210, 297
+CONTENT_W = PAGE_W - 2 * MARGIN
+LABEL_W = 45
+SCORE_W = 25
+ITEM_W = CONTENT_W - SCORE_W
+LINE_H = 5
+SIGNATURE_W, SIGNATURE_H = 80, 15
+# Always embedded, so reports whose values and comments are plain ASCII share one font subset.
+BASE_GLYPHS = frozenset(ord(c) for c in string.printable if c.isprintable())
+SUBSET_CACHE_SIZE = 64
+# Comment pages: the same geometry is used for the printed HTML report.
+COMMENT_STYLES = {"title": Style(13, 8), "heading": Style(11, 7), "body": Style(10, LINE_H)}
+COMMENT_TEXT_W = CONTENT_W - 2  # inside fpdf's 1 mm cell padding
+
+
+def field_value(state, key):
+    """Display value of a project-information field ("N/A" when blank)."""
+    value = state.get(key)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value) if value not in (None, "") else "N/A"
+
+
+# -------------------------------------------------------------------
+# Process-wide font cache
+# -------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
+def load_font(path=FONT_PATH):
+    """Parse the TrueType font once per process and return its metrics dict."""
+    ttf = font_file(path)
+    return {
+        "name": ttf.fullName.replace(" ", "").replace("(", "").replace(")", ""),
+        "type": "TTF",
+        "desc": {
+            "Ascent": int(round(ttf.ascent)),
+            "Descent": int(round(ttf.descent)),
+            "CapHeight": int(round(ttf.capHeight)),
+            "Flags": ttf.flags,
+            "FontBBox": "[%s %s %s %s]" % tuple(int(round(b)) for b in ttf.bbox),
+            "ItalicAngle": int(ttf.italicAngle),
+            "StemV": int(round(ttf.stemV)),
+            "MissingWidth": int(round(ttf.defaultWidth)),
+        },
+        "up": round(ttf.underlinePosition),
+        "ut": round(ttf.underlineThickness),
+        "cw": ttf.charWidths,
+        "ttffile": path,
+        "originalsize": os.stat(path).st_size,
+    }
+
+
+def install_font(pdf, subset=()):
+    """Register the cached font with pdf, the way FPDF.add_font(uni=True) would."""
+    font = load_font()
+    pdf.fonts[FONT_FAMILY] = {
+        "i": len(pdf.fonts) + 1, "type": font["type"], "name": font["name"],
+        "desc": font["desc"], "up": font["up"], "ut": font["ut"], "cw": font["cw"],
+        "ttffile": font["ttffile"], "fontkey": FONT_FAMILY,
+        "subset": list(range(32)) + list(subset), "unifilename": None,
+    }
+    pdf.font_files[FONT_FAMILY] = {"length1": font["originalsize"], "type": "TTF", "ttffile": font["ttffile"]}
+    pdf.font_files[font["ttffile"]] = {"type": "TTF"}
+
+
+class _Lines:
+    """Stand-in for FPDF that collects what _putTTfontwidths writes."""
+
+    def __init__(self):
+        self.lines = []
+
+    def _out(self, line):
+        self.lines.append(line)
+
+
+@dataclass(frozen=True)
+class FontSubset:
+    """The embeddable pieces of one glyph subset, ready to copy into a document."""
+    program: str  # FlateDecoded TrueType subset, as latin-1 text like fpdf's buffer
+    program_size: int
+    widths: tuple  # the CIDFont's /W lines
+    cid_to_gid: str  # FlateDecoded CIDToGIDMap
+
+
+def glyph_key(subset):
+    """Cache key for a document's subset list (fpdf drops code point 0 before subsetting)."""
+    return tuple(sorted(set(subset) - {0}))
+
+
+@functools.lru_cache(maxsize=SUBSET_CACHE_SIZE)
+def font_subset(glyphs, path=FONT_PATH):
+    """Build (once per process and glyph set) the subset font for the code points in glyphs."""
+    font = load_font(path)
+    ttf = TTFontFile()
+    program = ttf.makeSubset(path, list(glyphs))
+    widths = _Lines()
+    FPDF._putTTfontwidths(widths, dict(font, subset=list(glyphs), unifilename=None), ttf.maxUni)
+    cid_to_gid = bytearray(256 * 256 * 2)
+    for code, glyph in ttf.codeToGlyph.items():
+        cid_to_gid[code * 2] = glyph >> 8
+        cid_to_gid[code * 2 + 1] = glyph & 0xFF
+    return FontSubset(
+        zlib.compress(program).decode("latin-1"), len(program), tuple(widths.lines),
+        zlib.compress(bytes(cid_to_gid)).decode("latin-1"),
+    )
+
+
+class ReportPDF(FPDF):
+    """FPDF that embeds the report font from the font_subset cache."""
+
+    def _putfonts(self):
+        # Reports only ever use the one cached TrueType font; anything else takes fpdf's path.
+        font = self.fonts.get(FONT_FAMILY)
+        if font is None or len(self.fonts) != 1 or self.diffs:
+            return super()._putfonts()
+        cached = font_subset(glyph_key(font["subset"]), font["ttffile"])
+        name = "MPDFAA+" + font["name"]
+        font["n"] = self.n + 1
+        # Same objects, in the same order, as fpdf's own TTF embedding.
+        self._newobj()
+        self._out("<</Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H" % name)
+        self._out("/DescendantFonts [%d 0 R] /ToUnicode %d 0 R>>" % (self.n + 1, self.n + 2))
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Type /Font /Subtype /CIDFontType2 /BaseFont /%s" % name)
+        self._out("/CIDSystemInfo %d 0 R /FontDescriptor %d 0 R" % (self.n + 2, self.n + 3))
+        if font["desc"].get("MissingWidth"):
+            self._out("/DW %d" % font["desc"]["MissingWidth"])
+        for line in cached.widths:
+            self._out(line)
+        self._out("/CIDToGIDMap %d 0 R>>" % (self.n + 4))
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Length %d>>" % len(TO_UNICODE))
+        self._putstream(TO_UNICODE)
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Registry (Adobe) /Ordering (UCS) /Supplement 0>>")
+        self._out("endobj")
+        self._newobj()
+        desc = dict(font["desc"], Flags=(font["desc"]["Flags"] | 4) & ~32)  # nonsymbolic
+        self._out("<</Type /FontDescriptor /FontName /" + name + "".join(
+            " /%s %s" % (key, desc[key])
+            for key in ("Ascent", "Descent", "CapHeight", "Flags", "FontBBox", "ItalicAngle", "StemV", "MissingWidth")
+        ) + " /FontFile2 %d 0 R>>" % (self.n + 2))
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Length %d /Filter /FlateDecode>>" % len(cached.cid_to_gid))
+        self._putstream(cached.cid_to_gid)
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Length %d /Filter /FlateDecode /Length1 %d>>" % (len(cached.program), cached.program_size))
+        self._putstream(cached.program)
+        self._out("endobj")
+
+
+TO_UNICODE = (
+    "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n/CIDSystemInfo\n"
+    "<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>> def\n/CMapName /Adobe-Identity-UCS def\n"
+    "/CMapType 2 def\n1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n1 beginbfrange\n"
+    "<0000> <FFFF> <0000>\nendbfrange\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+)
+
+
+def new_document():
+    pdf = ReportPDF("P", "mm", "A4")
+    pdf.set_margins(MARGIN, MARGIN, MARGIN)
+    pdf.set_auto_page_break(False)
+    return pdf
+
+
+# -------------------------------------------------------------------
+# Static layout (rendered once per process)
+# -------------------------------------------------------------------
+@dataclass
+class StaticLayout:
+    """Pre-rendered page streams plus the slots reports fill in."""
+    pages: list = field(default_factory=list)
+    slots: dict = field(default_factory=dict)  # name -> (page, x, y, w, h)
+    subset: tuple = ()
+    end_y: float = 0.0
+
+
+def _table_header(pdf):
+    pdf.set_font(FONT_FAMILY, "", 10)
+    pdf.set_fill_color(242, 242, 242)
+    pdf.cell(ITEM_W, 7, "Item", border=1, fill=1)
+    pdf.cell(SCORE_W, 7, "Score", border=1, ln=1, align="C", fill=1)
+
+
+@functools.lru_cache(maxsize=None)
+def static_layout():
+    """Render the report furniture once and capture the raw page streams."""
+    pdf = new_document()
+    install_font(pdf)
+    layout = StaticLayout()
+    pdf.add_page()
+    # add_page() leaves font selection in the stream; capture from here on.
+    starts = {1: len(pdf.pages[1])}
+
+    pdf.set_font(FONT_FAMILY, "", 16)
+    pdf.cell(0, 10, REPORT_TITLE, ln=1, align="C")
+    pdf.set_font(FONT_FAMILY, "", 9)
+    pdf.cell(0, 5, HANDBOOK_TITLE, ln=1, align="C")
+    pdf.ln(3)
+    pdf.set_font(FONT_FAMILY, "", 13)
+    pdf.cell(0, 8, "Project Information", ln=1, align="C")
+    pdf.set_font(FONT_FAMILY, "", 10)
+    for label, key in PROJECT_FIELDS:
+        layout.slots[key] = (pdf.page, MARGIN + LABEL_W, pdf.get_y(), CONTENT_W - LABEL_W, 6)
+        pdf.cell(LABEL_W, 6, label, ln=1)
+    pdf.ln(3)
+    pdf.set_font(FONT_FAMILY, "", 13)
+    pdf.cell(0, 8, "Assessment Details", ln=1, align="C")
+    _table_header(pdf)
+
+    for item in ITEMS:
+        pdf.set_font(FONT_FAMILY, "", 9)
+        text = f"{item.title}\n{item.info}"
+        lines = len(pdf.multi_cell(ITEM_W - 2, LINE_H, text, split_only=True))
+        height = lines * LINE_H + 2
+        if pdf.get_y() + height > PAGE_H - MARGIN:
+            pdf.add_page()
+            starts[pdf.page] = len(pdf.pages[pdf.page])
+            _table_header(pdf)
+            pdf.set_font(FONT_FAMILY, "", 9)
+        x, y = pdf.get_x(), pdf.get_y()
+        pdf.rect(x, y, ITEM_W, height)
+        pdf.rect(x + ITEM_W, y, SCORE_W, height)
+        pdf.set_xy(x + 1, y + 1)
+        pdf.multi_cell(ITEM_W - 2, LINE_H, text)
+        layout.slots[item.key] = (pdf.page, x + ITEM_W, y, SCORE_W, height)
+        pdf.set_xy(x, y + height)
+
+    layout.end_y = pdf.get_y()
+    layout.pages = [
+        "q\n" + pdf.pages[n][starts[n]:] + "Q\n" for n in range(1, pdf.page + 1)
+    ]
+    layout.subset = tuple(sorted(set(pdf.fonts[FONT_FAMILY]["subset"]) | BASE_GLYPHS))
+    return layout
+
+
+# -------------------------------------------------------------------
+# Comment pages
+# -------------------------------------------------------------------
+def comment_heading(item):
+    return f"{item.title} - Comment"
+
+
+@functools.lru_cache(maxsize=256)
+def comment_pages(comments):
+    """Pages of positioned Lines for a report's comments (one per item, blanks skipped)."""
+    blocks = [(comment_heading(item), comment) for item, comment in zip(ITEMS, comments) if comment.strip()]
+    return paginate("Comments", blocks, COMMENT_TEXT_W, MARGIN, PAGE_H - MARGIN, COMMENT_STYLES)
+
+
+# -------------------------------------------------------------------
+# Per-assessment rendering
+# -------------------------------------------------------------------
+def _fill(pdf, slot, text, align="L"):
+    _, x, y, w, h = slot
+    pdf.set_xy(x, y)
+    pdf.cell(w, h, text, align=align)
+
+
+def _draw_signature(pdf, signature, x, y):
+    if not signature:
+        return
+    if isinstance(signature, (dict, list)):
+        draw_pdf(pdf, signature, x + 1, y + 1, SIGNATURE_W - 2, SIGNATURE_H - 2)
+        return
+    with tempfile.NamedTemporaryFile(suffix=".png") as fh:
+        fh.write(signature)
+        fh.flush()
+        pdf.image(fh.name, x, y, SIGNATURE_W, SIGNATURE_H, type="PNG")
+
+
+def render_pdf(state, signatures=None):
+    """Render one assessment to PDF bytes.
+
+    state is a widget-keyed mapping (``st.session_state`` or a batch
+    record). signatures optionally maps "oic"/"ncr" to canvas stroke JSON
+    (drawn as vector paths) or PNG bytes; by default the stroke JSON saved
+    under ``oic_signature_data`` / ``ncr_signature_data`` is used.
+    """
+    if signatures is None:
+        signatures = {role: state.get(f"{role}_signature_data") for role in ("oic", "ncr")}
+    layout = static_layout()
+    pdf = new_document()
+    install_font(pdf, layout.subset)
+
+    for n, stream in enumerate(layout.pages, 1):
+        pdf.add_page()
+        pdf.set_font(FONT_FAMILY, "", 10)
+        pdf.pages[n] += stream
+        for key, slot in layout.slots.items():
+            if slot[0] != n:
+                continue
+            item = ITEMS_BY_KEY.get(key)
+            if item is not None:
+                points = item.score(item_response(item, state))
+                _fill(pdf, slot, "N/A" if points is None else str(points), align="C")
+            else:
+                _fill(pdf, slot, field_value(state, key))
+
+    total, possible, percentage = score_state(state)
+    pdf.set_xy(MARGIN, layout.end_y + 4)
+    if pdf.get_y() + 70 > PAGE_H - MARGIN:
+        pdf.add_page()
+    pdf.set_font(FONT_FAMILY, "", 13)
+    pdf.cell(0, 8, "Final Score", ln=1, align="C")
+    pdf.set_font(FONT_FAMILY, "", 10)
+    pdf.cell(0, 6, f"Final Score: {total} out of {possible}", ln=1)
+    pdf.cell(0, 6, f"Final Percentage: {percentage}%", ln=1)
+    pdf.ln(2)
+    for (role, name_key), sig_key in zip(SIGNATURE_ROLES, ("oic", "ncr")):
+        pdf.cell(0, 6, f"{role}: {field_value(state, name_key)}", ln=1, align="C")
+        x, y = (PAGE_W - SIGNATURE_W) / 2, pdf.get_y()
+        pdf.rect(x, y, SIGNATURE_W, SIGNATURE_H)
+        _draw_signature(pdf, signatures.get(sig_key), x, y)
+        pdf.set_xy(MARGIN, y + SIGNATURE_H + 3)
+
+    for page in comment_pages(tuple(item_comment(item, state) for item in ITEMS)):
+        pdf.add_page()
+        for line in page:
+            pdf.set_font(FONT_FAMILY, "", COMMENT_STYLES[line.kind].size)
+            pdf.set_xy(MARGIN, line.y)
+            pdf.cell(CONTENT_W, COMMENT_STYLES[line.kind].height, line.text, align="C" if line.kind == "title" else "")
+
+    return pdf.output(dest="S").encode("latin-1")
+
+
+# -------------------------------------------------------------------
+# Process pool
+# -------------------------------------------------------------------
+def _warm():
+    load_font()
+    font_subset(glyph_key([*range(32), *static_layout().subset]))
+
+
+def _render_job(job):
+    state, signatures = job
+    return render_pdf(state, signatures)
+
+
+def _render_chunk(jobs):
+    return [_render_job(job) for job in jobs]
+
+
+def render_many(states, signatures=None, workers=None, chunksize=4, mp_context=None):
+    """Render many assessments in a process pool; yields PDF bytes in input order.
+
+    Each worker parses the font and lays out the static furniture once,
+    then reuses them for every report it renders. Pass a multiprocessing
+    context (e.g. ``get_context("forkserver")``) when calling from a
+    multi-threaded server, where forking the whole process is unsafe.
+    """
+    signatures = signatures or itertools.repeat(None)
+    jobs = zip(states, signatures)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _warm()
+        for job in jobs:
+            yield _render_job(job)
+        return
+    in_flight = workers * 4  # chunks of chunksize jobs
+    pending = collections.deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm, mp_context=mp_context) as pool:
+        # A sliding window: every chunk taken off the front is replaced right
+        # away, so workers stay busy while huge inputs never sit in memory at once.
+        try:
+            while True:
+                while len(pending) < in_flight:
+                    chunk = list(itertools.islice(jobs, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(pool.submit(_render_chunk, chunk))
+                if not pending:
+                    break
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render CQI assessment reports to PDF.")
+    parser.add_argument("input", help="JSONL file of widget-keyed assessments")
+    parser.add_argument("outdir", help="directory for the generated PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    start = time.perf_counter()
+    count = 0
+    with open(args.input, encoding="utf-8") as fh:
+        states = (json.loads(line) for line in fh if line.strip())
+        for count, pdf_bytes in enumerate(render_many(states, workers=args.workers), 1):
+            with open(os.path.join(args.outdir, f"report_{count:06d}.pdf"), "wb") as out:
+                out.write(pdf_bytes)
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {count:,} reports in {elapsed:.2f}s: {count / max(elapsed, 1e-9):,.1f} reports/sec", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
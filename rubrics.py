@@ -0,0 +1,261 @@
+"""Versioned handbook rubrics compiled into cached scoring tables.
+
+The registry always describes the current handbook (``HANDBOOK_VERSION``).
+Other editions are JSON files in ``RUBRIC_DIR`` that give the points for
+each item's options, in option order (``null`` marks N/A):
+
+    {"version": "2023-12", "title": "DEC 2023 - ...", "points": {"1": [2, 0], "10": [null, 4, 0], ...}}
+
+A file may name a ``"base"`` version and list only the items that differ.
+Editions may change point values but not the options themselves, so an
+option code means the same answer under every version. This lets stored
+raw responses be projected onto any edition. Each version is compiled once
+into the same (29, options) points table the scoring engine uses.
+
+Before editing the registry for a new handbook, run ``freeze`` to keep the
+outgoing edition:
+
+    python rubrics.py list
+    python rubrics.py freeze
+    python rubrics.py rescore 2023-12 rescored.csv --battalion "NMCB 133"
+"""
+import argparse
+import csv
+import functools
+import glob
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import store
+from registry import HANDBOOK_TITLE, HANDBOOK_VERSION, ITEMS, ITEMS_BY_KEY
+from scoring import MAX_OPTIONS, N_ITEMS, score
+
+RUBRIC_DIR = os.environ.get("CQI_RUBRIC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rubrics"))
+ITEM_COLUMNS = {item.key: i for i, item in enumerate(ITEMS)}
+
+
+@dataclass(frozen=True)
+class Rubric:
+    """One handbook edition: points per option for every item, plus its compiled tables."""
+    version: str
+    title: str
+    points: dict = field(repr=False)  # item key -> tuple of points per option (None = N/A)
+    table: np.ndarray = field(repr=False, compare=False, default=None)
+    max_points: np.ndarray = field(repr=False, compare=False, default=None)
+
+    def __post_init__(self):
+        table = np.full((N_ITEMS, MAX_OPTIONS), np.nan)
+        for i, item in enumerate(ITEMS):
+            table[i, :len(item.options)] = [np.nan if p is None else p for p in self.points[item.key]]
+        table.setflags(write=False)
+        maxima = np.nanmax(table, axis=1)
+        maxima.setflags(write=False)
+        object.__setattr__(self, "table", table)
+        object.__setattr__(self, "max_points", maxima)
+
+    @property
+    def max_score(self):
+        return int(self.max_points.sum())
+
+    def score(self, codes):
+        """(totals, possible, percentages) for an (N, 29) code matrix under this edition."""
+        return score(codes, self.table, self.max_points)
+
+
+def _check_points(version, points):
+    for key, values in points.items():
+        item = ITEMS_BY_KEY.get(key)
+        if item is None:
+            raise ValueError(f"rubric {version}: unknown item {key!r}")
+        if len(values) != len(item.options):
+            raise ValueError(
+                f"rubric {version}: {item.label} needs {len(item.options)} point values, got {len(values)}"
+            )
+        if all(v is None for v in values):
+            raise ValueError(f"rubric {version}: {item.label} has no scoring option")
+    missing = [key for key in ITEMS_BY_KEY if key not in points]
+    if missing:
+        raise ValueError(f"rubric {version}: no points for items {', '.join(missing)}")
+
+
+# -------------------------------------------------------------------
+# Definitions and the compiled cache
+# -------------------------------------------------------------------
+@functools.lru_cache(maxsize=1)
+def _definitions(directory=RUBRIC_DIR):
+    """{version: definition dict} for every rubric file in directory."""
+    definitions = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as fh:
+            definition = json.load(fh)
+        definitions[definition["version"]] = definition
+    return definitions
+
+
+def versions():
+    """Every known edition, oldest first (version strings sort by date)."""
+    return sorted({HANDBOOK_VERSION, *_definitions()})
+
+
+def _points(version, seen=()):
+    if version == HANDBOOK_VERSION:
+        return HANDBOOK_TITLE, {item.key: item.points for item in ITEMS}
+    definition = _definitions().get(version)
+    if definition is None:
+        raise KeyError(f"unknown rubric version {version!r}; known: {', '.join(versions())}")
+    if version in seen:
+        raise ValueError(f"rubric {version}: circular base")
+    points = {}
+    if definition.get("base"):
+        _, points = _points(definition["base"], (*seen, version))
+        points = dict(points)
+    points.update({key: tuple(values) for key, values in definition["points"].items()})
+    return definition.get("title", version), points
+
+
+@functools.lru_cache(maxsize=None)
+def get(version=None):
+    """The compiled Rubric for version (default: the current handbook)."""
+    version = version or HANDBOOK_VERSION
+    title, points = _points(version)
+    _check_points(version, points)
+    return Rubric(version, title, points)
+
+
+def freeze(directory=RUBRIC_DIR):
+    """Write the registry's current points to <directory>/<HANDBOOK_VERSION>.json; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{HANDBOOK_VERSION}.json")
+    definition = {
+        "version": HANDBOOK_VERSION,
+        "title": HANDBOOK_TITLE,
+        "points": {item.key: list(item.points) for item in ITEMS},
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(definition, fh, indent=1)
+        fh.write("\n")
+    _definitions.cache_clear()
+    return path
+
+
+# -------------------------------------------------------------------
+# Re-scoring stored assessments
+# -------------------------------------------------------------------
+def _backfill_codes(conn, ids):
+    """Rebuild response_codes for assessments saved before the column existed.
+
+    Assessments holding a response that is not one of its item's options
+    are left without codes, and a ValueError lists them once the others
+    are stored.
+    """
+    codes = {assessment_id: np.zeros(N_ITEMS, dtype=np.int8) for assessment_id in ids}
+    invalid = {}  # assessment id -> first bad response message
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        for assessment_id, item_key, response in conn.execute(
+            "SELECT assessment_id, item_key, response FROM item_scores "
+            f"WHERE assessment_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ):
+            if item_key in ITEM_COLUMNS:
+                try:
+                    codes[assessment_id][ITEM_COLUMNS[item_key]] = ITEMS_BY_KEY[item_key].code(response)
+                except ValueError as exc:
+                    invalid.setdefault(assessment_id, str(exc))
+    for assessment_id in invalid:
+        del codes[assessment_id]
+    with store.transaction(conn):
+        conn.executemany(
+            "UPDATE assessments SET response_codes = ? WHERE id = ?",
+            [(row.tobytes(), assessment_id) for assessment_id, row in codes.items()],
+        )
+    if invalid:
+        listed = "; ".join(f"#{assessment_id} ({message})" for assessment_id, message in sorted(invalid.items())[:20])
+        more = f"; and {len(invalid) - 20:,} more" if len(invalid) > 20 else ""
+        raise ValueError(f"cannot re-score {len(invalid):,} assessment(s) with unknown responses: {listed}{more}")
+    return {assessment_id: row.tobytes() for assessment_id, row in codes.items()}
+
+
+def stored_codes(battalion=None, conn=None):
+    """(rows, codes) for stored assessments from their raw item responses.
+
+    rows are dicts of id, battalion, inspection_date, rubric_version and
+    the recorded percentage; codes is the matching (N, 29) code matrix,
+    read straight from each assessment's response_codes blob. Raises
+    ValueError naming any assessment with a response that is not an option.
+    """
+    conn = conn or store.connect()
+    where, params = ("WHERE battalion = ?", (battalion,)) if battalion is not None else ("", ())
+    rows, blobs = [], []
+    for r in conn.execute(
+        "SELECT id, battalion, inspection_date, rubric_version, percentage, response_codes FROM assessments "
+        f"{where} ORDER BY id",
+        params,
+    ):
+        rows.append({k: r[k] for k in ("id", "battalion", "inspection_date", "rubric_version", "percentage")})
+        blobs.append(r["response_codes"])
+    missing = [row["id"] for row, blob in zip(rows, blobs) if blob is None]
+    if missing:
+        filled = _backfill_codes(conn, missing)
+        blobs = [filled[row["id"]] if blob is None else blob for row, blob in zip(rows, blobs)]
+    codes = np.frombuffer(b"".join(blobs), dtype=np.int8).reshape(len(rows), N_ITEMS)
+    return rows, codes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage handbook rubric versions and re-score the archive.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show the known rubric versions")
+    sub.add_parser("freeze", help="save the registry's current points as a rubric file")
+    rescore = sub.add_parser("rescore", help="project stored assessments onto a rubric version")
+    rescore.add_argument("version")
+    rescore.add_argument("output", help="CSV file ('-' for stdout)")
+    rescore.add_argument("--battalion")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for version in versions():
+            rubric = get(version)
+            marker = " (current)" if version == HANDBOOK_VERSION else ""
+            print(f"{version}{marker}  max {rubric.max_score}  {rubric.title}")
+        return 0
+    if args.command == "freeze":
+        print(f"Wrote {freeze()}")
+        return 0
+
+    rubric = get(args.version)
+    started = time.perf_counter()
+    try:
+        rows, codes = stored_codes(args.battalion)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    loaded = time.perf_counter()
+    totals, possible, percentages = rubric.score(codes)
+    scored = time.perf_counter()
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.writer(out)
+        writer.writerow(("id", "battalion", "inspection_date", "recorded_version", "recorded_percentage",
+                         "version", "total", "possible", "percentage"))
+        for row, total, poss, pct in zip(rows, totals.tolist(), possible.tolist(), percentages.tolist()):
+            writer.writerow((row["id"], row["battalion"], row["inspection_date"], row["rubric_version"],
+                             row["percentage"], rubric.version, total, poss, pct))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(
+        f"Re-scored {len(rows):,} assessments onto {rubric.version}: "
+        f"read {loaded - started:.2f}s, scored {(scored - loaded) * 1000:.1f} ms",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
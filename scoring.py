@@ -0,0 +1,151 @@
+"""Vectorized NumPy scoring engine built on the item registry.
+
+Assessments are encoded as an (N, 29) integer matrix of option codes, one
+column per registry item. A single fancy-index into the compiled points
+table turns the whole matrix into points, so archives of tens of thousands
+of inspections are re-scored in one pass.
+"""
+import numpy as np
+
+from registry import ITEMS, SCHEDULE_DEFAULTS, SCHEDULE_INPUT_KEYS, item_response
+
+N_ITEMS = len(ITEMS)
+ITEM_KEYS = tuple(item.key for item in ITEMS)
+SCHEDULE_COL = ITEM_KEYS.index("4")
+
+# -------------------------------------------------------------------
+# Compiled lookup tables
+# -------------------------------------------------------------------
+# POINTS[i, c] is the score of option c for item i (NaN for N/A and padding).
+MAX_OPTIONS = max(len(item.options) for item in ITEMS)
+POINTS = np.full((N_ITEMS, MAX_OPTIONS), np.nan)
+for _i, _item in enumerate(ITEMS):
+    POINTS[_i, :len(_item.points)] = [np.nan if p is None else p for p in _item.points]
+POINTS.setflags(write=False)
+
+N_OPTIONS = np.array([len(item.options) for item in ITEMS], dtype=np.int16)
+# (item, widget key, default option, option index) per input-driven column, for encoding.
+_INPUT_COLUMNS = tuple(
+    (i, item, item.widget_key, item.options[0], item.option_index)
+    for i, item in enumerate(ITEMS)
+    if item.kind != "schedule"
+)
+SCHEDULE_ITEM = ITEMS[ITEM_KEYS.index("4")]
+MAX_POINTS = np.array([item.max_points for item in ITEMS], dtype=np.float64)
+_ROWS = np.arange(N_ITEMS)
+
+
+# -------------------------------------------------------------------
+# Encoding
+# -------------------------------------------------------------------
+def encode(state):
+    """Encode one widget-keyed assessment mapping into a row of option codes."""
+    return np.array([item.code(item_response(item, state)) for item in ITEMS], dtype=np.int8)
+
+
+def encode_many(states):
+    """Encode an iterable of widget-keyed mappings into an (N, 29) code matrix."""
+    rows = [encode(state) for state in states]
+    if not rows:
+        return np.empty((0, N_ITEMS), dtype=np.int8)
+    return np.vstack(rows)
+
+
+def encode_records(records):
+    """Column-wise encode a list of widget-keyed mappings.
+
+    Returns (codes, errors): an (N, 29) code matrix and a dict mapping row
+    index to an error message for records holding an unknown response
+    (their code rows are left at 0).
+    """
+    codes, problems = encode_checked(records)
+    errors = {}
+    for r, _, message in problems:
+        errors.setdefault(r, message)
+    return codes, errors
+
+
+def encode_checked(records):
+    """Like encode_records, but report every bad input as (row, item index, message)."""
+    n = len(records)
+    codes = np.empty((N_ITEMS, n), dtype=np.int8)  # filled column by column, transposed at the end
+    problems = []
+    inputs = np.empty((n, 3))
+    for r, record in enumerate(records):
+        try:
+            inputs[r] = schedule_inputs(record)
+        except (TypeError, ValueError):
+            inputs[r] = [SCHEDULE_DEFAULTS[k] for k in SCHEDULE_INPUT_KEYS]
+            problems.append((r, SCHEDULE_COL, f"{SCHEDULE_ITEM.label}: invalid work-in-place inputs"))
+    codes[SCHEDULE_COL] = schedule_codes(inputs[:, 0], inputs[:, 1], inputs[:, 2])
+    for i, item, key, default, index in _INPUT_COLUMNS:
+        values = [record.get(key, default) for record in records]
+        try:
+            column = [index.get(value, -1) for value in values]
+        except TypeError:  # unhashable value somewhere in the chunk
+            column = [-1] * n
+        if -1 in column:
+            for r, code in enumerate(column):
+                if code < 0:
+                    try:
+                        column[r] = item.code(values[r])
+                    except ValueError as exc:
+                        problems.append((r, i, str(exc)))
+                        column[r] = 0
+        codes[i] = column
+    problems.sort()
+    return np.ascontiguousarray(codes.T), problems
+
+
+def schedule_codes(total_md, planned_wip, actual_wip):
+    """Vectorized Item 4 option codes for arrays of work-in-place inputs."""
+    total_md = np.asarray(total_md, dtype=np.float64)
+    diff = np.abs(np.asarray(actual_wip, dtype=np.float64) - np.asarray(planned_wip, dtype=np.float64))
+    allowed = np.where(total_md < 1000, 10.0, np.where(total_md < 2000, 5.0, 2.5))
+    return np.where(diff == 0, 0, np.where(diff <= allowed, 1, 2)).astype(np.int8)
+
+
+def schedule_inputs(state):
+    """Item 4 inputs from a widget-keyed mapping, falling back to the app defaults."""
+    return tuple(float(state.get(k, SCHEDULE_DEFAULTS[k])) for k in SCHEDULE_INPUT_KEYS)
+
+
+# -------------------------------------------------------------------
+# Scoring
+# -------------------------------------------------------------------
+def check_codes(codes):
+    """Validate an (N, 29) code matrix, returning it as an integer array."""
+    codes = np.asarray(codes)
+    if codes.ndim != 2 or codes.shape[1] != N_ITEMS:
+        raise ValueError(f"expected an (N, {N_ITEMS}) code matrix, got shape {codes.shape}")
+    if codes.size and ((codes < 0) | (codes >= N_OPTIONS)).any():
+        raise ValueError("option code out of range for at least one item")
+    return codes
+
+
+def points_matrix(codes, points_table=POINTS):
+    """Per-item points for every assessment; N/A items come back as NaN."""
+    codes = check_codes(codes)
+    return points_table[_ROWS, codes]
+
+
+def score(codes, points_table=POINTS, max_points=MAX_POINTS):
+    """Score an (N, 29) code matrix.
+
+    Returns (totals, possible, percentages). As on the handbook's score
+    sheet, items answered N/A earn no points and the possible score is
+    always the edition's full maximum (registry.MAX_SCORE for the current
+    one), so every assessment is scored out of the same total.
+    """
+    points = points_matrix(codes, points_table)
+    totals = np.where(np.isnan(points), 0.0, points).sum(axis=1)
+    possible = np.full(len(totals), max_points.sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentages = np.round(np.where(possible > 0, totals / possible * 100, 0.0), 1)
+    return totals.astype(np.int32), possible.astype(np.int32), percentages
+
+
+def score_state(state):
+    """Score a single widget-keyed assessment; returns (total, possible, percentage)."""
+    totals, possible, percentages = score(encode(state)[None, :])
+    return int(totals[0]), int(possible[0]), float(percentages[0])
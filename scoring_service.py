@@ -0,0 +1,370 @@
+"""Asyncio HTTP scoring service with micro-batched scoring.
+
+A dependency-free HTTP/1.1 server (keep-alive, JSON in and out) for tools
+that need CQI scores without the Streamlit UI:
+
+    POST /score   one widget-keyed assessment (same keys as the app and
+                  batch_score.py: item1_response, item6_score,
+                  deduction24_input, total_md_input, ..., item4_comment)
+                  or a JSON list of them
+    GET  /health
+    GET  /stats   request, batch and latency counters
+
+Concurrent requests are queued and scored together. The first waiting
+request opens a batch. The batch keeps taking requests that arrive while
+the event loop serves other connections, and closes when a loop pass
+brings nothing new, after ``max_delay`` seconds, or at ``max_batch``
+assessments. The whole batch goes through one validation and scoring
+pass (validation.py, rubrics.py). Each response carries total, possible,
+percentage and structured validation errors.
+
+    python scoring_service.py serve --port 8610
+    python scoring_service.py loadtest --connections 1,16,64 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+import rubrics
+from validation import INVALID_RESPONSE, validate_many
+
+DEFAULT_PORT = 8610
+MAX_BATCH = 256
+MAX_DELAY = 0.002
+MAX_BODY = 1 << 20
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+# -------------------------------------------------------------------
+# Micro-batching
+# -------------------------------------------------------------------
+class MicroBatcher:
+    """Collect concurrently submitted assessments and score them in one pass."""
+
+    def __init__(self, rubric=None, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.rubric = rubric or rubrics.get()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.scored = 0
+        self.largest = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def score(self, records):
+        """Results for a list of assessments, scored alongside whatever else is queued."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for record in records:
+            future = loop.create_future()
+            self.queue.put_nowait((record, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            # Keep collecting while requests keep arriving, up to max_delay;
+            # a lone request is scored as soon as one loop pass adds nothing.
+            while len(batch) < self.max_batch and loop.time() < deadline:
+                await asyncio.sleep(0)
+                if self.queue.empty():
+                    break
+                while not self.queue.empty() and len(batch) < self.max_batch:
+                    batch.append(self.queue.get_nowait())
+            self._resolve(batch)
+            self.batches += 1
+            self.scored += len(batch)
+            self.largest = max(self.largest, len(batch))
+
+    def _resolve(self, batch):
+        """Score a batch and settle its futures; never raises, so the loop keeps running."""
+        try:
+            results = self.score_now([r for r, _ in batch])
+        except Exception as exc:
+            if len(batch) > 1:
+                # Score one at a time so a bad record fails only its own request.
+                for entry in batch:
+                    self._resolve([entry])
+                return
+            (_, future), = batch
+            if not future.done():
+                future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def score_now(self, records):
+        """One validation and scoring pass over records; returns one result dict each."""
+        codes, issues = validate_many(records)
+        totals, possible, percentages = self.rubric.score(codes)
+        results = []
+        for r, record_issues in enumerate(issues):
+            errors = [{"item": i.item_key, "rule": i.rule, "message": i.message} for i in record_issues]
+            if any(i.rule == INVALID_RESPONSE for i in record_issues):
+                results.append({"total": None, "possible": None, "percentage": None, "errors": errors})
+            else:
+                results.append({
+                    "total": int(totals[r]),
+                    "possible": int(possible[r]),
+                    "percentage": float(percentages[r]),
+                    "errors": errors,
+                })
+        return results
+
+
+# -------------------------------------------------------------------
+# HTTP
+# -------------------------------------------------------------------
+class ScoringService:
+    """Minimal keep-alive HTTP/1.1 front end for a MicroBatcher."""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.requests = 0
+        self.latency_total = 0.0
+        self.started = time.time()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._send(writer, 400, {"error": "malformed request line"}, close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._send(writer, 400, {"error": "invalid Content-Length"}, close=True)
+                    break
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                close = headers.get("connection", "").lower() == "close"
+                try:
+                    status, payload = await self.route(method, path.split("?")[0], body)
+                except Exception as exc:
+                    status, payload = 500, {"error": f"internal error: {type(exc).__name__}"}
+                await self._send(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats()
+        if path != "/score":
+            return 404, {"error": f"no route {path}"}
+        if method != "POST":
+            return 405, {"error": "POST an assessment (or a list of them) as JSON"}
+        started = time.perf_counter()
+        try:
+            payload = json.loads(body or b"null")
+        except RecursionError:
+            return 400, {"error": "invalid JSON: nested too deeply"}
+        except ValueError as exc:  # includes bodies that are not UTF-8
+            return 400, {"error": f"invalid JSON: {exc}"}
+        records = payload if isinstance(payload, list) else [payload]
+        if not records or not all(isinstance(r, dict) for r in records):
+            return 400, {"error": "expected a JSON object or a list of objects keyed by the app's widget keys"}
+        try:
+            results = await self.batcher.score(records)
+        except (TypeError, ValueError, OverflowError) as exc:
+            return 400, {"error": f"could not score the assessment: {exc}"}
+        self.requests += 1
+        self.latency_total += time.perf_counter() - started
+        return 200, results if isinstance(payload, list) else results[0]
+
+    async def _send(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def stats(self):
+        b = self.batcher
+        return {
+            "requests": self.requests,
+            "assessments": b.scored,
+            "batches": b.batches,
+            "mean_batch": b.scored / b.batches if b.batches else 0.0,
+            "largest_batch": b.largest,
+            "mean_latency_ms": self.latency_total / self.requests * 1000 if self.requests else 0.0,
+            "uptime_s": time.time() - self.started,
+            "rubric": b.rubric.version,
+        }
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, rubric=None, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+    batcher = MicroBatcher(rubric, max_batch, max_delay)
+    batcher.start()
+    service = ScoringService(batcher)
+    server = await asyncio.start_server(service.handle, host, port, backlog=1024)
+    print(f"Scoring service on http://{host}:{port} (max batch {max_batch}, max delay {max_delay * 1000:g} ms)",
+          file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+# -------------------------------------------------------------------
+# Load test
+# -------------------------------------------------------------------
+async def _client(host, port, payloads, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in payloads:
+            started = time.perf_counter()
+            writer.write(
+                f"POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if b" 200 " not in status:
+                raise RuntimeError(status.decode("latin-1").strip())
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def run_level(host, port, connections, requests, payloads):
+    """Fire requests over `connections` keep-alive connections; returns (latencies s, wall s)."""
+    per_connection = [
+        [payloads[(i + n * connections) % len(payloads)] for n in range(max(1, requests // connections))]
+        for i in range(connections)
+    ]
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, p, latencies) for p in per_connection))
+    return np.array(latencies), time.perf_counter() - started
+
+
+def _fetch_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as resp:
+        return json.load(resp)
+
+
+def start_server(port, max_batch):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve", "--port", str(port), "--max-batch", str(max_batch)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("scoring service did not start within 30 s")
+
+
+def loadtest(levels, requests, port, max_batches, seed=0):
+    import synthetic
+
+    states = synthetic.assessments(1000, seed=seed)
+    payloads = []
+    for state in states:
+        state = {k: v for k, v in state.items() if not k.endswith("_signature_data")}
+        payloads.append(json.dumps(state, default=str).encode("utf-8"))
+    print(f"{'max batch':>9} {'conns':>6} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'mean batch':>10}")
+    for max_batch in max_batches:
+        server = start_server(port, max_batch)
+        try:
+            for connections in levels:
+                before = _fetch_stats(port)
+                latencies, wall = asyncio.run(run_level("127.0.0.1", port, connections, requests, payloads))
+                after = _fetch_stats(port)
+                batches = after["batches"] - before["batches"]
+                mean_batch = (after["assessments"] - before["assessments"]) / batches if batches else 0.0
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                print(f"{max_batch:9d} {connections:6d} {len(latencies):9d} {len(latencies) / wall:8.0f} "
+                      f"{p50:8.2f} {p95:8.2f} {p99:8.2f} {mean_batch:10.1f}", flush=True)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CQI scoring over HTTP, with micro-batching.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="run the service")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p_serve.add_argument("--rubric", help="handbook version to score with (default: current)")
+    p_serve.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    p_serve.add_argument("--max-delay-ms", type=float, default=MAX_DELAY * 1000)
+    p_load = sub.add_parser("loadtest", help="start the service locally and measure it")
+    p_load.add_argument("--connections", default="1,16,64", help="comma-separated concurrency levels")
+    p_load.add_argument("--requests", type=int, default=5000, help="requests per level")
+    p_load.add_argument("--max-batch", default=f"1,{MAX_BATCH}", help="comma-separated batch limits to compare")
+    p_load.add_argument("--port", type=int, default=DEFAULT_PORT + 1)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, rubrics.get(args.rubric), args.max_batch, args.max_delay_ms / 1000))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    loadtest(
+        [int(n) for n in args.connections.split(",") if n.strip()],
+        args.requests,
+        args.port,
+        [int(n) for n in args.max_batch.split(",") if n.strip()],
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
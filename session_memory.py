@@ -0,0 +1,144 @@
+"""Bounded per-session storage for signature strokes.
+
+Sessions keep their signatures here rather than in ``st.session_state``.
+Each signature is held as compact_strokes bytes under a per-session byte
+budget. Sessions that have not run for ``idle_seconds`` have their
+signatures spilled to one small file each and dropped from memory. The
+next run of that session reads them back transparently. Spill files from
+sessions that never come back are removed after ``spill_max_age``.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from signatures import compact_strokes, expand_strokes
+
+SPILL_DIR = os.environ.get("CQI_SPILL_DIR", os.path.join(tempfile.gettempdir(), "cqi-signature-spill"))
+SESSION_BUDGET = int(os.environ.get("CQI_SESSION_BUDGET", 16 * 1024))
+IDLE_SECONDS = float(os.environ.get("CQI_IDLE_SECONDS", 300))
+SPILL_MAX_AGE = 7 * 24 * 3600
+
+
+class SignatureVault:
+    """Process-wide {session: {role: compact strokes}} with a byte budget and disk spill."""
+
+    def __init__(self, spill_dir=SPILL_DIR, budget=SESSION_BUDGET, idle_seconds=IDLE_SECONDS,
+                 spill_max_age=SPILL_MAX_AGE):
+        self.spill_dir = spill_dir
+        self.budget = budget
+        self.idle_seconds = idle_seconds
+        self.spill_max_age = spill_max_age
+        self.spills = 0
+        self._last_prune = 0.0
+        self._sessions = {}  # session id -> {role: bytes}
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    def _load(self, session_id):
+        """The session's signatures, reading them back from disk if they were spilled."""
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            return entry
+        entry = {}
+        path = self._spill_path(session_id)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                entry = {role: bytes.fromhex(blob) for role, blob in json.load(fh).items()}
+            os.remove(path)
+        self._sessions[session_id] = entry
+        return entry
+
+    # ---------------------------------------------------------------
+    # Per-session access
+    # ---------------------------------------------------------------
+    def put(self, session_id, role, json_data):
+        """Store a drawing (None or blank clears it), fitting the session budget."""
+        with self._lock:
+            entry = self._load(session_id)
+            self._last_seen[session_id] = time.monotonic()
+            others = sum(len(blob) for r, blob in entry.items() if r != role)
+            blob = compact_strokes(json_data, budget=max(self.budget - others, 0))
+            if blob:
+                entry[role] = blob
+            else:
+                entry.pop(role, None)
+
+    def get(self, session_id, role):
+        """Canvas JSON for a stored signature, or None."""
+        with self._lock:
+            entry = self._load(session_id)
+            self._last_seen[session_id] = time.monotonic()
+            blob = entry.get(role)
+        return expand_strokes(blob)
+
+    def usage(self, session_id):
+        """(bytes held for the session, budget)."""
+        with self._lock:
+            entry = self._sessions.get(session_id) or {}
+            return sum(len(blob) for blob in entry.values()), self.budget
+
+    # ---------------------------------------------------------------
+    # Idle eviction
+    # ---------------------------------------------------------------
+    def sweep(self, now=None):
+        """Spill signatures of sessions idle for longer than idle_seconds; returns how many."""
+        now = time.monotonic() if now is None else now
+        spilled = 0
+        with self._lock:
+            for session_id, seen in list(self._last_seen.items()):
+                if now - seen < self.idle_seconds:
+                    continue
+                entry = self._sessions.pop(session_id, None)
+                del self._last_seen[session_id]
+                if entry:
+                    tmp = self._spill_path(session_id) + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as fh:
+                        json.dump({role: blob.hex() for role, blob in entry.items()}, fh)
+                    os.replace(tmp, self._spill_path(session_id))
+                    spilled += 1
+            self.spills += spilled
+        self._prune_spill_dir()
+        return spilled
+
+    def _prune_spill_dir(self):
+        # Listing the directory on every run would be wasteful; once an hour is plenty.
+        if time.time() - self._last_prune < 3600:
+            return
+        self._last_prune = time.time()
+        cutoff = time.time() - self.spill_max_age
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(len(b) for entry in self._sessions.values() for b in entry.values()),
+                "spilled": self.spills,
+            }
+
+
+def approx_size(obj, _seen=None):
+    """Rough deep size in bytes of plain Python data (dicts, lists, tuples, strings)."""
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, _seen) + approx_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, _seen) for v in obj)
+    return size
@@ -0,0 +1,205 @@
+"""Signature rendering from the canvas stroke JSON.
+
+``st_canvas`` returns both the stroke paths (``json_data``) and a full
+400x75 RGBA array. The report draws signatures straight from the strokes,
+as inline SVG for HTML and as path operators for PDF, so they stay a few
+hundred bytes and sharp at any zoom. ``canvas_key`` hashes a drawing so the
+report caches can tell when a signature changed.
+"""
+import hashlib
+import html
+import io
+import json
+import zlib
+
+
+def image_to_png(image_array):
+    """Convert a NumPy image array to full-colour PNG bytes."""
+    if image_array is None:
+        return b""
+    from PIL import Image  # only the raster paths need Pillow; strokes and reports do not
+    im = Image.fromarray((image_array).astype('uint8'))
+    buff = io.BytesIO()
+    im.save(buff, format="PNG")
+    return buff.getvalue()
+
+
+# -------------------------------------------------------------------
+# Content hash
+# -------------------------------------------------------------------
+def canvas_key(json_data, image_array=None):
+    """Stable hash of a canvas drawing, preferring the stroke JSON over pixels."""
+    if json_data is not None:
+        payload = json.dumps(json_data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    elif image_array is not None:
+        import numpy as np
+
+        payload = np.ascontiguousarray(image_array).tobytes()
+    else:
+        payload = b""
+    return hashlib.sha1(payload).hexdigest()
+
+
+# -------------------------------------------------------------------
+# Vector rendering straight from the canvas stroke JSON
+# -------------------------------------------------------------------
+# Freedraw paths are stored by fabric.js in canvas coordinates as a list of
+# ["M", x, y], ["Q", cx, cy, x, y] and ["L", x, y] commands.
+def stroke_paths(json_data):
+    """List of (stroke_width, colour, commands) for every freedraw path."""
+    paths = []
+    for obj in (json_data or {}).get("objects", []):
+        if obj.get("type") != "path" or not obj.get("path"):
+            continue
+        commands = [c for c in obj["path"] if c and c[0] in ("M", "L", "Q")]
+        if commands:
+            paths.append((float(obj.get("strokeWidth") or 1), obj.get("stroke") or "#000000", commands))
+    return paths
+
+
+def strokes_bbox(paths):
+    """(min_x, min_y, max_x, max_y) over all stroke points, padded by stroke width."""
+    xs, ys, pad = [], [], 0.0
+    for width, _, commands in paths:
+        pad = max(pad, width / 2)
+        for command in commands:
+            xs.extend(command[1::2])
+            ys.extend(command[2::2])
+    return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+
+
+def _fmt(value):
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def to_svg(json_data, css_class="signature"):
+    """Inline SVG of the signature strokes, cropped to the ink ("" if blank)."""
+    paths = stroke_paths(json_data)
+    if not paths:
+        return ""
+    x0, y0, x1, y1 = strokes_bbox(paths)
+    elements = []
+    for width, colour, commands in paths:
+        d = " ".join(c[0] + " ".join(_fmt(v) for v in c[1:]) for c in commands)
+        elements.append(f'<path d="{d}" stroke="{html.escape(colour)}" stroke-width="{_fmt(width)}"/>')
+    return (
+        f'<svg class="{css_class}" xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="{_fmt(x0)} {_fmt(y0)} {_fmt(x1 - x0)} {_fmt(y1 - y0)}" '
+        f'preserveAspectRatio="xMidYMid meet" fill="none" stroke-linecap="round" stroke-linejoin="round">'
+        + "".join(elements) + "</svg>"
+    )
+
+
+def _pdf_colour(colour):
+    colour = colour.lstrip("#")
+    if len(colour) == 3:
+        colour = "".join(ch * 2 for ch in colour)
+    try:
+        r, g, b = (int(colour[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    except ValueError:
+        r = g = b = 0.0
+    return f"{r:.3f} {g:.3f} {b:.3f} RG"
+
+
+def draw_pdf(pdf, json_data, x, y, w, h):
+    """Draw the signature strokes as PDF path operators fitted into the box (mm)."""
+    paths = stroke_paths(json_data)
+    if not paths:
+        return
+    x0, y0, x1, y1 = strokes_bbox(paths)
+    scale = min(w / max(x1 - x0, 1e-6), h / max(y1 - y0, 1e-6))
+    # Centre the drawing in the box, then convert mm to PDF points (origin bottom-left).
+    ox = x + (w - (x1 - x0) * scale) / 2
+    oy = y + (h - (y1 - y0) * scale) / 2
+    k, page_h = pdf.k, pdf.h
+
+    def pt(px, py):
+        return (ox + (px - x0) * scale) * k, (page_h - (oy + (py - y0) * scale)) * k
+
+    ops = ["q", "1 J 1 j"]
+    for width, colour, commands in paths:
+        ops.append(_pdf_colour(colour))
+        ops.append(f"{width * scale * k:.2f} w")
+        current = (0.0, 0.0)
+        for command in commands:
+            op = command[0]
+            if op == "M":
+                current = command[1:3]
+                ops.append("%.2f %.2f m" % pt(*current))
+            elif op == "L":
+                current = command[1:3]
+                ops.append("%.2f %.2f l" % pt(*current))
+            else:
+                # Quadratic -> cubic: control points sit 2/3 of the way to the Q control.
+                (cx, cy), (ex, ey) = command[1:3], command[3:5]
+                c1 = (current[0] + 2 / 3 * (cx - current[0]), current[1] + 2 / 3 * (cy - current[1]))
+                c2 = (ex + 2 / 3 * (cx - ex), ey + 2 / 3 * (cy - ey))
+                ops.append("%.2f %.2f %.2f %.2f %.2f %.2f c" % (pt(*c1) + pt(*c2) + pt(ex, ey)))
+                current = (ex, ey)
+        ops.append("S")
+    ops.append("Q")
+    pdf._out("\n".join(ops))
+
+
+# -------------------------------------------------------------------
+# Compact stroke storage
+# -------------------------------------------------------------------
+# fabric.js serialises ~30 properties per path object and every command as a
+# nested list of floats. For storage only the commands, stroke width and
+# colour matter: coordinates are quantised to 1/scale px and the lot is
+# zlib-compressed, which keeps a signature to a kilobyte or two.
+ARGS_PER_COMMAND = {"M": 2, "L": 2, "Q": 4}
+COMPACT_SCALES = (10, 2, 1)
+
+
+def _pack(paths, scale):
+    payload = [
+        [width, colour, "".join(c[0] for c in commands), [round(v * scale) for c in commands for v in c[1:]]]
+        for width, colour, commands in paths
+    ]
+    return bytes([scale]) + zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def _decimate(commands):
+    """Drop every other curve segment, keeping the pen-down point and the last point."""
+    if len(commands) <= 3:
+        return commands
+    return [commands[0]] + commands[1:-1:2] + [commands[-1]]
+
+
+def compact_strokes(json_data, budget=None):
+    """Compressed stroke-only encoding of a canvas drawing (b"" if blank).
+
+    With a byte budget, precision is reduced first (0.1 px, then 0.5 px,
+    then 1 px) and then every other segment is dropped until it fits.
+    """
+    paths = stroke_paths(json_data)
+    if not paths:
+        return b""
+    for scale in COMPACT_SCALES:
+        blob = _pack(paths, scale)
+        if budget is None or len(blob) <= budget:
+            return blob
+    while len(blob) > budget and any(len(commands) > 3 for _, _, commands in paths):
+        paths = [(width, colour, _decimate(commands)) for width, colour, commands in paths]
+        blob = _pack(paths, COMPACT_SCALES[-1])
+    return blob
+
+
+def expand_strokes(blob):
+    """Canvas JSON (loadable as st_canvas initial_drawing) from compact_strokes output."""
+    if not blob:
+        return None
+    scale = blob[0]
+    objects = []
+    for width, colour, ops, coords in json.loads(zlib.decompress(blob[1:])):
+        path, i = [], 0
+        for op in ops:
+            n = ARGS_PER_COMMAND[op]
+            path.append([op] + [v / scale for v in coords[i:i + n]])
+            i += n
+        objects.append({
+            "type": "path", "path": path, "stroke": colour, "strokeWidth": width, "fill": None,
+            "strokeLineCap": "round", "strokeLineJoin": "round",
+        })
+    return {"version": "4.4.0", "background": "#FFF", "objects": objects}
@@ -0,0 +1,102 @@
+"""Lazy module loading and a per-import startup timing report.
+
+Heavy dependencies (NumPy, Pillow, fpdf, the drawing canvas) are only
+needed once someone calculates a score, signs or prints, so the app loads
+them through ``lazy_import`` on those code paths instead of at the top of
+the script. Each first import is timed, and the app shows the timings for
+the current process.
+
+Run this module to measure what each app dependency costs a cold
+interpreter, using ``python -X importtime`` in a fresh subprocess per
+module:
+
+    python startup.py
+"""
+import importlib
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Modules the app loads on every run, and the ones it defers.
+EAGER_MODULES = ("streamlit", "registry", "store", "journal", "percentiles")
+LAZY_MODULES = (
+    "scoring",
+    "validation",
+    "columnar",
+    "deltas",
+    "wip_series",
+    "bulk_export",
+    "signatures",
+    "session_memory",
+    "report_pdf",
+    "report_html",
+    "streamlit_drawable_canvas",
+)
+
+_timings = OrderedDict()
+_lock = threading.Lock()
+
+
+def lazy_import(name):
+    """Import name on first use, recording how long the first import took."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        _timings.setdefault(name, (time.perf_counter() - start) * 1000)
+    return module
+
+
+def import_timings():
+    """[(module, ms)] for every module first loaded through lazy_import."""
+    with _lock:
+        return list(_timings.items())
+
+
+# -------------------------------------------------------------------
+# Cold-interpreter measurement
+# -------------------------------------------------------------------
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def cold_import_ms(names, preload=("streamlit",)):
+    """Cumulative import time of names in a fresh interpreter, in ms.
+
+    Modules in preload are imported first and not counted, since the
+    Streamlit server has already imported them before the script runs.
+    """
+    if isinstance(names, str):
+        names = (names,)
+    code = "; ".join(f"import {m}" for m in (*preload, *names))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    total = 0
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        # Only count top-level entries: nested ones are already in their parent's
+        # cumulative time. Everything up to the last preload line is interpreter
+        # startup or preload cost.
+        if match and len(match.group(3)) == 1:
+            total = 0 if match.group(4) in preload else total + int(match.group(2))
+    return total / 1000
+
+
+def main():
+    print(f"{'module':<28} {'cold ms':>8}")
+    for group, names in (("eager", EAGER_MODULES[1:]), ("lazy", LAZY_MODULES)):
+        for name in names:
+            print(f"{name:<28} {cold_import_ms(name):8.1f}")
+        # Shared dependencies (NumPy, Pillow) are only paid once in the combined figure.
+        print(f"{group + ' combined':<28} {cold_import_ms(names):8.1f}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
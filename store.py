@@ -0,0 +1,523 @@
+"""Local SQLite persistence for assessments, drafts and signatures.
+
+The database runs in WAL mode so other processes can read while a save is
+in flight. Each process opens one connection per database file and shares
+it between threads. Streamlit runs every rerun on a new thread, so a
+per-thread connection would re-open and re-migrate the database on every
+rerun. Statements on the shared connection are serialized by its lock, and
+writes go through ``transaction``.
+Project information lives in ``assessments``; item responses, comments and
+signature strokes are normalized into their own tables. Indexes on
+battalion, project name and inspection date keep saving, resuming and
+listing recent assessments in the millisecond range at 100k+ rows.
+Comments are also indexed with FTS5 for ranked search by term, item and
+battalion.
+"""
+import contextlib
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from registry import HANDBOOK_VERSION, ITEMS, ITEMS_BY_KEY, PROJECT_FIELDS, SCHEDULE_INPUT_KEYS, item_response
+
+DEFAULT_DB_PATH = os.environ.get(
+    "CQI_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cqi_assessments.db")
+)
+RECENT_LIMIT = 50
+SEARCH_LIMIT = 50
+SIGNATURE_KEYS = {"oic": "oic_signature_data", "ncr": "ncr_signature_data"}
+DATE_KEYS = ("start_date_input", "planned_start_input", "planned_completion_input", "actual_completion_input")
+
+ITEM_POSITIONS = {item.key: n for n, item in enumerate(ITEMS)}
+
+# Column in ``assessments`` for each project-information widget key.
+PROJECT_COLUMNS = {
+    "proj_name_input": "project_name",
+    "battalion_input": "battalion",
+    "oic_name_input": "oic",
+    "aoic_input": "aoic",
+    "start_date_input": "start_date",
+    "planned_start_input": "planned_start",
+    "planned_completion_input": "planned_completion",
+    "actual_completion_input": "actual_completion",
+    "total_md_input": "total_md",
+    "planned_wip_input": "planned_wip",
+    "actual_wip_input": "actual_wip",
+}
+assert set(PROJECT_COLUMNS) == {k for _, k in PROJECT_FIELDS} | set(SCHEDULE_INPUT_KEYS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'draft',
+    project_name TEXT NOT NULL DEFAULT '',
+    battalion TEXT NOT NULL DEFAULT '',
+    oic TEXT NOT NULL DEFAULT '',
+    aoic TEXT NOT NULL DEFAULT '',
+    start_date TEXT,
+    planned_start TEXT,
+    planned_completion TEXT,
+    actual_completion TEXT,
+    total_md REAL,
+    planned_wip REAL,
+    actual_wip REAL,
+    inspection_date TEXT NOT NULL,
+    total_score INTEGER,
+    possible_score INTEGER,
+    percentage REAL,
+    rubric_version TEXT NOT NULL DEFAULT '2023-12',
+    response_codes BLOB,  -- one int8 option code per item, for bulk re-scoring
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_assessments_battalion ON assessments (battalion, inspection_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_assessments_project ON assessments (project_name, battalion, inspection_date);
+CREATE INDEX IF NOT EXISTS idx_assessments_date ON assessments (inspection_date);
+
+CREATE TABLE IF NOT EXISTS item_scores (
+    assessment_id INTEGER NOT NULL REFERENCES assessments (id) ON DELETE CASCADE,
+    item_key TEXT NOT NULL,
+    response TEXT NOT NULL,
+    points INTEGER,
+    PRIMARY KEY (assessment_id, item_key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS comments (
+    assessment_id INTEGER NOT NULL REFERENCES assessments (id) ON DELETE CASCADE,
+    item_key TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (assessment_id, item_key)
+) WITHOUT ROWID;
+
+-- Full-text index over comments, kept in step by save() and delete().
+-- rowid = assessment_id * 64 + the item's position in ITEMS, so newer
+-- assessments have higher rowids; battalion_key is battalion_token().
+CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5 (
+    body, item_key, battalion_key, assessment_id UNINDEXED, tokenize = 'porter unicode61'
+);
+
+CREATE TABLE IF NOT EXISTS signatures (
+    assessment_id INTEGER NOT NULL REFERENCES assessments (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    strokes TEXT NOT NULL,
+    PRIMARY KEY (assessment_id, role)
+) WITHOUT ROWID;
+"""
+
+_conns = {}  # path -> Connection, for this process
+_conns_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------
+# Connections
+# -------------------------------------------------------------------
+class Connection(sqlite3.Connection):
+    """sqlite3 connection whose statements are serialized by a re-entrant lock."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+        self.pid = os.getpid()
+
+    def execute(self, *args):
+        with self.lock:
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        with self.lock:
+            return super().executemany(*args)
+
+    def executescript(self, *args):
+        with self.lock:
+            return super().executescript(*args)
+
+
+def connect(path=None):
+    """Return this process's shared connection to path, opening and migrating it once."""
+    path = path or DEFAULT_DB_PATH
+    conn = _conns.get(path)
+    if conn is not None and conn.pid == os.getpid():
+        return conn
+    with _conns_lock:
+        conn = _conns.get(path)
+        if conn is None or conn.pid != os.getpid():  # never reuse a connection across fork()
+            conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, factory=Connection)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            _migrate(conn)
+            _backfill_comment_index(conn)
+            _conns[path] = conn
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(conn):
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error), holding conn's lock throughout."""
+    with conn.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _migrate(conn):
+    """Add columns introduced after a database was created."""
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(assessments)")}
+    if "rubric_version" not in columns:
+        # Everything saved before versioning was scored with the DEC 2023 handbook.
+        conn.execute("ALTER TABLE assessments ADD COLUMN rubric_version TEXT NOT NULL DEFAULT '2023-12'")
+    if "response_codes" not in columns:
+        conn.execute("ALTER TABLE assessments ADD COLUMN response_codes BLOB")
+
+
+def close_all():
+    """Close this process's connections (used by tests and CLI tools)."""
+    with _conns_lock:
+        for conn in _conns.values():
+            conn.close()
+        _conns.clear()
+
+
+# -------------------------------------------------------------------
+# Encoding helpers
+# -------------------------------------------------------------------
+def _to_db(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _from_db_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+def _response_value(item, text):
+    """Turn a stored response back into the widget's option object."""
+    try:
+        return item.options[item.code(text)]
+    except ValueError:
+        return text
+
+
+# -------------------------------------------------------------------
+# Save / load
+# -------------------------------------------------------------------
+def save(assessment, assessment_id=None, status="draft", signatures=None, conn=None):
+    """Insert or update an assessment and its children; returns its id.
+
+    assessment is widget-keyed (see registry.collect_assessment);
+    signatures maps "oic"/"ncr" to canvas stroke JSON.
+    """
+    from scoring import encode, score  # NumPy is only needed once something is saved
+
+    conn = conn or connect()
+    codes = encode(assessment)
+    totals, possibles, percentages = score(codes[None, :])
+    total, possible, percentage = int(totals[0]), int(possibles[0]), float(percentages[0])
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    row = {column: _to_db(assessment.get(key)) for key, column in PROJECT_COLUMNS.items()}
+    for column in ("project_name", "battalion", "oic", "aoic"):
+        row[column] = row[column] or ""
+    row.update(
+        status=status,
+        total_score=total,
+        possible_score=possible,
+        percentage=percentage,
+        rubric_version=HANDBOOK_VERSION,
+        response_codes=codes.tobytes(),
+        updated_at=now,
+    )
+    inspection_date = _to_db(assessment.get("inspection_date")) or datetime.date.today().isoformat()
+
+    with transaction(conn):
+        if assessment_id is None:
+            row["inspection_date"] = inspection_date
+            columns = ", ".join(row)
+            cur = conn.execute(
+                f"INSERT INTO assessments ({columns}) VALUES ({', '.join('?' * len(row))})",
+                tuple(row.values()),
+            )
+            assessment_id = cur.lastrowid
+        else:
+            assignments = ", ".join(f"{c} = ?" for c in row)
+            conn.execute(f"UPDATE assessments SET {assignments} WHERE id = ?", (*row.values(), assessment_id))
+
+        scores = []
+        for item in ITEMS:
+            response = item_response(item, assessment)
+            scores.append((assessment_id, item.key, str(response), item.score(response)))
+        conn.executemany("INSERT OR REPLACE INTO item_scores VALUES (?, ?, ?, ?)", scores)
+
+        conn.execute("DELETE FROM comments WHERE assessment_id = ?", (assessment_id,))
+        _unindex_comments(conn, assessment_id)
+        comments = [
+            (assessment_id, item.key, assessment.get(item.comment_key))
+            for item in ITEMS
+            if (assessment.get(item.comment_key) or "").strip()
+        ]
+        conn.executemany("INSERT INTO comments VALUES (?, ?, ?)", comments)
+        conn.executemany(
+            "INSERT INTO comments_fts (rowid, body, item_key, battalion_key, assessment_id) VALUES (?, ?, ?, ?, ?)",
+            [(_fts_rowid(aid, key), body, key, battalion_token(row["battalion"]), aid) for aid, key, body in comments],
+        )
+
+        if signatures is not None:
+            conn.execute("DELETE FROM signatures WHERE assessment_id = ?", (assessment_id,))
+            conn.executemany(
+                "INSERT INTO signatures VALUES (?, ?, ?)",
+                [(assessment_id, role, json.dumps(strokes)) for role, strokes in signatures.items() if strokes],
+            )
+    return assessment_id
+
+
+def load(assessment_id, conn=None):
+    """Rebuild (assessment, signatures, meta) for a stored id, or None if missing.
+
+    assessment is widget-keyed so it can be poured back into
+    ``st.session_state`` to resume a draft.
+    """
+    conn = conn or connect()
+    row = conn.execute("SELECT * FROM assessments WHERE id = ?", (assessment_id,)).fetchone()
+    if row is None:
+        return None
+    assessment = {key: row[column] for key, column in PROJECT_COLUMNS.items()}
+    for key in DATE_KEYS:
+        assessment[key] = _from_db_date(assessment[key])
+    for key in SCHEDULE_INPUT_KEYS:
+        if assessment[key] is not None:
+            assessment[key] = int(assessment[key]) if float(assessment[key]).is_integer() else assessment[key]
+    assessment["inspection_date"] = _from_db_date(row["inspection_date"])
+
+    for item_key, response in conn.execute(
+        "SELECT item_key, response FROM item_scores WHERE assessment_id = ?", (assessment_id,)
+    ):
+        item = ITEMS_BY_KEY.get(item_key)
+        if item is not None and item.widget_key:
+            assessment[item.widget_key] = _response_value(item, response)
+    for item in ITEMS:
+        assessment[item.comment_key] = ""
+    for item_key, body in conn.execute("SELECT item_key, body FROM comments WHERE assessment_id = ?", (assessment_id,)):
+        if item_key in ITEMS_BY_KEY:
+            assessment[ITEMS_BY_KEY[item_key].comment_key] = body
+
+    signatures = {
+        role: json.loads(strokes)
+        for role, strokes in conn.execute("SELECT role, strokes FROM signatures WHERE assessment_id = ?", (assessment_id,))
+    }
+    meta = {
+        k: row[k]
+        for k in ("id", "status", "inspection_date", "total_score", "possible_score", "percentage", "rubric_version",
+                  "updated_at")
+    }
+    return assessment, signatures, meta
+
+
+def recent(battalion=None, limit=RECENT_LIMIT, status=None, conn=None):
+    """Most recent assessments, optionally for one battalion and/or status."""
+    conn = conn or connect()
+    where, params = [], []
+    if battalion is not None:
+        where.append("battalion = ?")
+        params.append(battalion)
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    sql = (
+        "SELECT id, status, project_name, battalion, inspection_date, total_score, possible_score, percentage "
+        "FROM assessments"
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + " ORDER BY inspection_date DESC, id DESC LIMIT ?"
+    )
+    return [dict(r) for r in conn.execute(sql, (*params, limit))]
+
+
+def assessment_ids(battalion=None, status=None, conn=None):
+    """Ids of every matching assessment, oldest inspection first (for bulk export)."""
+    conn = conn or connect()
+    where, params = [], []
+    if battalion is not None:
+        where.append("battalion = ?")
+        params.append(battalion)
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    sql = "SELECT id FROM assessments" + (" WHERE " + " AND ".join(where) if where else "")
+    return [r[0] for r in conn.execute(sql + " ORDER BY inspection_date, id", params)]
+
+
+def battalions(conn=None):
+    """Distinct battalion names, for filter widgets."""
+    conn = conn or connect()
+    return [r[0] for r in conn.execute("SELECT DISTINCT battalion FROM assessments ORDER BY battalion")]
+
+
+def delete(assessment_id, conn=None):
+    conn = conn or connect()
+    with transaction(conn):
+        conn.execute("DELETE FROM assessments WHERE id = ?", (assessment_id,))
+        _unindex_comments(conn, assessment_id)
+
+
+# -------------------------------------------------------------------
+# Comment search
+# -------------------------------------------------------------------
+def _fts_rowid(assessment_id, item_key):
+    return assessment_id * 64 + ITEM_POSITIONS[item_key]
+
+
+def _unindex_comments(conn, assessment_id):
+    conn.execute(
+        "DELETE FROM comments_fts WHERE rowid BETWEEN ? AND ?", (assessment_id * 64, assessment_id * 64 + 63)
+    )
+
+
+def _backfill_comment_index(conn):
+    """Index comments saved before the FTS table existed (runs once per database)."""
+    if conn.execute("SELECT 1 FROM comments_fts LIMIT 1").fetchone():
+        return
+    if not conn.execute("SELECT 1 FROM comments LIMIT 1").fetchone():
+        return
+    with transaction(conn):
+        conn.executemany(
+            "INSERT INTO comments_fts (rowid, body, item_key, battalion_key, assessment_id) VALUES (?, ?, ?, ?, ?)",
+            (
+                (_fts_rowid(aid, key), body, key, battalion_token(battalion), aid)
+                for aid, key, body, battalion in conn.execute(
+                    "SELECT c.assessment_id, c.item_key, c.body, a.battalion "
+                    "FROM comments c JOIN assessments a ON a.id = c.assessment_id"
+                ).fetchall()
+                if key in ITEM_POSITIONS
+            ),
+        )
+
+
+def battalion_token(battalion):
+    """Battalion as one index token ("NMCB 133" -> "nmcb133"), so filtering on it is a single term lookup."""
+    return re.sub(r"\W+", "", (battalion or "").lower()) or "none"
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def match_expression(query, item_key=None, battalion=None):
+    """FTS5 MATCH expression for free text plus optional item/battalion filters.
+
+    Words are matched as separate terms (all must appear); a trailing ``*``
+    keeps prefix matching. FTS syntax characters in the input are ignored.
+    """
+    terms = [
+        _phrase(word) + ("*" if star else "")
+        for word, star in re.findall(r"(\w+)(\*?)", query or "")
+    ]
+    parts = []
+    if terms:
+        parts.append("body : (" + " ".join(terms) + ")")
+    if item_key:
+        parts.append("item_key : " + _phrase(item_key))
+    if battalion:
+        parts.append("battalion_key : " + _phrase(battalion_token(battalion)))
+    return " AND ".join(parts)
+
+
+def search_comments(query, item_key=None, battalion=None, limit=SEARCH_LIMIT, conn=None):
+    """Best-matching comments first (BM25), optionally for one item and/or battalion.
+
+    Returns dicts with assessment_id, item_key, battalion, project_name,
+    inspection_date, a highlighted snippet and rank (lower is better).
+    Every match is ranked; equal ranks put the newest first. With no search
+    words, the newest comments matching the filters are returned instead.
+    """
+    conn = conn or connect()
+    if not re.search(r"\w", query or ""):
+        return _latest_comments(conn, item_key, battalion, limit)
+    expression = match_expression(query, item_key, battalion)
+    # FTS5 ranks all matches and keeps the best few; the snippets are built
+    # afterwards for the rows actually returned.
+    ranked = conn.execute(
+        "SELECT rowid, rank FROM comments_fts WHERE comments_fts MATCH ? ORDER BY rank, rowid DESC LIMIT ?",
+        (expression, limit * 2 if battalion or item_key else limit),
+    ).fetchall()
+    # rowid encodes (assessment, item), so the bodies come from one indexed
+    # lookup instead of asking FTS5 for a snippet per row.
+    wanted = {(rowid // 64, ITEMS[rowid % 64].key): rank for rowid, rank in ranked}
+    ids = sorted({aid for aid, _ in wanted})
+    rows = conn.execute(
+        "SELECT c.assessment_id, c.item_key, a.battalion, a.project_name, a.inspection_date, c.body "
+        f"FROM comments c JOIN assessments a ON a.id = c.assessment_id WHERE c.assessment_id IN ({','.join('?' * len(ids))})",
+        ids,
+    ).fetchall()
+    results = []
+    for row in rows:
+        rank = wanted.get((row["assessment_id"], row["item_key"]))
+        # The token filters can let near misses through ("NMCB 1" vs "NMCB-1").
+        if rank is None or (item_key and row["item_key"] != item_key) or (battalion and row["battalion"] != battalion):
+            continue
+        result = dict(row, rank=rank, snippet=highlight(row["body"], query))
+        del result["body"]
+        results.append(result)
+    results.sort(key=lambda r: r["rank"])
+    return results[:limit]
+
+
+def highlight(body, query, width=240):
+    """body with words matching the query wrapped in [brackets], cut to about width characters."""
+    stems = [
+        word.lower() if star else re.sub(r"(ing|ed|es|s)$", "", word.lower()) if len(word) > 4 else word.lower()
+        for word, star in re.findall(r"(\w+)(\*?)", query or "")
+    ]
+    if not stems:
+        return body[:width]
+    pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, stems)) + r")\w*", re.IGNORECASE)
+    first = pattern.search(body)
+    start = max(0, first.start() - width // 3) if first else 0
+    text = body[start:start + width]
+    return ("…" if start else "") + pattern.sub(lambda m: f"[{m.group(0)}]", text) + ("…" if start + width < len(body) else "")
+
+
+def _latest_comments(conn, item_key, battalion, limit):
+    where, params = [], []
+    if item_key:
+        where.append("c.item_key = ?")
+        params.append(item_key)
+    if battalion:
+        where.append("a.battalion = ?")
+        params.append(battalion)
+    sql = (
+        "SELECT c.assessment_id, c.item_key, a.battalion, a.project_name, a.inspection_date, "
+        "c.body AS snippet, NULL AS rank "
+        "FROM assessments a JOIN comments c ON c.assessment_id = a.id"
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + " ORDER BY a.inspection_date DESC, a.id DESC LIMIT ?"
+    )
+    return [dict(r) for r in conn.execute(sql, (*params, limit))]
+
+
+def comment_counts(query, battalion=None, conn=None):
+    """{item_key: matches}, to spot recurring discrepancies by item."""
+    conn = conn or connect()
+    if not re.search(r"\w", query or ""):
+        return {}
+    # Group on the item position in the rowid, so FTS5 never reads the stored columns.
+    return {
+        ITEMS[position].key: count
+        for position, count in conn.execute(
+            "SELECT rowid % 64, count(*) FROM comments_fts WHERE comments_fts MATCH ? "
+            "GROUP BY 1 ORDER BY count(*) DESC",
+            (match_expression(query, battalion=battalion),),
+        )
+    }
@@ -1,17 +1,36 @@
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+
+_script_started = time.perf_counter()
+
 import streamlit as st
 import streamlit.components.v1 as components
-import datetime
-import io
-import emoji
-import base64
-from PIL import Image
-from streamlit_drawable_canvas import st_canvas
+
+from registry import (
+    HANDBOOK_TITLE, HANDBOOK_VERSION, ITEMS, ITEMS_BY_KEY, MAX_SCORE, PROJECT_FIELDS, SCHEDULE_DEFAULTS,
+    SCHEDULE_INPUT_KEYS, SCHEDULE_OPTIONS, SECTIONS, collect_assessment, item_response,
+)
+import journal
+import store
+from percentiles import PercentileIndex
+import metrics
+from metrics import span
+from startup import import_timings, lazy_import
+
+# NumPy, Pillow, fpdf and the drawing canvas are loaded with lazy_import on
+# the code paths that use them (scoring, signatures, printing, analytics).
 
 # -------------------------------------------------------------------
-# Print-specific CSS (injected at the top)
+# Process-wide static resources
 # -------------------------------------------------------------------
-st.markdown(
-    """
+@st.cache_resource
+def print_css():
+    """Print-specific CSS (injected at the top)."""
+    return """
     <style>
     /* Only hide elements with the "no-print" class when printing */
     @media print {
@@ -31,9 +50,51 @@ st.markdown(
         }
     }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+@st.cache_resource
+def handbook_intro():
+    return (
+        f"**{HANDBOOK_TITLE}**",
+        "Fill out the fields below. For any item that does not achieve the perfect score, a comment is required. In the final PDF, each item will display its question and amplifying info in one box with your numerical score in a narrow, centered column. If you provide any comments, they will appear on a separate page by line item.",
+    )
+
+@st.cache_resource
+def pdf_renderer():
+    """report_pdf with its font parsed and static page layout built, once per process."""
+    report_pdf = lazy_import("report_pdf")
+    report_pdf.static_layout()
+    return report_pdf
+
+@st.cache_resource
+def metrics_server():
+    """Local /metrics endpoint, started once per process when CQI_METRICS_PORT is set."""
+    return metrics.serve()
+
+if metrics.ENABLED and metrics.PORT:
+    metrics_server()
+
+st.markdown(print_css(), unsafe_allow_html=True)
+
+@st.cache_resource
+def percentile_index():
+    """Sorted score history shared by all sessions, built once per process."""
+    return PercentileIndex.from_store()
+
+@st.cache_resource
+def score_columns():
+    """The columnar score store shared by all sessions (its appends are locked)."""
+    return lazy_import("columnar").ScoreColumns()
+
+def percentile_summary(ranks):
+    parts = []
+    for name, label in (("overall", "overall"), ("battalion", "within battalion"), ("band", "within project-size band")):
+        pct, size = ranks.get(name, (None, 0))
+        if pct is not None:
+            n = round(pct)
+            suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+            parts.append(f"{n}{suffix} percentile {label} (n={size:,})")
+    return " · ".join(parts)
 
 # -------------------------------------------------------------------
 # Top Section: Display Final Score Data if Available
@@ -42,65 +103,61 @@ if "final_score" in st.session_state:
     st.markdown(
         f"""
         <div style="background-color:#f0f2f6; padding:10px; margin-bottom:20px;">
-            <h3>Final Score: {st.session_state.final_score} out of 175</h3>
+            <h3>Final Score: {st.session_state.final_score} out of {st.session_state.get("final_possible", MAX_SCORE)}</h3>
             <h4>Final Percentage: {st.session_state.final_percentage}%</h4>
+            <p>{percentile_summary(st.session_state.get("final_percentiles", {}))}</p>
         </div>
         """,
         unsafe_allow_html=True,
     )
 
 # -------------------------------------------------------------------
-# Helper Functions
-# -------------------------------------------------------------------
-def sanitize(text):
-    """Replace problematic Unicode dashes with a standard hyphen."""
-    if isinstance(text, str):
-        return text.replace("\u2013", "-").replace("\u2014", "-")
-    return text
-
-def image_to_base64(image_array):
-    """Convert a NumPy image array to a base64 encoded PNG."""
-    if image_array is None:
-        return ""
-    im = Image.fromarray((image_array).astype('uint8'))
-    buff = io.BytesIO()
-    im.save(buff, format="PNG")
-    return base64.b64encode(buff.getvalue()).decode("utf-8")
-
-# -------------------------------------------------------------------
-# Handbook Amplifying Info for Items 1–29 (sample text; update as needed)
+# Draft journal (reconnect recovery)
 # -------------------------------------------------------------------
-handbook_info = {
-    "Item 1 – Self Assessment": "Has the unit completed an initial self-assessment CQI checklist? (Yes = 2 pts, No = 0 pts)",
-    "Item 2 – Self Assessment Submission": "Were the self-assessment results submitted to 30 NCR SharePoint at least 7 days prior to inspection? (Yes = 2 pts, No = 0 pts)",
-    "Item 3 – Notice to Proceed (NTP)": "Has a project confirmation/turnover brief been conducted with 30 NCR resulting in receiving a NTP? (Yes = 4 pts, No = 0 pts)",
-    "Item 4 – Project Schedule": "Is the unit achieving the given tasking? (Exact = 16 pts; Within deviation = 12 pts; Outside deviation = 4 pts; Not monitored = 0 pts)",
-    "Item 5 – Project Management": "Is a project management tool/CPM being utilized? (Yes = 2 pts, No = 0 pts)",
-    "Item 6 – QA for 30 NCR Detail Sites": "QA involvement: (4 pts = Zero discrepancies; 3 pts = Acceptable; 2 pts = Multiple discrepancies; 0 pts = No QA involvement)",
-    "Item 7 & 8 – FAR/RFI": "Inspect FAR/RFI log for continuity. (4 pts = 100% logged; 3 pts = Acceptable; 2 pts = Missing; 0 pts = Not tracked)",
-    "Item 9 – DFOW Sheet": "Ensure the DFOW sheet is accurate and updated. (4 pts = Accurate; 3 pts = Acceptable; 2 pts = Incorrect; 0 pts = Blank)",
-    "Item 10 – Turnover Projects": "Review turnover memorandum. (4 pts = Validated discrepancies with rework plan; 0 pts = No documentation)",
-    "Item 11 – Funds Provided": "Are project funds tracked? (4 pts = Monitored; 0 pts = Not monitored)",
-    "Item 12 – Estimate at Completion Cost (EAC)": "EAC accuracy. (4 pts = Accurate; 3 pts = Acceptable; 2 pts = Low accuracy; 0 pts = ≤59% accuracy)",
-    "Item 13 – Current Expenditures": "Verify current expenditures. (4 pts = Accurate; 3 pts = Acceptable; 2 pts = Discrepancies; 0 pts = ≤59% accuracy)",
-    "Item 14 – Project Material Status Report (PMSR)": "Inspect PMSR. (10 pts = 100% valid; 8 pts = Acceptable; 4 pts = Discrepancies; 2/0 pts otherwise)",
-    "Item 15 – Report Submission": "Are PMSR and EAC reports routed monthly? (2 pts = Yes; 0 pts = No)",
-    "Item 16 – Materials On-Hand": "Materials on-hand verification. (10 pts = Organized; 8 pts = Minor issues; 4 pts = Multiple issues; 0 pts = Unsatisfactory)",
-    "Item 17 – DD Form 200": "DD Form 200 status. (2 pts = Correct; 0 pts = Not maintained)",
-    "Item 18 – Borrowed Material Tickler File": "Borrow log verification. (2 pts = Valid; 0 pts = Not managed)",
-    "Item 19 – Project Brief": "Project brief quality. (5 pts = Detailed; 3 pts = Acceptable; 2/0 pts otherwise)",
-    "Item 20 – Calculate Manday Capability": "Crew composition & MD capability. (6 pts = Matches; 4/2/0 pts otherwise)",
-    "Item 21 – Equipment": "Equipment adequacy. (6 pts = All onsite; 4 pts = Acceptable; 2/0 pts otherwise)",
-    "Item 22 – CASS Spot Check": "CASS review. (12 pts = 100% compliant; 8/4/0 pts otherwise)",
-    "Item 23 – Designation Letters": "Designation letters status. (5 pts = Current; 3 pts = Not up-to-date; 0 pts = Missing)",
-    "Item 24 – Job Box Review": "Review jobsite board items. (20 pts maximum; deductions apply)",
-    "Item 25 – Review QC Package": "QC package review. (8 pts = Comprehensive; 6/4/0 pts otherwise)",
-    "Item 26 – Submittals": "Material submittals. (4 pts = Current; 2 pts = Not current; 0 pts = Not submitted)",
-    "Item 27a – QC Inspection Plan": "QC Inspection Plan. (10 pts = 100% quantifiable; 7/3/0 pts otherwise)",
-    "Item 27b – QC Inspection": "On-site QC inspection. (5 pts = No discrepancies; 0 pts otherwise)",
-    "Item 28 – Job Box Review (QC)": "Review QC plan and daily QC reports. (5 pts = Up-to-date; deductions apply)",
-    "Item 29 – Job Box Review (Safety)": "Review safety plan, daily safety reports, and emergency contacts. (5 pts = Up-to-date; deductions apply)"
-}
+# The draft id lives in the URL, so a browser that reconnects or reloads after
+# losing its session finds the journal again and the form comes back as it was.
+def journal_keys(items):
+    """Widget keys (inputs and comments) for a group of items."""
+    keys = []
+    for item in items:
+        keys.extend(SCHEDULE_INPUT_KEYS if item.kind == "schedule" else (item.widget_key,))
+        keys.append(item.comment_key)
+    return keys
+
+PROJECT_KEYS = tuple(key for _, key in PROJECT_FIELDS)
+JOURNAL_KEYS = (*PROJECT_KEYS, *journal_keys(ITEMS), "assessment_id")
+
+@st.cache_resource(ttl=3600)
+def prune_journals():
+    """Drop abandoned journals, at most once an hour."""
+    return journal.prune()
+
+prune_journals()
+if "draft_journal" not in st.session_state:
+    draft_id = st.query_params.get("draft")
+    if not journal.valid_draft_id(draft_id):
+        draft_id = uuid.uuid4().hex
+        st.query_params["draft"] = draft_id
+    draft_journal = journal.DraftJournal(draft_id)
+    restore_started = time.perf_counter()
+    restored = draft_journal.restore()
+    for key, value in restored.items():
+        st.session_state[key] = value
+    st.session_state.draft_journal = draft_journal
+    st.session_state.journal_seen = dict(restored)
+    if restored:
+        st.toast(f"Draft restored: {len(restored)} fields in {(time.perf_counter() - restore_started) * 1000:.1f} ms")
+draft_journal = st.session_state.draft_journal
+
+def journal_changes(keys):
+    """Append the widgets in keys whose values changed since they were last journaled."""
+    seen = st.session_state.journal_seen
+    changes = {}
+    for key in keys:
+        value = st.session_state.get(key)
+        if seen.get(key) != value:
+            changes[key] = seen[key] = value
+    draft_journal.append(changes)
 
 #-----------------------------------------------------------------------
 #       CALC - app
@@ -114,618 +171,576 @@ handbook_info = {
 # Main App – Data Input Section
 # -------------------------------------------------------------------
 st.title("Construction Quality Inspection (CQI) Assessment Tool")
-st.markdown("**DEC 2023 - CONSTRUCTION QUALITY INSPECTION (CQI) HANDBOOK**")
-st.write("Fill out the fields below. For any item that does not achieve the perfect score, a comment is required. In the final PDF, each item will display its question and amplifying info in one box with your numerical score in a narrow, centered column. If you provide any comments, they will appear on a separate page by line item.")
+handbook_title, instructions = handbook_intro()
+st.markdown(handbook_title)
+st.write(instructions)
 
 # --- Project Information ---
-st.header("Project Information")
-proj_name_input = st.text_input("Project Name:", key="proj_name_input")
-battalion_input = st.text_input("Battalion:", key="battalion_input")
-oic_name_input = st.text_input("OIC:", key="oic_name_input")
-aoic_input = st.text_input("AOIC:", key="aoic_input")
-start_date = st.date_input("Start Date:", key="start_date_input")
-planned_start = st.date_input("Planned Start Date:", key="planned_start_input")
-planned_completion = st.date_input("Planned Completion Date:", key="planned_completion_input")
-actual_completion = st.date_input("Actual Completion Date:", key="actual_completion_input")
+@st.fragment
+def project_information():
+    with span("project_info"):
+        st.header("Project Information")
+        st.text_input("Project Name:", key="proj_name_input")
+        st.text_input("Battalion:", key="battalion_input")
+        st.text_input("OIC:", key="oic_name_input")
+        st.text_input("AOIC:", key="aoic_input")
+        st.date_input("Start Date:", key="start_date_input")
+        st.date_input("Planned Start Date:", key="planned_start_input")
+        st.date_input("Planned Completion Date:", key="planned_completion_input")
+        st.date_input("Actual Completion Date:", key="actual_completion_input")
+    journal_changes(PROJECT_KEYS)
+
+project_information()
 
 # --- Assessment Inputs ---
+def item_input(item):
+    """Render one item's widgets and return its response."""
+    st.subheader(item.title)
+    st.info(item.info)
+    if item.kind == "schedule":
+        # Item 4 – Project Schedule (calculated score)
+        st.markdown(
+            "Score is based on the difference between planned and actual work-in-place.\n"
+            "Exact = 16 pts; Within deviation = 12 pts; Outside deviation = 4 pts."
+        )
+        inputs = {
+            "total_md_input": st.number_input("Total Project Mandays:", step=1, key="total_md_input"),
+            "planned_wip_input": st.number_input("Planned Work-in-Place (%)", step=1, key="planned_wip_input"),
+            "actual_wip_input": st.number_input("Actual Work-in-Place (%)", step=1, key="actual_wip_input"),
+        }
+        response = item_response(item, inputs)
+        st.write(f"Calculated Score for Item 4: {item.score(response)}")
+    elif item.kind == "yes_no":
+        response = st.radio("Response:", options=item.options, key=item.widget_key)
+    elif item.kind == "select":
+        response = st.selectbox("Select score:", options=item.options, key=item.widget_key)
+    else:
+        response = st.number_input(
+            f"Enter deduction for Item {item.key} (0 to {item.max_points}):",
+            min_value=0, max_value=item.max_points, step=1, key=item.widget_key,
+        )
+    if item.needs_comment(response):
+        st.text_area(item.comment_label, key=item.comment_key)
+    return response
+
+def section_subtotal(keys, state):
+    """(points, possible) for a group of items; N/A items earn no points."""
+    points = possible = 0
+    for key in keys:
+        item = ITEMS_BY_KEY[key]
+        points += item.score(item_response(item, state)) or 0
+        possible += item.max_points
+    return points, possible
+
+@st.fragment
+def assessment_section(title, keys):
+    """One group of items; only this fragment re-runs when its widgets change."""
+    started = time.perf_counter()
+    st.header(title)
+    with span(f"items:{title}"):
+        for key in keys:
+            item_input(ITEMS_BY_KEY[key])
+    journal_changes(journal_keys(ITEMS_BY_KEY[key] for key in keys))
+    # Running total: this section's fresh subtotal plus the cached subtotals of the others.
+    points, possible = section_subtotal(keys, st.session_state)
+    subtotals = st.session_state.section_subtotals
+    subtotals[title] = (points, possible)
+    running = sum(p for p, _ in subtotals.values())
+    running_possible = sum(m for _, m in subtotals.values())
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    st.caption(
+        f"Section score: {points} / {possible} · Running total: {running} / {running_possible} "
+        f"· section rendered in {elapsed_ms:.1f} ms"
+    )
+
 st.header("Assessment Inputs")
+# Defaults live in session state (not in value=) so resuming a draft can overwrite them.
+for key, default in SCHEDULE_DEFAULTS.items():
+    st.session_state.setdefault(key, default)
+for item in ITEMS:
+    if item.kind == "deduction":
+        st.session_state.setdefault(item.widget_key, 0)
+# A full run refreshes every subtotal; fragment reruns then update only their own.
+st.session_state.section_subtotals = {title: section_subtotal(keys, st.session_state) for title, keys in SECTIONS}
+for title, keys in SECTIONS:
+    assessment_section(title, keys)
+
+assessment = collect_assessment(st.session_state)
+journal_changes(JOURNAL_KEYS)
+
+# Signatures live in a process-wide vault (compact strokes, per-session budget,
+# idle sessions spilled to disk) instead of in session state.
+@st.cache_resource
+def delta_engine():
+    return lazy_import("deltas").DeltaEngine()
+
+@st.cache_resource
+def signature_vault():
+    return lazy_import("session_memory").SignatureVault()
+
+# Keyed by draft, so a reconnecting session gets its signatures back too.
+signature_session = draft_journal.draft_id
+
+# The vault is only loaded once this draft has stored a signature. The flag is
+# journaled, so a reconnecting session still knows to look in the vault.
+if st.session_state.get("signatures_stored"):
+    signature_vault().sweep()
+
+def stored_signature(role):
+    if not st.session_state.get("signatures_stored"):
+        return None
+    return signature_vault().get(signature_session, role)
+
+def store_signatures(signatures):
+    """Put {role: canvas JSON} in the vault (skipped while nothing has been drawn)."""
+    if not st.session_state.get("signatures_stored") and not any((data or {}).get("objects") for data in signatures.values()):
+        return
+    vault = signature_vault()
+    for role, data in signatures.items():
+        vault.put(signature_session, role, data)
+    st.session_state.signatures_stored = True
+    journal_changes(("signatures_stored",))
+
+def saved_signatures():
+    return {role: stored_signature(role) for role in store.SIGNATURE_KEYS}
+
+def retire_canvases():
+    """Give the signature canvases fresh widget keys.
+
+    Once the strokes are in the vault, the canvas widgets' own values (a PNG
+    data URL plus the fabric JSON) are only a copy outside the signature
+    budget. Streamlit drops the state of widgets that are not rendered, so
+    the old copies are cleared at the end of the next run and the new
+    canvases redraw from the vault.
+    """
+    st.session_state.canvas_round = st.session_state.get("canvas_round", 0) + 1
+
+# --- Saved Assessments (drafts) ---
+def resume_assessment(assessment_id):
+    """Pour a stored assessment back into the widgets (runs before the rerun)."""
+    loaded = store.load(assessment_id)
+    if loaded is None:
+        return
+    saved, signatures, _ = loaded
+    for key, value in saved.items():
+        if value is not None and key != "inspection_date":
+            st.session_state[key] = value
+    store_signatures({role: signatures.get(role) for role in store.SIGNATURE_KEYS})
+    retire_canvases()
+    for key in ("final_score", "final_possible", "final_percentage", "final_percentiles"):
+        st.session_state.pop(key, None)
+    st.session_state.assessment_id = assessment_id
+
+with st.sidebar:
+    st.header("Saved Assessments")
+    if st.button("Save Draft", key="save_draft"):
+        st.session_state.assessment_id = store.save(
+            assessment, st.session_state.get("assessment_id"), signatures=saved_signatures()
+        )
+        journal_changes(("assessment_id",))
+        st.success(f"Draft #{st.session_state.assessment_id} saved.")
+    battalion_filter = st.text_input("Battalion:", value=assessment["battalion_input"] or "", key="saved_battalion_filter")
+    saved_rows = store.recent(battalion_filter or None)
+    if saved_rows:
+        labels = {
+            row["id"]: f"#{row['id']} {row['project_name'] or 'Untitled'} · {row['inspection_date']} · {row['status']}"
+            for row in saved_rows
+        }
+        selected_id = st.selectbox("Recent assessments:", options=list(labels), format_func=labels.get, key="saved_assessment_choice")
+        st.button("Resume", key="resume_assessment", on_click=resume_assessment, args=(selected_id,))
+    else:
+        st.caption("No saved assessments yet.")
+    show_analytics = st.toggle("Fleet analytics", key="show_fleet_analytics")
+    show_search = st.toggle("Comment search", key="show_comment_search")
+    show_changes = st.toggle("Re-inspection changes", key="show_reinspection_changes")
+    show_schedule = st.toggle("Schedule trends", key="show_schedule_trends")
+
+# --- Bulk export ---
+@st.fragment
+def bulk_export_panel():
+    st.subheader("Bulk Export")
+    choices = store.battalions()
+    if not choices:
+        st.caption("No saved assessments to export.")
+        return
+    battalion = st.selectbox("Battalion:", options=choices, key="export_battalion")
+    final_only = st.checkbox("Finalized only", value=True, key="export_final_only")
+    ids = store.assessment_ids(battalion, "final" if final_only else None)
+    st.caption(f"{len(ids):,} reports match.")
+    if ids and st.button("Export Reports", key="export_reports"):
+        bulk_export = lazy_import("bulk_export")
+        bar = st.progress(0.0, text="Rendering reports...")
+
+        def progress(done, total, elapsed):
+            bar.progress(done / total, text=f"{done:,}/{total:,} reports · {done / max(elapsed, 1e-9):,.1f} reports/sec")
+
+        previous = st.session_state.pop("export_zip", None)
+        if previous and os.path.exists(previous[0]):
+            os.remove(previous[0])
+        fd, path = tempfile.mkstemp(prefix="cqi-export-", suffix=".zip")
+        with open(fd, "wb") as fh:
+            # The server is multi-threaded, so workers come from a forkserver rather than a fork of it.
+            count, elapsed = bulk_export.export_zip(
+                fh, ids, progress=progress, mp_context=multiprocessing.get_context("forkserver")
+            )
+        st.session_state.export_zip = (path, battalion, count, elapsed)
+    export = st.session_state.get("export_zip")
+    if export:
+        path, battalion, count, elapsed = export
+        st.caption(f"{count:,} reports in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.1f} reports/sec)")
+        safe_name = "".join(c if c.isalnum() else "_" for c in battalion)
+
+        def read_zip():
+            with open(path, "rb") as fh:
+                return fh.read()
+
+        st.download_button(
+            "Download Zip",
+            data=read_zip,
+            file_name=f"CQI_Reports_{safe_name}.zip",
+            mime="application/zip",
+            key="download_export_zip",
+        )
+
+with st.sidebar:
+    bulk_export_panel()
+
+# --- Fleet Analytics ---
+@st.fragment
+def fleet_analytics():
+    columns = score_columns()
+    columns.reload()
+    st.header("Fleet Analytics")
+    if not len(columns):
+        st.caption("No finalized inspections recorded yet.")
+        return
+    started = time.perf_counter()
+    means, lost, na = columns.item_stats()
+    by_battalion = columns.battalion_means()
+    months, counts, trend = columns.monthly_trend()
+    st.caption(f"{len(columns):,} inspections summarized in {(time.perf_counter() - started) * 1000:.1f} ms")
+    st.subheader("Points lost by item")
+    st.bar_chart({"item": [item.title for item in ITEMS], "mean points lost": lost}, x="item", y="mean points lost")
+    st.dataframe(
+        [
+            {"Item": item.title, "Mean": round(float(m), 2), "Mean lost": round(float(l), 2), "N/A": int(n)}
+            for item, m, l, n in zip(ITEMS, means, lost, na)
+        ],
+        hide_index=True,
+    )
+    st.subheader("Battalion means")
+    st.dataframe(
+        [
+            {"Battalion": name or "(blank)", "Inspections": count, "Mean %": round(pct, 1)}
+            for name, (count, pct) in sorted(by_battalion.items())
+        ],
+        hide_index=True,
+    )
+    st.subheader("Monthly trend")
+    st.line_chart({"month": [str(m) for m in months], "mean %": trend}, x="month", y="mean %")
+
+if show_analytics:
+    fleet_analytics()
+
+# --- Comment Search ---
+@st.fragment
+def comment_search():
+    st.header("Comment Search")
+    query = st.text_input("Search comments:", key="comment_search_query", placeholder="e.g. rebar spacing, submitt*")
+    col_item, col_battalion = st.columns(2)
+    item_key = col_item.selectbox(
+        "Item:", options=[None, *ITEMS_BY_KEY], key="comment_search_item",
+        format_func=lambda key: "All items" if key is None else ITEMS_BY_KEY[key].title,
+    )
+    battalion = col_battalion.selectbox(
+        "Battalion:", options=[None, *store.battalions()], key="comment_search_battalion",
+        format_func=lambda name: "All battalions" if name is None else name or "(blank)",
+    )
+    started = time.perf_counter()
+    hits = store.search_comments(query, item_key, battalion)
+    counts = store.comment_counts(query, battalion) if query.strip() and item_key is None else {}
+    st.caption(f"{len(hits)} comments in {(time.perf_counter() - started) * 1000:.1f} ms")
+    if counts:
+        st.bar_chart(
+            {"item": [ITEMS_BY_KEY[key].label for key in counts], "matching comments": list(counts.values())},
+            x="item", y="matching comments",
+        )
+    if hits:
+        st.dataframe(
+            [
+                {"Comment": hit["snippet"], "Item": ITEMS_BY_KEY[hit["item_key"]].label, "Battalion": hit["battalion"],
+                 "Project": hit["project_name"], "Date": hit["inspection_date"], "Assessment": hit["assessment_id"]}
+                for hit in hits
+            ],
+            hide_index=True,
+        )
+
+if show_search:
+    comment_search()
+
+# --- Re-inspection Changes ---
+def points_text(points):
+    return "N/A" if points is None else str(points)
+
+@st.fragment
+def reinspection_changes():
+    st.header("Re-inspection Changes")
+    col_project, col_battalion = st.columns(2)
+    project = col_project.text_input("Project Name:", value=assessment["proj_name_input"] or "", key="delta_project")
+    battalion = col_battalion.text_input("Battalion:", value=assessment["battalion_input"] or "", key="delta_battalion")
+    include_drafts = st.checkbox("Include drafts", key="delta_include_drafts")
+    engine = delta_engine()
+    started = time.perf_counter()
+    visits, deltas = engine.history(project, battalion, None if include_drafts else "final")
+    if len(visits) < 2:
+        st.caption("This project needs at least two saved inspections to compare.")
+        return
+    labels = {n: f"#{visit.id} · {visit.inspection_date} · {visit.percentage}%" for n, visit in enumerate(visits)}
+    col_before, col_after = st.columns(2)
+    before = col_before.selectbox("Compare:", options=list(labels)[:-1], index=len(visits) - 2,
+                                  format_func=labels.get, key="delta_before")
+    after = col_after.selectbox("With:", options=list(labels)[before + 1:], index=len(visits) - before - 2,
+                                format_func=labels.get, key="delta_after")
+    delta = deltas[before] if after == before + 1 else engine.delta(visits[before], visits[after])
+    stats = engine.stats()
+    st.caption(
+        f"{len(visits)} inspections compared in {(time.perf_counter() - started) * 1000:.1f} ms "
+        f"({stats['hits']:,} cache hits, {stats['misses']:,} misses)"
+    )
+    st.line_chart(
+        {"inspection": [f"{v.inspection_date} #{v.id}" for v in visits], "score %": [v.percentage for v in visits]},
+        x="inspection", y="score %",
+    )
 
-# Item 1
-st.subheader("Item 1 – Self Assessment")
-st.info(handbook_info["Item 1 – Self Assessment"])
-item1 = st.radio("Response:", options=["Yes", "No"], key="item1_response")
-comment_item1 = st.text_area("Comment (if not perfect):", key="item1_comment") if item1 != "Yes" else ""
-
-# Item 2
-st.subheader("Item 2 – Self Assessment Submission")
-st.info(handbook_info["Item 2 – Self Assessment Submission"])
-item2 = st.radio("Response:", options=["Yes", "No"], key="item2_response")
-comment_item2 = st.text_area("Comment (if not perfect):", key="item2_comment") if item2 != "Yes" else ""
-
-# Item 3
-st.subheader("Item 3 – Notice to Proceed (NTP)")
-st.info(handbook_info["Item 3 – Notice to Proceed (NTP)"])
-item3 = st.radio("Response:", options=["Yes", "No"], key="item3_response")
-comment_item3 = st.text_area("Comment (if not perfect):", key="item3_comment") if item3 != "Yes" else ""
-
-# Item 4 – Project Schedule (calculated score)
-st.subheader("Item 4 – Project Schedule")
-st.info(handbook_info["Item 4 – Project Schedule"])
-st.markdown(
-    "Score is based on the difference between planned and actual work-in-place.\n"
-    "Exact = 16 pts; Within deviation = 12 pts; Outside deviation = 4 pts."
-)
-total_md = st.number_input("Total Project Mandays:", value=1000, step=1, key="total_md_input")
-planned_wip = st.number_input("Planned Work-in-Place (%)", value=100, step=1, key="planned_wip_input")
-actual_wip = st.number_input("Actual Work-in-Place (%)", value=100, step=1, key="actual_wip_input")
-if total_md < 1000:
-    allowed = 10
-elif total_md < 2000:
-    allowed = 5
-else:
-    allowed = 2.5
-diff = abs(actual_wip - planned_wip)
-if diff == 0:
-    item4_score = 16
-elif diff <= allowed:
-    item4_score = 12
-else:
-    item4_score = 4
-st.write(f"Calculated Score for Item 4: {item4_score}")
-comment_item4 = st.text_area("Comment (if not perfect):", key="item4_comment") if item4_score != 16 else ""
-
-# Item 5 – Project Management
-st.subheader("Item 5 – Project Management")
-st.info(handbook_info["Item 5 – Project Management"])
-item5 = st.radio("Response:", options=["Yes", "No"], key="item5_response")
-comment_item5 = st.text_area("Comment (if not perfect):", key="item5_comment") if item5 != "Yes" else ""
-
-# Item 6 – QA for 30 NCR Detail Sites
-st.subheader("Item 6 – QA for 30 NCR Detail Sites")
-st.info(handbook_info["Item 6 – QA for 30 NCR Detail Sites"])
-item6 = st.selectbox("Select score:", options=[4, 3, 2, 0], key="item6_score")
-comment_item6 = st.text_area("Comment (if not perfect):", key="item6_comment") if item6 != 4 else ""
-
-# Item 7 & 8 – FAR/RFI
-st.subheader("Item 7 & 8 – FAR/RFI")
-st.info(handbook_info["Item 7 & 8 – FAR/RFI"])
-item78 = st.selectbox("Select score:", options=[4, 3, 2, 0], key="item78_score")
-comment_item78 = st.text_area("Comment (if not perfect):", key="item78_comment") if item78 != 4 else ""
-
-# Item 9 – DFOW Sheet
-st.subheader("Item 9 – DFOW Sheet")
-st.info(handbook_info["Item 9 – DFOW Sheet"])
-item9 = st.selectbox("Select score:", options=[4, 3, 2, 0], key="item9_score")
-comment_item9 = st.text_area("Comment (if not perfect):", key="item9_comment") if item9 != 4 else ""
-
-# Item 10 – Turnover Projects
-st.subheader("Item 10 – Turnover Projects")
-st.info(handbook_info["Item 10 – Turnover Projects"])
-item10 = st.selectbox("Select score:", options=["N/A", 4, 0], key="item10_score")
-comment_item10 = st.text_area("Comment (if not perfect):", key="item10_comment") if item10 not in ["N/A", 4] else ""
-
-# Item 11 – Funds Provided
-st.subheader("Item 11 – Funds Provided")
-st.info(handbook_info["Item 11 – Funds Provided"])
-item11 = st.radio("Response:", options=["Yes", "No"], key="item11_response")
-comment_item11 = st.text_area("Comment (if not perfect):", key="item11_comment") if item11 != "Yes" else ""
-
-# Item 12 – Estimate at Completion Cost (EAC)
-st.subheader("Item 12 – Estimate at Completion Cost (EAC)")
-st.info(handbook_info["Item 12 – Estimate at Completion Cost (EAC)"])
-item12 = st.selectbox("Select score:", options=[4, 3, 2, 0], key="item12_score")
-comment_item12 = st.text_area("Comment (if not perfect):", key="item12_comment") if item12 != 4 else ""
-
-# Item 13 – Current Expenditures
-st.subheader("Item 13 – Current Expenditures")
-st.info(handbook_info["Item 13 – Current Expenditures"])
-item13 = st.selectbox("Select score:", options=[4, 3, 2, 0], key="item13_score")
-comment_item13 = st.text_area("Comment (if not perfect):", key="item13_comment") if item13 != 4 else ""
-
-# Item 14 – Project Material Status Report (PMSR)
-st.subheader("Item 14 – Project Material Status Report (PMSR)")
-st.info(handbook_info["Item 14 – Project Material Status Report (PMSR)"])
-item14 = st.selectbox("Select score:", options=[10, 8, 4, 2, 0], key="item14_score")
-comment_item14 = st.text_area("Comment (if not perfect):", key="item14_comment") if item14 != 10 else ""
-
-# Item 15 – Report Submission
-st.subheader("Item 15 – Report Submission")
-st.info(handbook_info["Item 15 – Report Submission"])
-item15 = st.radio("Response:", options=["Yes", "No"], key="item15_response")
-comment_item15 = st.text_area("Comment (if not perfect):", key="item15_comment") if item15 != "Yes" else ""
-
-# Item 16 – Materials On-Hand
-st.subheader("Item 16 – Materials On-Hand")
-st.info(handbook_info["Item 16 – Materials On-Hand"])
-item16 = st.selectbox("Select score:", options=[10, 8, 4, 0], key="item16_score")
-comment_item16 = st.text_area("Comment (if not perfect):", key="item16_comment") if item16 != 10 else ""
-
-# Item 17 – DD Form 200
-st.subheader("Item 17 – DD Form 200")
-st.info(handbook_info["Item 17 – DD Form 200"])
-item17 = st.radio("Response:", options=["Yes", "No"], key="item17_response")
-comment_item17 = st.text_area("Comment (if not perfect):", key="item17_comment") if item17 != "Yes" else ""
-
-# Item 18 – Borrowed Material Tickler File
-st.subheader("Item 18 – Borrowed Material Tickler File")
-st.info(handbook_info["Item 18 – Borrowed Material Tickler File"])
-item18 = st.radio("Response:", options=["Yes", "No"], key="item18_response")
-comment_item18 = st.text_area("Comment (if not perfect):", key="item18_comment") if item18 != "Yes" else ""
-
-# Item 19 – Project Brief
-st.subheader("Item 19 – Project Brief")
-st.info(handbook_info["Item 19 – Project Brief"])
-item19 = st.selectbox("Select score:", options=[5, 3, 2, 0], key="item19_score")
-comment_item19 = st.text_area("Comment (if not perfect):", key="item19_comment") if item19 != 5 else ""
-
-# Item 20 – Calculate Manday Capability
-st.subheader("Item 20 – Calculate Manday Capability")
-st.info(handbook_info["Item 20 – Calculate Manday Capability"])
-item20 = st.selectbox("Select score:", options=[6, 4, 2, 0], key="item20_score")
-comment_item20 = st.text_area("Comment (if not perfect):", key="item20_comment") if item20 != 6 else ""
-
-# Item 21 – Equipment
-st.subheader("Item 21 – Equipment")
-st.info(handbook_info["Item 21 – Equipment"])
-item21 = st.selectbox("Select score:", options=[6, 4, 2, 0], key="item21_score")
-comment_item21 = st.text_area("Comment (if not perfect):", key="item21_comment") if item21 != 6 else ""
-
-# Item 22 – CASS Spot Check
-st.subheader("Item 22 – CASS Spot Check")
-st.info(handbook_info["Item 22 – CASS Spot Check"])
-item22 = st.selectbox("Select score:", options=[12, 8, 4, 0], key="item22_score")
-comment_item22 = st.text_area("Comment (if not perfect):", key="item22_comment") if item22 != 12 else ""
-
-# Item 23 – Designation Letters
-st.subheader("Item 23 – Designation Letters")
-st.info(handbook_info["Item 23 – Designation Letters"])
-item23 = st.selectbox("Select score:", options=[5, 3, 0], key="item23_score")
-comment_item23 = st.text_area("Comment (if not perfect):", key="item23_comment") if item23 != 5 else ""
-
-# Item 24 – Job Box Review
-st.subheader("Item 24 – Job Box Review")
-st.info(handbook_info["Item 24 – Job Box Review"])
-item24 = st.selectbox("Select score (20 is perfect; deductions apply):", options=[20, 0], key="item24_score")
-deduction24 = st.number_input("Enter deduction for Item 24 (0 to 20):", min_value=0, max_value=20, value=0, step=1, key="deduction24_input")
-comment_item24 = st.text_area("Comment (if deduction applied):", key="item24_comment") if deduction24 != 0 else ""
-
-# Item 25 – Review QC Package
-st.subheader("Item 25 – Review QC Package")
-st.info(handbook_info["Item 25 – Review QC Package"])
-item25 = st.selectbox("Select score:", options=[8, 6, 4, 0], key="item25_score")
-comment_item25 = st.text_area("Comment (if not perfect):", key="item25_comment") if item25 != 8 else ""
-
-# Item 26 – Submittals
-st.subheader("Item 26 – Submittals")
-st.info(handbook_info["Item 26 – Submittals"])
-item26 = st.selectbox("Select score:", options=[4, 2, 0], key="item26_score")
-comment_item26 = st.text_area("Comment (if not perfect):", key="item26_comment") if item26 != 4 else ""
-
-# Item 27a – QC Inspection Plan
-st.subheader("Item 27a – QC Inspection Plan")
-st.info(handbook_info["Item 27a – QC Inspection Plan"])
-item27a = st.selectbox("Select score:", options=[10, 7, 3, 0], key="item27a_score")
-comment_item27a = st.text_area("Comment (if not perfect):", key="item27a_comment") if item27a != 10 else ""
-
-# Item 27b – QC Inspection
-st.subheader("Item 27b – QC Inspection")
-st.info(handbook_info["Item 27b – QC Inspection"])
-item27b = st.selectbox("Select score:", options=[5, 0], key="item27b_score")
-comment_item27b = st.text_area("Comment (if not perfect):", key="item27b_comment") if item27b != 5 else ""
-
-# Item 28 – Job Box Review (QC)
-st.subheader("Item 28 – Job Box Review (QC)")
-st.info(handbook_info["Item 28 – Job Box Review (QC)"])
-deduction28 = st.number_input("Enter deduction for Item 28 (0 to 5):", min_value=0, max_value=5, value=0, step=1, key="deduction28_input")
-comment_item28 = st.text_area("Comment (if deduction applied):", key="item28_comment") if deduction28 != 0 else ""
-
-# Item 29 – Job Box Review (Safety)
-st.subheader("Item 29 – Job Box Review (Safety)")
-st.info(handbook_info["Item 29 – Job Box Review (Safety)"])
-deduction29 = st.number_input("Enter deduction for Item 29 (0 to 5):", min_value=0, max_value=5, value=0, step=1, key="deduction29_input")
-comment_item29 = st.text_area("Comment (if deduction applied):", key="item29_comment") if deduction29 != 0 else ""
+    col_before, col_after = st.columns(2)
+    col_before.metric(f"#{delta.before.id} · {delta.before.inspection_date}",
+                      f"{delta.before.total_score}/{delta.before.possible_score} ({delta.before.percentage}%)")
+    col_after.metric(f"#{delta.after.id} · {delta.after.inspection_date}",
+                     f"{delta.after.total_score}/{delta.after.possible_score} ({delta.after.percentage}%)",
+                     delta=f"{delta.total_change:+d} points ({delta.percentage_change:+.1f}%)")
+    if delta.items:
+        st.subheader("Score changes")
+        st.dataframe(
+            [
+                {"Item": ITEMS_BY_KEY[key].title, "Before": points_text(old), "After": points_text(new),
+                 "Change": (new or 0) - (old or 0)}
+                for key, old, new in delta.items
+            ],
+            hide_index=True,
+        )
+    else:
+        st.caption("No item scores changed.")
+    col_new, col_resolved = st.columns(2)
+    col_new.subheader("New comments")
+    for key, text in delta.new_comments:
+        col_new.markdown(f"**{ITEMS_BY_KEY[key].label}:** {text}")
+    col_resolved.subheader("Resolved comments")
+    for key, text in delta.resolved_comments:
+        col_resolved.markdown(f"**{ITEMS_BY_KEY[key].label}:** {text}")
+
+if show_changes:
+    reinspection_changes()
+
+# --- Schedule Trends (Item 4 from daily WIP logs) ---
+@st.fragment
+def schedule_trends():
+    wip_series = lazy_import("wip_series")
+    series = wip_series.WipSeries()
+    st.header("Schedule Trends")
+    projects = series.projects
+    if not projects:
+        st.caption("No WIP logs ingested yet (see `python wip_series.py ingest`).")
+        return
+    started = time.perf_counter()
+    days, counts = series.band_counts()
+    st.caption(
+        f"{len(projects):,} projects, {len(series):,} logged days, {series.manifest['crossings']:,} band crossings"
+    )
+    st.subheader("Projects per Item 4 band")
+    st.area_chart(
+        {"day": days.astype(str), **{option: counts[:, i] for i, option in enumerate(SCHEDULE_OPTIONS)}},
+        x="day", y=list(SCHEDULE_OPTIONS),
+    )
+    current = assessment["proj_name_input"]
+    project = st.selectbox("Project:", options=projects, key="schedule_project",
+                           index=projects.index(current) if current in projects else 0)
+    day, codes, points, deviation = series.trajectory(project)
+    st.line_chart(
+        {"day": day.astype(str), "Item 4 points": points, "WIP deviation %": deviation},
+        x="day", y=["Item 4 points", "WIP deviation %"],
+    )
+    crossings = series.crossings(project)
+    st.dataframe(
+        [
+            {"Day": str(d), "From": SCHEDULE_OPTIONS[old] if old >= 0 else "(first log)", "To": SCHEDULE_OPTIONS[new],
+             "Deviation %": None if math.isnan(dev) else round(float(dev), 1)}
+            for d, old, new, dev in zip(crossings["day"], crossings["from"], crossings["to"], crossings["deviation"])
+        ],
+        hide_index=True,
+    )
+    st.caption(f"Charted in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+if show_schedule:
+    schedule_trends()
 
 # --- Calculate Final Score ---
 if st.button("Calculate Final Score", key="calculate_final_score"):
-    errors = []
-    # Validations: if an item did not score perfectly, ensure a comment is provided.
-    if item1 != "Yes" and not comment_item1.strip():
-        errors.append("Item 1 requires a comment if not perfect.")
-    if item2 != "Yes" and not comment_item2.strip():
-        errors.append("Item 2 requires a comment if not perfect.")
-    if item3 != "Yes" and not comment_item3.strip():
-        errors.append("Item 3 requires a comment if not perfect.")
-    if item4_score != 16 and not comment_item4.strip():
-        errors.append("Item 4 requires a comment if score is not 16.")
-    if item5 != "Yes" and not comment_item5.strip():
-        errors.append("Item 5 requires a comment if not perfect.")
-    if item6 != 4 and not comment_item6.strip():
-        errors.append("Item 6 requires a comment if score is not 4.")
-    if item78 != 4 and not comment_item78.strip():
-        errors.append("Items 7 & 8 require a comment if score is not 4.")
-    if item9 != 4 and not comment_item9.strip():
-        errors.append("Item 9 requires a comment if score is not 4.")
-    if item10 not in ["N/A", 4] and not comment_item10.strip():
-        errors.append("Item 10 requires a comment if score is not perfect.")
-    if item11 != "Yes" and not comment_item11.strip():
-        errors.append("Item 11 requires a comment if not perfect.")
-    if item12 != 4 and not comment_item12.strip():
-        errors.append("Item 12 requires a comment if score is not 4.")
-    if item13 != 4 and not comment_item13.strip():
-        errors.append("Item 13 requires a comment if score is not 4.")
-    if item14 != 10 and not comment_item14.strip():
-        errors.append("Item 14 requires a comment if score is not 10.")
-    if item15 != "Yes" and not comment_item15.strip():
-        errors.append("Item 15 requires a comment if not perfect.")
-    if item16 != 10 and not comment_item16.strip():
-        errors.append("Item 16 requires a comment if score is not 10.")
-    if item17 != "Yes" and not comment_item17.strip():
-        errors.append("Item 17 requires a comment if not perfect.")
-    if item18 != "Yes" and not comment_item18.strip():
-        errors.append("Item 18 requires a comment if not perfect.")
-    if item19 != 5 and not comment_item19.strip():
-        errors.append("Item 19 requires a comment if score is not 5.")
-    if item20 != 6 and not comment_item20.strip():
-        errors.append("Item 20 requires a comment if score is not 6.")
-    if item21 != 6 and not comment_item21.strip():
-        errors.append("Item 21 requires a comment if score is not 6.")
-    if item22 != 12 and not comment_item22.strip():
-        errors.append("Item 22 requires a comment if score is not 12.")
-    if item23 != 5 and not comment_item23.strip():
-        errors.append("Item 23 requires a comment if score is not 5.")
-    if deduction24 != 0 and not comment_item24.strip():
-        errors.append("Item 24 requires a comment if a deduction is applied.")
-    if item25 != 8 and not comment_item25.strip():
-        errors.append("Item 25 requires a comment if score is not 8.")
-    if item26 != 4 and not comment_item26.strip():
-        errors.append("Item 26 requires a comment if score is not 4.")
-    if item27a != 10 and not comment_item27a.strip():
-        errors.append("Item 27a requires a comment if score is not 10.")
-    if item27b != 5 and not comment_item27b.strip():
-        errors.append("Item 27b requires a comment if score is not 5.")
-    if deduction28 != 0 and not comment_item28.strip():
-        errors.append("Item 28 requires a comment if a deduction is applied.")
-    if deduction29 != 0 and not comment_item29.strip():
-        errors.append("Item 29 requires a comment if a deduction is applied.")
-    
-    if errors:
-        for err in errors:
-            st.error(err)
+    # Same rules as the batch tools: comments for imperfect items, valid responses.
+    with span("validation"):
+        issues = lazy_import("validation").validate(assessment)
+
+    if issues:
+        for issue in issues:
+            st.error(issue.message)
     else:
-        # Calculate numeric scores for each item:
-        score1  = 2 if item1  == "Yes" else 0
-        score2  = 2 if item2  == "Yes" else 0
-        score3  = 4 if item3  == "Yes" else 0
-        score4  = item4_score  # already computed from work-in-place differences (max 16)
-        score5  = 2 if item5  == "Yes" else 0
-        score6  = item6         # selectbox value (max 4)
-        score7_8= item78        # selectbox value (max 4)
-        score9  = item9         # selectbox value (max 4)
-        score10 = item10 if item10 != "N/A" else 0
-        score11 = 4 if item11 == "Yes" else 0
-        score12 = item12        # selectbox (max 4)
-        score13 = item13        # selectbox (max 4)
-        score14 = item14        # selectbox (max 10)
-        score15 = 2 if item15 == "Yes" else 0
-        score16 = item16        # selectbox (max 10)
-        score17 = 2 if item17 == "Yes" else 0
-        score18 = 2 if item18 == "Yes" else 0
-        score19 = item19        # selectbox (max 5)
-        score20 = item20        # selectbox (max 6)
-        score21 = item21        # selectbox (max 6)
-        score22 = item22        # selectbox (max 12)
-        score23 = item23        # selectbox (max 5)
-        score24 = 20 - deduction24  # maximum 20, deduction applied
-        score25 = item25        # selectbox (max 8)
-        score26 = item26        # selectbox (max 4)
-        score27a= item27a       # selectbox (max 10)
-        score27b= item27b       # selectbox (max 5)
-        score28 = 5 - deduction28 # maximum 5, deduction applied
-        score29 = 5 - deduction29 # maximum 5, deduction applied
-
-        # Sum all scores:
-        total_score = (score1 + score2 + score3 + score4 + score5 +
-                       score6 + score7_8 + score9 + score10 + score11 +
-                       score12 + score13 + score14 + score15 + score16 +
-                       score17 + score18 + score19 + score20 + score21 +
-                       score22 + score23 + score24 + score25 + score26 +
-                       score27a + score27b + score28 + score29)
-                       
-        # Adjust the maximum score if needed; here, the assumed maximum is 171.
-        final_percentage = round(total_score / 171 * 100, 1)
-       
+        with span("scoring"):
+            total_score, possible_score, final_percentage = lazy_import("scoring").score_state(assessment)
+
         st.session_state.final_score = total_score
+        st.session_state.final_possible = possible_score
         st.session_state.final_percentage = final_percentage
-        
+        with span("finalize"):
+            st.session_state.assessment_id = store.save(
+                assessment, st.session_state.get("assessment_id"), status="final", signatures=saved_signatures()
+            )
+            journal_changes(("assessment_id",))
+            score_columns().append_records([assessment], [st.session_state.assessment_id])
+            index = percentile_index()
+            index.add(st.session_state.assessment_id, assessment["battalion_input"], assessment["total_md_input"], final_percentage)
+            st.session_state.final_percentiles = index.rank(
+                assessment["battalion_input"], assessment["total_md_input"], final_percentage
+            )
+
         st.success("Final Score Calculated!")
-        st.write("**Final Score:**", total_score, "out of 171")
+        st.write("**Final Score:**", total_score, "out of", possible_score)
         st.write("**Final Percentage:**", final_percentage, "%")
+        st.caption(f"Scored with the {HANDBOOK_VERSION} handbook rubric.")
+        st.write(percentile_summary(st.session_state.final_percentiles))
 
 
 
 # --- Signature Blocks Section ---
-default_canvas = {"background": "#FFF", "objects": []}
+with span("signatures"):
+    default_canvas = {"background": "#FFF", "objects": []}
+    st_canvas = lazy_import("streamlit_drawable_canvas").st_canvas
 
-with st.form("signature_form"):
-    st.header("Signatures")
+    with st.form("signature_form"):
+        st.header("Signatures")
     
-    st.markdown("#### OIC Signature")
-    canvas_result_oic = st_canvas(
-        fill_color="rgba(255,165,0,0.3)",
-        stroke_width=2,
-        stroke_color="#000000",
-        background_color="#FFF",
-        height=75,
-        width=400,
-        drawing_mode="freedraw",
-        key="oic_signature",
-        initial_drawing=st.session_state.get("oic_signature_data", default_canvas)
-    )
+        st.markdown("#### OIC Signature")
+        canvas_result_oic = st_canvas(
+            fill_color="rgba(255,165,0,0.3)",
+            stroke_width=2,
+            stroke_color="#000000",
+            background_color="#FFF",
+            height=75,
+            width=400,
+            drawing_mode="freedraw",
+            key=f"oic_signature_{st.session_state.get('canvas_round', 0)}",
+            initial_drawing=stored_signature("oic") or default_canvas
+        )
     
-    st.markdown("#### 30 NCR Signature")
-    canvas_result_30ncr = st_canvas(
-        fill_color="rgba(255,165,0,0.3)",
-        stroke_width=2,
-        stroke_color="#000000",
-        background_color="#FFF",
-        height=75,
-        width=400,
-        drawing_mode="freedraw",
-        key="ncr_signature",
-        initial_drawing=st.session_state.get("ncr_signature_data", default_canvas)
-    )
+        st.markdown("#### 30 NCR Signature")
+        canvas_result_30ncr = st_canvas(
+            fill_color="rgba(255,165,0,0.3)",
+            stroke_width=2,
+            stroke_color="#000000",
+            background_color="#FFF",
+            height=75,
+            width=400,
+            drawing_mode="freedraw",
+            key=f"ncr_signature_{st.session_state.get('canvas_round', 0)}",
+            initial_drawing=stored_signature("ncr") or default_canvas
+        )
     
-    submit_signatures = st.form_submit_button("Save Signatures")
+        submit_signatures = st.form_submit_button("Save Signatures")
     
-    if submit_signatures:
-        st.session_state.oic_signature_data = canvas_result_oic.json_data
-        st.session_state.ncr_signature_data = canvas_result_30ncr.json_data
-        st.success("Signatures Saved!")
+        if submit_signatures:
+            store_signatures({"oic": canvas_result_oic.json_data, "ncr": canvas_result_30ncr.json_data})
+            retire_canvases()
+            st.success("Signatures Saved!")
+
+report_signatures = saved_signatures()
 
 if st.button("Print Full Report", key="print_full_report"):
-    # Retrieve final score data
-    final_score = st.session_state.get("final_score", "N/A")
-    final_percentage = st.session_state.get("final_percentage", "N/A")
-    
-    # Retrieve project information from inputs
-    project_name = proj_name_input if proj_name_input else "N/A"
-    battalion = battalion_input if battalion_input else "N/A"
-    oic_name = oic_name_input if oic_name_input else "N/A"
-    aoic = aoic_input if aoic_input else "N/A"
-    start = start_date.strftime("%Y-%m-%d") if isinstance(start_date, datetime.date) else start_date
-    planned_start_str = planned_start.strftime("%Y-%m-%d") if isinstance(planned_start, datetime.date) else planned_start
-    planned_completion_str = planned_completion.strftime("%Y-%m-%d") if isinstance(planned_completion, datetime.date) else planned_completion
-    actual_completion_str = actual_completion.strftime("%Y-%m-%d") if isinstance(actual_completion, datetime.date) else actual_completion
-    
-    # Convert signature canvas image data to base64 images
-    oic_base64 = image_to_base64(canvas_result_oic.image_data)
-    ncr_base64 = image_to_base64(canvas_result_30ncr.image_data)
-    
-    # Build an HTML table for assessment items (Items 1-29)
-    assessment_rows = f"""
-      <tr>
-        <td>Item 1 – Self Assessment</td>
-        <td>{'2' if item1=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 2 – Self Assessment Submission</td>
-        <td>{'2' if item2=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 3 – Notice to Proceed (NTP)</td>
-        <td>{'4' if item3=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 4 – Project Schedule</td>
-        <td>{item4_score}</td>
-      </tr>
-      <tr>
-        <td>Item 5 – Project Management</td>
-        <td>{'2' if item5=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 6 – QA for 30 NCR Detail Sites</td>
-        <td>{item6}</td>
-      </tr>
-      <tr>
-        <td>Item 7 &amp; 8 – FAR/RFI</td>
-        <td>{item78}</td>
-      </tr>
-      <tr>
-        <td>Item 9 – DFOW Sheet</td>
-        <td>{item9}</td>
-      </tr>
-      <tr>
-        <td>Item 10 – Turnover Projects</td>
-        <td>{item10 if item10!="N/A" else "N/A"}</td>
-      </tr>
-      <tr>
-        <td>Item 11 – Funds Provided</td>
-        <td>{'4' if item11=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 12 – Estimate at Completion Cost (EAC)</td>
-        <td>{item12}</td>
-      </tr>
-      <tr>
-        <td>Item 13 – Current Expenditures</td>
-        <td>{item13}</td>
-      </tr>
-      <tr>
-        <td>Item 14 – Project Material Status Report (PMSR)</td>
-        <td>{item14}</td>
-      </tr>
-      <tr>
-        <td>Item 15 – Report Submission</td>
-        <td>{'2' if item15=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 16 – Materials On-Hand</td>
-        <td>{item16}</td>
-      </tr>
-      <tr>
-        <td>Item 17 – DD Form 200</td>
-        <td>{'2' if item17=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 18 – Borrowed Material Tickler File</td>
-        <td>{'2' if item18=='Yes' else '0'}</td>
-      </tr>
-      <tr>
-        <td>Item 19 – Project Brief</td>
-        <td>{item19}</td>
-      </tr>
-      <tr>
-        <td>Item 20 – Calculate Manday Capability</td>
-        <td>{item20}</td>
-      </tr>
-      <tr>
-        <td>Item 21 – Equipment</td>
-        <td>{item21}</td>
-      </tr>
-      <tr>
-        <td>Item 22 – CASS Spot Check</td>
-        <td>{item22}</td>
-      </tr>
-      <tr>
-        <td>Item 23 – Designation Letters</td>
-        <td>{item23}</td>
-      </tr>
-      <tr>
-        <td>Item 24 – Job Box Review</td>
-        <td>{20 - deduction24}</td>
-      </tr>
-      <tr>
-        <td>Item 25 – Review QC Package</td>
-        <td>{item25}</td>
-      </tr>
-      <tr>
-        <td>Item 26 – Submittals</td>
-        <td>{item26}</td>
-      </tr>
-      <tr>
-        <td>Item 27a – QC Inspection Plan</td>
-        <td>{item27a}</td>
-      </tr>
-      <tr>
-        <td>Item 27b – QC Inspection</td>
-        <td>{item27b}</td>
-      </tr>
-      <tr>
-        <td>Item 28 – Job Box Review (QC)</td>
-        <td>{5 - deduction28}</td>
-      </tr>
-      <tr>
-        <td>Item 29 – Job Box Review (Safety)</td>
-        <td>{5 - deduction29}</td>
-      </tr>
-    """
-    
-    # Build the comments section: all non-empty comments appear together.
-    comment_sections = ""
-    comments_list = [
-        ("Item 1 – Self Assessment", comment_item1),
-        ("Item 2 – Self Assessment Submission", comment_item2),
-        ("Item 3 – Notice to Proceed (NTP)", comment_item3),
-        ("Item 4 – Project Schedule", comment_item4),
-        ("Item 5 – Project Management", comment_item5),
-        ("Item 6 – QA for 30 NCR Detail Sites", comment_item6),
-        ("Item 7 &amp; 8 – FAR/RFI", comment_item78),
-        ("Item 9 – DFOW Sheet", comment_item9),
-        ("Item 10 – Turnover Projects", comment_item10),
-        ("Item 11 – Funds Provided", comment_item11),
-        ("Item 12 – Estimate at Completion Cost (EAC)", comment_item12),
-        ("Item 13 – Current Expenditures", comment_item13),
-        ("Item 14 – Project Material Status Report (PMSR)", comment_item14),
-        ("Item 15 – Report Submission", comment_item15),
-        ("Item 16 – Materials On-Hand", comment_item16),
-        ("Item 17 – DD Form 200", comment_item17),
-        ("Item 18 – Borrowed Material Tickler File", comment_item18),
-        ("Item 19 – Project Brief", comment_item19),
-        ("Item 20 – Calculate Manday Capability", comment_item20),
-        ("Item 21 – Equipment", comment_item21),
-        ("Item 22 – CASS Spot Check", comment_item22),
-        ("Item 23 – Designation Letters", comment_item23),
-        ("Item 24 – Job Box Review", comment_item24),
-        ("Item 25 – Review QC Package", comment_item25),
-        ("Item 26 – Submittals", comment_item26),
-        ("Item 27a – QC Inspection Plan", comment_item27a),
-        ("Item 27b – QC Inspection", comment_item27b),
-        ("Item 28 – Job Box Review (QC)", comment_item28),
-        ("Item 29 – Job Box Review (Safety)", comment_item29)
-    ]
-    for item, comment in comments_list:
-        if comment and comment.strip():
-            comment_sections += f"""
-            <div>
-              <h4>{item} - Comment</h4>
-              <p>{comment}</p>
-            </div>
-            """
-    
-    html_content = f"""
-    <html>
-      <head>
-      <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>
-          body {{ font-family: Arial, sans-serif; margin: 20px; }}
-          table {{ width: 100%; height: 100%; border-collapse: collapse; margin-bottom: 20px; }}
-          th, td {{ border: 1px solid #000; padding: 6px; text-align: left; }}
-          th {{ background-color: #f2f2f2; }}
-          .assessment-table tr td:nth-child(1),
-          .assessment-table tr td:nth-child(2) {{
-              border-bottom: 2px solid #000;
-          }}
-          .signature {{ border: 1px solid #000; width: 300px; height: 70px; display: block; margin-bottom: 20px; }}
-          h2, h3, h4 {{ text-align: center; }}
-          .page-break {{ page-break-before: always; }}
-        </style>
-      </head>
-      <body>
-        <h2>Construction Quality Inspection Report</h2>
-        <h3>Project Information</h3>
-        <p><strong>Project Name:</strong> {project_name}</p>
-        <p><strong>Battalion:</strong> {battalion}</p>
-        <p><strong>OIC:</strong> {oic_name}</p>
-        <p><strong>AOIC:</strong> {aoic}</p>
-        <p><strong>Start Date:</strong> {start}</p>
-        <p><strong>Planned Start:</strong> {planned_start_str}</p>
-        <p><strong>Planned Completion:</strong> {planned_completion_str}</p>
-        <p><strong>Actual Completion:</strong> {actual_completion_str}</p>
-        
-        <h3>Assessment Details</h3>
-        <table class="assessment-table">
-          <tr>
-            <th>Item</th>
-            <th>Score</th>
-          </tr>
-          {assessment_rows}
-        </table>
-        
-        <h3>Final Score</h3>
-        <p><strong>Final Score:</strong> {final_score} out of 171</p>
-        <p><strong>Final Percentage:</strong> {final_percentage}%</p>
-        
-        
-        <h4>OIC Signature: {oic_name}</h4>
-        <img src="data:image/png;base64,{oic_base64}" class="signature"/>
-        <h4>AOIC Signature: {aoic}</h4>
-        <img src="data:image/png;base64,{ncr_base64}" class="signature"/>
-        
-        <!-- Single page break before starting comments -->
-        <div class="page-break"></div>
-        
-        <h3>Comments</h3>
-        {comment_sections}
-        
-        <script>
-          window.onload = function() {{
-             window.print();
-          }};
-        </script>
-      </body>
-    </html>
-    """
-    components.html(html_content, height=900)
+    final = (
+        st.session_state.get("final_score", "N/A"),
+        st.session_state.get("final_possible", MAX_SCORE),
+        st.session_state.get("final_percentage", "N/A"),
+    )
+    report_html = lazy_import("report_html")
+    with span("report_build"):
+        html_content = report_html.render_report(assessment, signatures=report_signatures, final=final)
+    with span("report_embed"):
+        components.html(html_content, height=900)
+    cache_stats = report_html.report_cache.stats()
+    st.caption(
+        f"Report cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+        f"{cache_stats['entries']}/{cache_stats['maxsize']} entries"
+    )
 
+if st.button("Generate PDF Report", key="generate_pdf_report"):
+    report_html = lazy_import("report_html")
+    signatures = lazy_import("signatures")
+    with span("pdf_build"):
+        pdf_bytes = report_html.report_cache.get_or_render(
+            "pdf",
+            [report_html.normalize(assessment), {role: signatures.canvas_key(data) for role, data in report_signatures.items()}],
+            lambda: pdf_renderer().render_pdf(assessment, signatures=report_signatures),
+        )
+    st.download_button(
+        "Download PDF Report",
+        data=pdf_bytes,
+        file_name=f"CQI_Report_{assessment['proj_name_input'] or 'assessment'}.pdf",
+        mime="application/pdf",
+        key="download_pdf_report",
+    )
+    cache_stats = report_html.report_cache.stats()
+    st.caption(f"Report cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses")
+
+# --- Session memory ---
+with st.sidebar.expander("Session memory"):
+    session_memory = lazy_import("session_memory")
+    if st.session_state.get("signatures_stored"):
+        vault = signature_vault()
+        used, budget = vault.usage(signature_session)
+        vault_stats = vault.stats()
+        st.caption(
+            f"Session state ≈ {session_memory.approx_size(dict(st.session_state)) / 1024:.1f} KB · "
+            f"signatures {used:,} B of {budget:,} B budget"
+        )
+        st.caption(
+            f"Server: {vault_stats['sessions']} sessions holding {vault_stats['bytes']:,} B of signatures · "
+            f"{vault_stats['spilled']} idle sessions spilled to disk"
+        )
+    else:
+        st.caption(
+            f"Session state ≈ {session_memory.approx_size(dict(st.session_state)) / 1024:.1f} KB · no signatures stored"
+        )
+
+# --- Startup timings ---
+with st.sidebar.expander("Startup timings"):
+    st.caption(f"Script run: {(time.perf_counter() - _script_started) * 1000:.1f} ms")
+    timings = import_timings()
+    if timings:
+        st.dataframe(
+            [{"Module": name, "First import (ms)": round(ms, 1)} for name, ms in timings],
+            hide_index=True,
+        )
+    else:
+        st.caption("No deferred modules loaded yet.")
+
+# --- Stage timings (only when CQI_METRICS=1) ---
+if metrics.ENABLED:
+    metrics.observe("script", time.perf_counter() - _script_started)
+    if metrics.TEXTFILE:
+        metrics.write_textfile()
+    with st.sidebar.expander("Stage timings"):
+        st.dataframe(
+            [
+                {"Stage": stage, "Runs": count, "Mean ms": round(mean * 1000, 1),
+                 "p50 ms": round(p50 * 1000, 1), "p95 ms": round(p95 * 1000, 1), "p99 ms": round(p99 * 1000, 1)}
+                for stage, (count, mean, p50, p95, p99) in metrics.snapshot().items()
+            ],
+            hide_index=True,
+        )
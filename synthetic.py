@@ -0,0 +1,118 @@
+"""Synthetic assessments of realistic shape, for benchmarks and load tests.
+
+Each assessment is widget-keyed like ``st.session_state``: project
+information, all 29 item responses, comments on roughly the items that
+need one, and work-in-place inputs. Signatures come as fabric.js stroke
+JSON (what ``st_canvas`` returns in ``json_data``) and can be rasterized to
+the 400x75 RGBA array the canvas returns in ``image_data``.
+"""
+import datetime
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from registry import ITEMS, item_response
+
+CANVAS_WIDTH = 400
+CANVAS_HEIGHT = 75
+BATTALIONS = ("NMCB 1", "NMCB 3", "NMCB 4", "NMCB 5", "NMCB 11", "NMCB 133")
+WORDS = (
+    "rebar", "spacing", "inspection", "formwork", "concrete", "slump", "test", "missing", "QC", "plan",
+    "submittal", "late", "crew", "safety", "brief", "tool", "kit", "incomplete", "redline", "drawings",
+    "material", "report", "overdue", "corrected", "on", "site", "by", "the", "OIC", "not", "signed",
+)
+
+
+def comment(rng, words=(6, 30)):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(*words))).capitalize() + "."
+
+
+def signature_strokes(rng, strokes=(2, 5), points=(12, 40)):
+    """fabric.js-style freedraw paths scribbled across the canvas."""
+    objects = []
+    x = rng.uniform(10, 60)
+    for _ in range(rng.randint(*strokes)):
+        y = rng.uniform(20, CANVAS_HEIGHT - 20)
+        path = [["M", round(x, 1), round(y, 1)]]
+        for _ in range(rng.randint(*points)):
+            cx, cy = x + rng.uniform(1, 6), y + rng.uniform(-10, 10)
+            x = min(x + rng.uniform(2, 9), CANVAS_WIDTH - 5)
+            y = min(max(y + rng.uniform(-12, 12), 5), CANVAS_HEIGHT - 5)
+            path.append(["Q", round(cx, 1), round(cy, 1), round(x, 1), round(y, 1)])
+        path.append(["L", round(x, 1), round(y, 1)])
+        objects.append({"type": "path", "path": path, "stroke": "#000000", "strokeWidth": 2, "fill": None})
+        x = min(x + rng.uniform(5, 20), CANVAS_WIDTH - 60)
+    return {"version": "4.4.0", "background": "#FFF", "objects": objects}
+
+
+def rasterize(json_data):
+    """(75, 400, 4) uint8 array like st_canvas image_data (end points only, no curves)."""
+    im = Image.new("RGBA", (CANVAS_WIDTH, CANVAS_HEIGHT), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(im)
+    for obj in json_data.get("objects", []):
+        points = [(c[-2], c[-1]) for c in obj["path"]]
+        draw.line(points, fill=(0, 0, 0, 255), width=int(obj.get("strokeWidth", 2)), joint="curve")
+    return np.asarray(im)
+
+
+def assessment(rng=None, index=0, comment_rate=1.0):
+    """One widget-keyed assessment with both signatures' stroke JSON attached."""
+    rng = rng or random.Random(index)
+    start = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 600))
+    state = {
+        "proj_name_input": f"Project {index % 500:03d}",
+        "battalion_input": rng.choice(BATTALIONS),
+        "oic_name_input": f"LT Officer {index % 97}",
+        "aoic_input": f"CE1 Assistant {index % 89}",
+        "start_date_input": start,
+        "planned_start_input": start,
+        "planned_completion_input": start + datetime.timedelta(days=rng.randint(60, 400)),
+        "actual_completion_input": start + datetime.timedelta(days=rng.randint(60, 450)),
+        "total_md_input": rng.randint(200, 3500),
+        "planned_wip_input": rng.randint(20, 100),
+    }
+    state["actual_wip_input"] = max(0, state["planned_wip_input"] + rng.choice((0, 0, -2, 3, -8, 12)))
+    for item in ITEMS:
+        if item.widget_key:
+            # Most items score well; about a quarter lose points.
+            state[item.widget_key] = item.options[0] if rng.random() < 0.75 else rng.choice(item.options)
+        state[item.comment_key] = ""
+    for item in ITEMS:
+        if item.needs_comment(item_response(item, state)):
+            if rng.random() < comment_rate:
+                state[item.comment_key] = comment(rng)
+    state["oic_signature_data"] = signature_strokes(rng)
+    state["ncr_signature_data"] = signature_strokes(rng)
+    return state
+
+
+def assessments(n, seed=0, comment_rate=1.0):
+    rng = random.Random(seed)
+    return [assessment(rng, i, comment_rate) for i in range(n)]
+
+
+def wip_logs(n_projects, days, start=datetime.date(2025, 1, 1), seed=0):
+    """Daily WIP log rows (dicts keyed like wip_series.FIELDS), one day of every project at a time.
+
+    Actual work-in-place drifts around plan as a random walk, so projects
+    wander in and out of their Item 4 deviation bands; about one day in
+    fifty is not logged ("Not monitored").
+    """
+    rng = np.random.default_rng(seed)
+    total_md = rng.integers(200, 3500, n_projects)
+    drift = np.zeros(n_projects)
+    for d in range(days):
+        date = (start + datetime.timedelta(days=d)).isoformat()
+        planned = np.minimum(100.0, (d + 1) * 100.0 / days)
+        drift = np.clip(drift + rng.normal(0, 0.8, n_projects), -15, 15)
+        actual = np.clip(np.round(planned + drift), 0, 100)
+        missing = rng.random(n_projects) < 0.02
+        for p in range(n_projects):
+            yield {
+                "project": f"Project {p:04d}",
+                "date": date,
+                "total_md": int(total_md[p]),
+                "planned_wip": round(float(planned), 1),
+                "actual_wip": "" if missing[p] else float(actual[p]),
+            }
@@ -0,0 +1,155 @@
+"""Deterministic text layout for the comment pages of the reports.
+
+Text is measured with DejaVuSans.ttf's advance widths, the same table fpdf
+uses. Widths are summed per word and cached, and each paragraph is broken
+greedily at spaces, so laying out a comment is linear in its length. Words
+wider than a whole line are split between characters.
+
+``paginate`` places the comment pages as absolute positions (mm from the
+top of the page). Both report_pdf and report_html draw from that one
+result, so the printed HTML breaks lines and pages exactly where the PDF
+does.
+"""
+import functools
+import itertools
+import os
+from dataclasses import dataclass
+
+from fpdf.ttfonts import TTFontFile
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DejaVuSans.ttf")
+PT_PER_MM = 72 / 25.4
+WORD_CACHE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=None)
+def font_file(path=FONT_PATH):
+    """Parse the TrueType font's metrics once per process."""
+    ttf = TTFontFile()
+    ttf.getMetrics(path)
+    return ttf
+
+
+class GlyphWidths:
+    """Advance widths (1/1000 em) of one font, with a per-word cache."""
+
+    def __init__(self, path=FONT_PATH):
+        ttf = font_file(path)
+        self.table = ttf.charWidths
+        self.missing = int(round(ttf.defaultWidth)) or 500
+        self.space = self.table[32]
+        self._words = {}
+
+    def char(self, c):
+        code = ord(c)
+        return self.table[code] if code < len(self.table) else self.missing
+
+    def word(self, word):
+        width = self._words.get(word)
+        if width is None:
+            try:
+                width = sum(map(self.table.__getitem__, map(ord, word)))
+            except IndexError:  # characters beyond the BMP
+                width = sum(map(self.char, word))
+            if len(self._words) >= WORD_CACHE_SIZE:
+                self._words.clear()
+            self._words[word] = width
+        return width
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_widths(path=FONT_PATH):
+    """The process-wide GlyphWidths for path."""
+    return GlyphWidths(path)
+
+
+@functools.lru_cache(maxsize=1024)
+def _split_word(word, limit, path=FONT_PATH):
+    """Break a word wider than limit into pieces that each fit (cached; long URLs and part numbers repeat)."""
+    widths = glyph_widths(path)
+    pieces, start, base = [], 0, 0
+    for end, edge in enumerate(itertools.accumulate(map(widths.char, word))):
+        if edge - base > limit and end > start:
+            pieces.append(word[start:end])
+            start, base = end, edge - widths.char(word[end])
+    pieces.append(word[start:])
+    return pieces
+
+
+@functools.lru_cache(maxsize=4096)
+def wrap(text, size, width, path=FONT_PATH):
+    """Lines of text set at size pt that each fit in width mm (a tuple, cached)."""
+    widths = glyph_widths(path)
+    limit = width * PT_PER_MM * 1000 / size
+    space = widths.space
+    lines = []
+    for paragraph in text.strip().split("\n"):
+        line, used = [], 0
+        for word in paragraph.split():
+            w = widths.word(word)
+            if w > limit:
+                pieces = _split_word(word, limit, path)
+                if line:
+                    lines.append(" ".join(line))
+                lines.extend(pieces[:-1])
+                line, used = [pieces[-1]], widths.word(pieces[-1])
+            elif line and used + space + w > limit:
+                lines.append(" ".join(line))
+                line, used = [word], w
+            else:
+                used += w + space if line else w
+                line.append(word)
+        lines.append(" ".join(line))
+    return tuple(lines)
+
+
+# -------------------------------------------------------------------
+# Pagination
+# -------------------------------------------------------------------
+@dataclass(frozen=True)
+class Style:
+    size: float  # pt
+    height: float  # mm per line
+
+
+@dataclass(frozen=True)
+class Line:
+    kind: str  # "title", "heading" or "body"
+    y: float  # mm from the top of the page
+    text: str
+
+
+def paginate(title, blocks, width, top, bottom, styles, gap=2):
+    """Lay out a titled run of (heading, body) blocks; returns a tuple of pages (tuples of Lines).
+
+    styles maps "title", "heading" and "body" to a Style. A heading is
+    never left at the foot of a page without the first line of its body,
+    and the title starts the first page even when there are no blocks.
+    """
+    pages, page, y = [], [], top
+
+    def place(kind, text):
+        nonlocal page, y
+        style = styles[kind]
+        if y + style.height > bottom and page:
+            pages.append(tuple(page))
+            page, y = [], top
+        page.append(Line(kind, y, text))
+        y += style.height
+
+    for text in wrap(title, styles["title"].size, width):
+        place("title", text)
+    for heading, body in blocks:
+        heading_lines = wrap(heading, styles["heading"].size, width)
+        body_lines = wrap(body, styles["body"].size, width)
+        needed = len(heading_lines) * styles["heading"].height + styles["body"].height
+        if y + needed > bottom and page:
+            pages.append(tuple(page))
+            page, y = [], top
+        for text in heading_lines:
+            place("heading", text)
+        for text in body_lines:
+            place("body", text)
+        y += gap
+    pages.append(tuple(page))
+    return tuple(pages)
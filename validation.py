@@ -0,0 +1,88 @@
+"""Table-driven validation shared by the app and the batch tools.
+
+The rules are compiled once from the registry (and so from the scoring
+data in ``handbook_info``) into lookup tables indexed like the scoring
+engine's code matrix:
+- a comment is required for any response worth less than the item's
+  maximum;
+- N/A responses (Item 10) never need one;
+- a response outside the item's options, such as a deduction beyond the
+  item's range, is invalid.
+
+``validate_many`` checks a whole batch in one vectorized pass and
+``validate`` runs the same path for a single assessment, so the
+"Calculate Final Score" button, ``batch_score.py`` and any other caller
+report identical issues.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from registry import ITEMS
+from scoring import MAX_POINTS, N_ITEMS, POINTS, encode_checked
+
+COMMENT_REQUIRED = "comment_required"
+INVALID_RESPONSE = "invalid_response"
+
+# -------------------------------------------------------------------
+# Compiled rule tables
+# -------------------------------------------------------------------
+# NEEDS_COMMENT[i, c] is True when option c of item i requires a comment.
+with np.errstate(invalid="ignore"):
+    NEEDS_COMMENT = ~np.isnan(POINTS) & (POINTS != MAX_POINTS[:, None])
+NEEDS_COMMENT.setflags(write=False)
+
+COMMENT_KEYS = tuple(item.comment_key for item in ITEMS)
+COMMENT_MESSAGES = tuple(item.comment_error() for item in ITEMS)
+_ROWS = np.arange(N_ITEMS)
+
+
+@dataclass(frozen=True)
+class Issue:
+    """One validation failure: the item, the rule it broke and a message for the user."""
+    item_key: str
+    rule: str
+    message: str
+
+
+def has_comments(records):
+    """(N, 29) bool matrix: does each record carry a non-blank comment for each item?"""
+    return np.array(
+        [[bool(str(record.get(key) or "").strip()) for key in COMMENT_KEYS] for record in records],
+        dtype=bool,
+    ).reshape(len(records), N_ITEMS)
+
+
+def missing_comments(codes, present):
+    """(N, 29) bool matrix of items that need a comment and do not have one."""
+    return NEEDS_COMMENT[_ROWS, codes] & ~present
+
+
+# -------------------------------------------------------------------
+# Entry points
+# -------------------------------------------------------------------
+def validate_many(records):
+    """Validate a list of widget-keyed assessments in one pass.
+
+    Returns (codes, issues): the (N, 29) code matrix (reusable for
+    scoring) and one list of Issues per record, in item order. Items with
+    an invalid response are not also checked for a missing comment.
+    """
+    codes, problems = encode_checked(records)
+    missing = missing_comments(codes, has_comments(records))
+    issues = [[] for _ in records]
+    for r, i, message in problems:
+        issues[r].append(Issue(ITEMS[i].key, INVALID_RESPONSE, message))
+        missing[r, i] = False
+    for r, i in zip(*np.nonzero(missing)):
+        issues[r].append(Issue(ITEMS[i].key, COMMENT_REQUIRED, COMMENT_MESSAGES[i]))
+    if problems:
+        order = {item.key: n for n, item in enumerate(ITEMS)}
+        for row in issues:
+            row.sort(key=lambda issue: order[issue.item_key])
+    return codes, issues
+
+
+def validate(state):
+    """Issues for a single widget-keyed assessment (empty when it is valid)."""
+    return validate_many([state])[1][0]
@@ -0,0 +1,377 @@
+"""Streaming ingest of daily work-in-place logs into Item 4 score trajectories.
+
+Each log row is one project-day: ``project, date, total_md, planned_wip,
+actual_wip`` (CSV with a header, or JSONL). Logs are read a chunk at a time.
+Each chunk is scored with the vectorized ``scoring.schedule_codes``. A
+blank ``actual_wip`` or ``planned_wip`` counts as "Not monitored".
+
+Every scored day is appended to raw binary column files, like
+``columnar.py``. A second, much smaller set of columns records only the
+band crossings: the days on which a project moved from one Item 4 option
+to another. A project's first logged day counts as a crossing from -1.
+
+Each project's last day and band live in the manifest. Later logs are
+therefore ingested incrementally: days already stored for a project are
+skipped as stale, and only new days are scored. Band charts are built from
+the crossings alone, without re-reading the daily history.
+
+Rows with a missing or malformed date, a non-numeric value, or the wrong
+number of CSV fields are skipped and counted as invalid, not allowed to
+abort an ingest halfway. Appends take the same locks as ``columnar.py``,
+so concurrent ingests cannot interleave their writes.
+
+    python wip_series.py ingest wip_2025-06.csv
+    python wip_series.py stats
+    python wip_series.py project "Project 042"
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from columnar import file_lock
+from registry import SCHEDULE_OPTIONS
+from scoring import SCHEDULE_ITEM, schedule_codes
+
+DEFAULT_ROOT = os.environ.get(
+    "CQI_WIP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cqi_wip")
+)
+CHUNK_ROWS = 1 << 16
+SCAN_ROWS = 1 << 20
+FIELDS = ("project", "date", "total_md", "planned_wip", "actual_wip")
+NOT_MONITORED = SCHEDULE_OPTIONS.index("Not monitored")
+SCHEDULE_POINTS = np.array(SCHEDULE_ITEM.points, dtype=np.int8)
+
+DAY_COLUMNS = {"project": np.int32, "day": np.int32, "code": np.int8, "deviation": np.float32}
+CROSSING_COLUMNS = {"project": np.int32, "day": np.int32, "from": np.int8, "to": np.int8, "deviation": np.float32}
+
+
+def _floats(values):
+    """(float array, invalid mask) from raw CSV/JSON values; blanks and nulls become NaN."""
+    try:
+        return np.array(values, dtype=np.float64), np.zeros(len(values), dtype=bool)
+    except (TypeError, ValueError):
+        pass
+    out = np.full(len(values), np.nan)
+    invalid = np.zeros(len(values), dtype=bool)
+    for i, v in enumerate(values):
+        if v is None or v == "":
+            continue
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            invalid[i] = True
+    return out, invalid
+
+
+def _days(values):
+    """(days since 1970-01-01, invalid mask) from ISO date strings; blanks are invalid."""
+    try:
+        dates = np.array(values, dtype="datetime64[D]")
+    except (TypeError, ValueError):
+        dates = np.empty(len(values), dtype="datetime64[D]")
+        for i, v in enumerate(values):
+            try:
+                dates[i] = np.datetime64(v, "D") if isinstance(v, str) else np.datetime64("NaT")
+            except ValueError:
+                dates[i] = np.datetime64("NaT")
+    return dates.astype(np.int64), np.isnat(dates)
+
+
+# -------------------------------------------------------------------
+# Log readers (yield column lists, CHUNK_ROWS rows at a time)
+# -------------------------------------------------------------------
+def _csv_chunks(fh, size):
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    if header is None:
+        return
+    try:
+        index = [header.index(name) for name in FIELDS]
+    except ValueError:
+        raise ValueError(f"WIP log header must include {', '.join(FIELDS)}; got {', '.join(header)}") from None
+    width = len(header)
+    blank = [None] * width
+    rows = []
+    for row in reader:
+        if row:
+            # A row with missing or extra fields cannot be lined up with the
+            # header; blank it so append() counts it as invalid.
+            rows.append(row if len(row) == width else blank)
+        if len(rows) >= size:
+            columns = list(zip(*rows))
+            yield [columns[i] for i in index]
+            rows = []
+    if rows:
+        columns = list(zip(*rows))
+        yield [columns[i] for i in index]
+
+
+def _jsonl_chunks(fh, size):
+    rows = []
+    for line in fh:
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            rows.append(row if isinstance(row, dict) else {})  # invalid rows have no date
+        if len(rows) >= size:
+            yield [[row.get(name) for row in rows] for name in FIELDS]
+            rows = []
+    if rows:
+        yield [[row.get(name) for row in rows] for name in FIELDS]
+
+
+def read_chunks(path, size=CHUNK_ROWS):
+    """Column chunks (project, date, total_md, planned_wip, actual_wip) from a CSV or JSONL log."""
+    chunks = _jsonl_chunks if path.endswith((".jsonl", ".json")) else _csv_chunks
+    with open(path, encoding="utf-8", newline="") as fh:
+        yield from chunks(fh, size)
+
+
+class WipSeries:
+    """Directory of Item 4 trajectory and crossing columns with a JSON manifest."""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._manifest_path = os.path.join(root, "manifest.json")
+        self._lock_path = os.path.join(root, "manifest.lock")
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as fh:
+                self.manifest = json.load(fh)
+        else:
+            self.manifest = {"rows": 0, "crossings": 0, "projects": [], "last_day": [], "last_code": []}
+        self._project_codes = {name: i for i, name in enumerate(self.manifest["projects"])}
+        self.last_day = np.array(self.manifest["last_day"], dtype=np.int64)
+        self.last_code = np.array(self.manifest["last_code"], dtype=np.int8)
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    @property
+    def projects(self):
+        return list(self.manifest["projects"])
+
+    def _path(self, name):
+        return os.path.join(self.root, f"{name}.bin")
+
+    def column(self, name, crossings=False):
+        """Read-only memmap of one day column (or crossing column)."""
+        prefix, columns, rows = ("crossing_", CROSSING_COLUMNS, self.manifest["crossings"]) if crossings else (
+            "day_", DAY_COLUMNS, self.manifest["rows"])
+        if not rows:
+            return np.empty(0, dtype=columns[name])
+        return np.memmap(self._path(prefix + name), dtype=columns[name], mode="r", shape=(rows,))
+
+    def _project_code(self, name):
+        name = str(name or "")
+        code = self._project_codes.get(name)
+        if code is None:
+            code = self._project_codes[name] = len(self.manifest["projects"])
+            self.manifest["projects"].append(name)
+        return code
+
+    # ---------------------------------------------------------------
+    # Ingest
+    # ---------------------------------------------------------------
+    def _append(self, prefix, columns, stored, data):
+        for name, dtype in columns.items():
+            with open(self._path(prefix + name), "ab") as fh:
+                # Drop any tail left by an ingest that died before the manifest was updated.
+                fh.truncate(stored * np.dtype(dtype).itemsize)
+                fh.write(np.ascontiguousarray(data[name], dtype=dtype).tobytes())
+
+    def append(self, projects, dates, total_md, planned_wip, actual_wip):
+        """Score and store one chunk of project-days.
+
+        Rows may arrive in any order. A project-day logged twice keeps its
+        last row. Days on or before a project's last stored day are skipped.
+        Rows with a bad date or number are skipped as invalid. Returns (days
+        stored, stale rows skipped, crossings recorded, invalid rows skipped).
+        """
+        with self._lock, file_lock(self._lock_path):
+            self._load()  # another process may have ingested since
+            return self._append_rows(projects, dates, total_md, planned_wip, actual_wip)
+
+    def _append_rows(self, projects, dates, total_md, planned_wip, actual_wip):
+        day, bad_day = _days(dates)
+        (total_md, bad_md), (planned, bad_planned), (actual, bad_actual) = (
+            _floats(total_md), _floats(planned_wip), _floats(actual_wip)
+        )
+        valid = ~(bad_day | bad_md | bad_planned | bad_actual)
+        invalid = int(len(valid) - valid.sum())
+        if invalid:
+            projects = [p for p, ok in zip(projects, valid) if ok]
+            day, total_md, planned, actual = day[valid], total_md[valid], planned[valid], actual[valid]
+        n = len(projects)
+        if not n:
+            return 0, 0, 0, invalid
+        known = self._project_codes
+        project = np.array([known[p] if p in known else self._project_code(p) for p in projects], dtype=np.int64)
+        code = schedule_codes(np.nan_to_num(total_md), planned, actual)
+        unmonitored = np.isnan(planned) | np.isnan(actual)
+        code[unmonitored] = NOT_MONITORED
+        deviation = np.where(unmonitored, np.nan, actual - planned)
+
+        grow = len(self.manifest["projects"]) - len(self.last_day)
+        if grow:
+            self.last_day = np.concatenate([self.last_day, np.full(grow, np.iinfo(np.int64).min)])
+            self.last_code = np.concatenate([self.last_code, np.full(grow, -1, dtype=np.int8)])
+
+        # Group by project, then day; arrival order breaks ties so the last duplicate wins.
+        order = np.lexsort((np.arange(n), day, project))
+        project, day, code, deviation = project[order], day[order], code[order], deviation[order]
+        keep = np.ones(n, dtype=bool)
+        keep[:-1] = (project[1:] != project[:-1]) | (day[1:] != day[:-1])
+        fresh = day > self.last_day[project]
+        stale = int((keep & ~fresh).sum())
+        keep &= fresh
+        project, day, code, deviation = project[keep], day[keep], code[keep], deviation[keep]
+        if not len(project):
+            return 0, stale, 0, invalid
+
+        first = np.ones(len(project), dtype=bool)
+        first[1:] = project[1:] != project[:-1]
+        previous = np.empty_like(code)
+        previous[1:] = code[:-1]
+        previous[first] = self.last_code[project[first]]
+        crossed = code != previous
+        last = np.ones(len(project), dtype=bool)
+        last[:-1] = first[1:]
+
+        self._append("day_", DAY_COLUMNS, self.manifest["rows"],
+                     {"project": project, "day": day, "code": code, "deviation": deviation})
+        self._append("crossing_", CROSSING_COLUMNS, self.manifest["crossings"], {
+            "project": project[crossed], "day": day[crossed], "from": previous[crossed], "to": code[crossed],
+            "deviation": deviation[crossed],
+        })
+        self.last_day[project[last]] = day[last]
+        self.last_code[project[last]] = code[last]
+        self.manifest["rows"] += len(project)
+        self.manifest["crossings"] += int(crossed.sum())
+        self._save_manifest()
+        return len(project), stale, int(crossed.sum()), invalid
+
+    def _save_manifest(self):
+        self.manifest["last_day"] = self.last_day.tolist()
+        self.manifest["last_code"] = self.last_code.tolist()
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest, fh)
+        os.replace(tmp, self._manifest_path)
+
+    def ingest(self, path, chunk_rows=CHUNK_ROWS):
+        """Stream one CSV/JSONL log into the store; returns summed append() counts."""
+        totals = np.zeros(4, dtype=np.int64)
+        for chunk in read_chunks(path, chunk_rows):
+            totals += self.append(*chunk)
+        return tuple(int(t) for t in totals)
+
+    # ---------------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------------
+    def current(self):
+        """{project: (last day as datetime64[D], Item 4 option code)}."""
+        return {
+            name: (np.datetime64(int(day), "D"), int(code))
+            for name, day, code in zip(self.manifest["projects"], self.last_day, self.last_code)
+        }
+
+    def trajectory(self, project):
+        """(days, option codes, Item 4 points, deviation) for one project, oldest first."""
+        code = self._project_codes.get(project)
+        parts = {name: [] for name in ("day", "code", "deviation")}
+        if code is not None:
+            columns = {name: self.column(name) for name in ("project", *parts)}
+            for start in range(0, len(self), SCAN_ROWS):
+                match = np.flatnonzero(np.asarray(columns["project"][start:start + SCAN_ROWS]) == code) + start
+                for name in parts:
+                    parts[name].append(np.asarray(columns[name][match]))
+        day, codes, deviation = (
+            np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=DAY_COLUMNS[name]) for name in parts
+        )
+        return day.astype("datetime64[D]"), codes, SCHEDULE_POINTS[codes], deviation
+
+    def crossings(self, project=None):
+        """Band crossings as a dict of arrays (project names, day, from, to, deviation)."""
+        data = {name: np.asarray(self.column(name, crossings=True)) for name in CROSSING_COLUMNS}
+        if project is not None:
+            keep = data["project"] == self._project_codes.get(project, -1)
+            data = {name: values[keep] for name, values in data.items()}
+        names = np.array(self.manifest["projects"] or [""], dtype=object)
+        data["project"] = names[data["project"]]
+        data["day"] = data["day"].astype("datetime64[D]")
+        return data
+
+    def band_counts(self):
+        """(days, counts): projects in each Item 4 option at the end of each crossing day.
+
+        Built from the crossings alone. counts has one column per
+        SCHEDULE_OPTIONS entry.
+        """
+        day = np.asarray(self.column("day", crossings=True))
+        moved_from = np.asarray(self.column("from", crossings=True)).astype(np.int64)
+        moved_to = np.asarray(self.column("to", crossings=True)).astype(np.int64)
+        days, index = np.unique(day, return_inverse=True)
+        change = np.zeros((len(days), len(SCHEDULE_OPTIONS)), dtype=np.int64)
+        np.add.at(change, (index, moved_to), 1)
+        left = moved_from >= 0
+        np.add.at(change, (index[left], moved_from[left]), -1)
+        return days.astype("datetime64[D]"), np.cumsum(change, axis=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest daily WIP logs and query Item 4 score trajectories.")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="append CSV/JSONL logs (only days newer than each project's last)")
+    ingest.add_argument("inputs", nargs="+")
+    ingest.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    sub.add_parser("stats", help="print the current band of every project")
+    project = sub.add_parser("project", help="print one project's band crossings")
+    project.add_argument("name")
+    args = parser.parse_args(argv)
+
+    series = WipSeries(args.root)
+    if args.command == "ingest":
+        for path in args.inputs:
+            started = time.perf_counter()
+            stored, stale, crossed, invalid = series.ingest(path, args.chunk_size)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{path}: {stored:,} days stored, {stale:,} stale skipped, {invalid:,} invalid skipped, "
+                f"{crossed:,} crossings in {elapsed:.2f}s ({(stored + stale + invalid) / max(elapsed, 1e-9):,.0f} rows/sec)",
+                file=sys.stderr,
+            )
+        return 0
+    if args.command == "stats":
+        codes = series.last_code
+        print(f"{len(series.projects):,} projects, {len(series):,} project-days, "
+              f"{series.manifest['crossings']:,} crossings")
+        for option, count in zip(SCHEDULE_OPTIONS, np.bincount(codes[codes >= 0], minlength=len(SCHEDULE_OPTIONS))):
+            print(f"{option:<20} {int(count):8,}")
+        return 0
+
+    found = series.crossings(args.name)
+    if not len(found["day"]):
+        print(f"No WIP log for {args.name!r}.", file=sys.stderr)
+        return 1
+    for day, old, new, deviation in zip(found["day"], found["from"], found["to"], found["deviation"]):
+        before = SCHEDULE_OPTIONS[old] if old >= 0 else "(first log)"
+        print(f"{day}  {before} -> {SCHEDULE_OPTIONS[new]}  (deviation {deviation:+.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())